@@ -4,10 +4,8 @@ PD图像保存节点
 """
 
 from PIL import Image, ImageOps, ImageSequence
-from PIL.PngImagePlugin import PngInfo
 import os
 import numpy as np
-import json
 import sys
 from comfy.cli_args import args
 import folder_paths
@@ -24,10 +22,18 @@ sys.path.append(grandparent_dir)
 
 from comfy.cli_args import args
 
+from ._async_writer import get_async_writer, take_writer_errors
+from ._counter_index import claim_comfy_image_file, get_counter_index
+from ._image_encoders import OUTPUT_FORMATS, PNG_STRATEGIES, SaveStats, build_save_params, timed_encode
+
 class PD_imagesave_path:
     """
     PD图像保存路径节点
     功能：将图像保存到指定的自定义路径，支持自定义文件名前缀和输出目录
+    async_save 开启时编码和写盘交给后台线程池，节点立即返回；
+    排队帧数超过 max_pending 时等待写盘（背压），写入失败会在下一次执行时报告
+    output_format 可选 PNG（压缩级别和策略可调）、无损WebP、WebP、JPEG 和原始 .npy，
+    每次保存会输出每帧耗时和写入吞吐量，便于为不同工作流选择编码器
     """
     
     def __init__(self):
@@ -43,12 +49,22 @@ class PD_imagesave_path:
         定义节点输入参数类型
         返回：
         - required: 必需参数
+        - optional: 可选参数（输出格式和异步保存设置）
         - hidden: 隐藏参数
         """
         return {"required": 
                     {"images": ("IMAGE", ),  # 输入图像数组
                      "filename_prefix": ("STRING", {"default": "ComfyUI"}),  # 文件名前缀
                      "custom_output_dir": ("STRING", {"default": "", "optional": True})},  # 自定义输出目录(可选)
+                "optional": {
+                    "output_format": (list(OUTPUT_FORMATS), {"default": "png"}),  # 输出格式
+                    "quality": ("INT", {"default": 95, "min": 1, "max": 100, "step": 1}),  # JPEG/WebP质量（无损WebP为压缩力度）
+                    "compress_level": ("INT", {"default": 4, "min": 0, "max": 9, "step": 1}),  # PNG压缩级别
+                    "png_strategy": (list(PNG_STRATEGIES), {"default": "default"}),  # PNG压缩策略（rle/huffman_only更快）
+                    "async_save": ("BOOLEAN", {"default": False}),  # 后台异步保存，节点不等待写盘
+                    "writer_threads": ("INT", {"default": 2, "min": 1, "max": 32, "step": 1}),  # 写盘线程数
+                    "max_pending": ("INT", {"default": 16, "min": 1, "max": 1024, "step": 1}),  # 最多排队帧数
+                },
                 "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"},  # 隐藏的提示信息和额外PNG信息
                 }
 
@@ -57,7 +73,9 @@ class PD_imagesave_path:
     OUTPUT_NODE = True  # 标识为输出节点
     CATEGORY = "PD/Image"  # 节点分类
 
-    def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None, custom_output_dir=""):
+    def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None, custom_output_dir="",
+                    output_format="png", quality=95, compress_level=4, png_strategy="default",
+                    async_save=False, writer_threads=2, max_pending=16):
         """
         保存图像主方法
         
@@ -67,10 +85,25 @@ class PD_imagesave_path:
         - prompt: 提示词信息
         - extra_pnginfo: 额外的PNG元数据信息
         - custom_output_dir: 自定义输出目录路径
+        - output_format: 输出格式 png / webp_lossless / webp / jpg / npy
+        - quality: JPEG/WebP 质量
+        - compress_level: PNG 压缩级别
+        - png_strategy: PNG 压缩策略
+        - async_save: 是否后台异步保存
+        - writer_threads: 写盘线程数
+        - max_pending: 最多排队帧数
         
         返回：
-        - 空字典（不显示预览图）
+        - 保存统计和上一次异步保存的失败文件（ui text，不显示预览图）
         """
+        # 报告上一次异步保存中失败的文件（终端和节点的 ui text 中都显示）
+        errors = take_writer_errors()
+        previous_errors = []
+        if errors:
+            previous_errors = [f"⚠️ 上次异步保存有 {len(errors)} 个文件写入失败:"] + [f"  • {error}" for error in errors]
+            print("\n".join(previous_errors))
+
+        stats = SaveStats(f"{self.__class__.__name__} [{output_format}]", len(images))
         try:
             # 判断是否有自定义保存路径
             if not custom_output_dir:
@@ -80,25 +113,35 @@ class PD_imagesave_path:
                 os.makedirs(custom_output_dir, exist_ok=True)  # 创建目录，如果已存在则忽略
             
             # 调用私有方法保存图像到自定义目录
-            self._save_images_to_dir(images, filename_prefix, prompt, extra_pnginfo, custom_output_dir)
-            
-            # 返回空的结果，不显示预览图
-            return {}
+            writer = get_async_writer(writer_threads, max_pending) if async_save else None
+            save_params = build_save_params(output_format, prompt, extra_pnginfo, quality, compress_level,
+                                            png_strategy, embed_metadata=not args.disable_metadata)
+            self._save_images_to_dir(images, filename_prefix, custom_output_dir, output_format, save_params, writer,
+                                     stats)
+
+            # 返回保存统计，不显示预览图；异步保存时统计在全部写完后输出到终端
+            if stats.finished:
+                return {"ui": {"text": previous_errors + [stats.text()]}}
+            return {"ui": {"text": previous_errors + [
+                f"{stats.label}: 已提交 {stats.total} 帧后台写盘，写完后在终端输出统计，写入失败的文件在下次执行时显示"]}}
         
         except Exception as e:
             print(f"保存图像时发生错误: {e}")
-            return {}
+            return {"ui": {"text": previous_errors + [f"保存图像时发生错误: {e}", stats.text()]}}
 
-    def _save_images_to_dir(self, images, filename_prefix, prompt, extra_pnginfo, output_dir):
+    def _save_images_to_dir(self, images, filename_prefix, output_dir, output_format="png", save_params=None,
+                            writer=None, stats=None):
         """
         私有方法：将图像保存到指定目录
         
         参数：
         - images: 图像数组
         - filename_prefix: 文件名前缀
-        - prompt: 提示词信息
-        - extra_pnginfo: 额外PNG信息
         - output_dir: 输出目录路径
+        - output_format: 输出格式
+        - save_params: 整批共用的编码参数（含已序列化的元数据）
+        - writer: 后台写盘队列，None 表示同步保存
+        - stats: 保存统计，提交结束（包括中途出错）时 seal，全部帧写完或失败后输出一次
         
         返回：
         - results: 保存结果列表
@@ -106,48 +149,79 @@ class PD_imagesave_path:
         results = list()
         
         # 获取完整的保存路径和文件名信息
-        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(
+        full_output_folder, filename, subfolder = self._resolve_prefix(
             filename_prefix, output_dir, images[0].shape[1], images[0].shape[0]
         )
-            
-        # 遍历图像数组，逐个保存
-        for (batch_number, image) in enumerate(images):
-            # 将张量转换为numpy数组，并缩放到0-255范围
-            i = 255. * image.cpu().numpy()
-            # 转换为PIL图像对象，确保像素值在有效范围内
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
-            
-            # 如果没有禁用元数据，则添加元数据信息
-            if not args.disable_metadata:
-                metadata = PngInfo()  # 创建PNG信息对象
-                # 添加提示词信息到元数据
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                # 添加额外PNG信息到元数据
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-            
-            # 处理文件名，替换批次号占位符
-            filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            # 生成最终文件名，包含计数器和扩展名
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            
-            # 保存图像文件，包含元数据和指定的压缩级别
-            img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
-                
-            # 生成返回结果信息，包含文件名和路径
-            display_path = os.path.join(output_dir, subfolder)
-            results.append({
-                "filename": file,         # 保存的文件名
-                "subfolder": display_path, # 子文件夹路径
-                "type": self.type         # 文件类型
-            })
-            counter += 1  # 递增计数器
-        
+        # 编号由文件夹的编号索引分配（以空文件占用，不扫描文件夹），异步写盘时也不会重名
+        counter_index = get_counter_index(full_output_folder)
+
+        if save_params is None:
+            save_params = build_save_params(output_format, compress_level=self.compress_level)
+        extension = OUTPUT_FORMATS[output_format]
+        if stats is None:
+            stats = SaveStats(f"{self.__class__.__name__} [{output_format}]", len(images))
+        stats.label = f"{stats.label} {full_output_folder}"
+
+        # 遍历图像数组，逐个保存；中途出错时只等待已提交的帧，统计照常输出
+        submitted = 0
+        try:
+            for (batch_number, image) in enumerate(images):
+                # 将张量转换为numpy数组，并缩放到0-255范围（在当前线程完成，后台只做编码和写盘）
+                i = 255. * image.cpu().numpy()
+                pixels = np.clip(i, 0, 255).astype(np.uint8)
+
+                # 占用下一个编号，文件名中的批次号占位符会被替换
+                counter, file_path = claim_comfy_image_file(
+                    full_output_folder, filename, extension, batch_number, persist=False, index=counter_index
+                )
+                file = os.path.basename(file_path)
+
+                # 保存图像文件，包含元数据和指定的编码参数（失败的帧由 timed_encode 计入统计）
+                if writer is None:
+                    submitted += 1
+                    timed_encode(pixels, file_path, output_format, save_params, stats)
+                else:
+                    writer.submit(timed_encode, pixels, file_path, output_format, save_params, stats, label=file_path)
+                    submitted += 1
+
+                # 生成返回结果信息，包含文件名和路径
+                display_path = os.path.join(output_dir, subfolder)
+                results.append({
+                    "filename": file,         # 保存的文件名
+                    "subfolder": display_path, # 子文件夹路径
+                    "type": self.type         # 文件类型
+                })
+        finally:
+            counter_index.flush()
+            stats.seal(submitted)
         return results
 
+    @staticmethod
+    def _resolve_prefix(filename_prefix, output_dir, image_width, image_height):
+        """
+        解析文件名前缀（与 folder_paths.get_save_image_path 相同的变量替换和子文件夹规则，但不扫描文件夹）
+
+        返回：
+        - (完整输出文件夹, 文件名, 子文件夹)
+        """
+        if "%" in filename_prefix:
+            now = datetime.now()
+            for var, value in (("%width%", image_width), ("%height%", image_height),
+                               ("%year%", now.year), ("%month%", f"{now.month:02}"), ("%day%", f"{now.day:02}"),
+                               ("%hour%", f"{now.hour:02}"), ("%minute%", f"{now.minute:02}"),
+                               ("%second%", f"{now.second:02}")):
+                filename_prefix = filename_prefix.replace(var, str(value))
+
+        subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+        filename = os.path.basename(os.path.normpath(filename_prefix))
+        full_output_folder = os.path.join(output_dir, subfolder)
+
+        if os.path.commonpath((os.path.abspath(output_dir), os.path.abspath(full_output_folder))) != os.path.abspath(output_dir):
+            raise ValueError(f"Saving image outside the output folder is not allowed: {full_output_folder}")
+
+        os.makedirs(full_output_folder, exist_ok=True)
+        return full_output_folder, filename, subfolder
+
 
 # 节点类映射：将类名映射到实际的类
 NODE_CLASS_MAPPINGS = {
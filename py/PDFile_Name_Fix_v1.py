@@ -1,5 +1,6 @@
 import os
 import comfy.utils
+from ._dir_index import list_files
 
 class name_fix:
     """
@@ -46,7 +47,7 @@ class name_fix:
             
         try:
             # 获取文件夹中的所有文件
-            files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
+            files = [os.path.basename(f) for f in list_files(folder_path)]
             
             if not files:
                 return ("提示: 文件夹为空，没有文件需要处理",)
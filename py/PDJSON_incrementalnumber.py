@@ -1,5 +1,8 @@
 import os
-import json
+from comfy.utils import ProgressBar
+from ._dir_index import list_files
+from ._workflow_index import DEFAULT_FOLDERS, QUERIES, folders_fingerprint, get_workflow_index
+from ._workflow_json import GROUP_COLORS, OPERATIONS, GroupStyleEdit, NodeLayoutEdit, parse_operations, run_edits
 
 class PDJSON_Group:
     @classmethod
@@ -14,6 +17,10 @@ class PDJSON_Group:
                 "output_folder": ("STRING", {"default": ""}),
                 "new_filename": ("STRING", {"default": "_fix01"}),  # 改为后缀模式
             },
+            "optional": {
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "step": 1}),  # 进程数，1为单进程，0为CPU核心数
+                "skip_processed": ("BOOLEAN", {"default": True}),  # 按 .pd_workflow_edits.json 跳过已按相同规则处理且未变化的文件
+            },
         }
 
     RETURN_TYPES = ("STRING",)
@@ -21,21 +28,15 @@ class PDJSON_Group:
     FUNCTION = "process_json_files"
     CATEGORY = "PD Custom Nodes"
 
-    def process_json_files(self, directory_path, color_choice, modify_size, font_size, target_title, output_folder, new_filename):
+    def process_json_files(self, directory_path, color_choice, modify_size, font_size, target_title, output_folder, new_filename,
+                           workers=1, skip_processed=True):
         try:
             # 规范化路径
             directory_path = os.path.normpath(directory_path)
             output_folder = os.path.normpath(output_folder) if output_folder else directory_path
             
             # 颜色映射
-            color_map = {
-                "Blue": "#3f789e",
-                "DeepGray": "#444",
-                "Yellow": "#c09430",
-                "Green": "#3c763d",
-                "None": None
-            }
-            target_color = color_map.get(color_choice)
+            target_color = GROUP_COLORS.get(color_choice)
 
             # 检查输入文件夹
             if not os.path.exists(directory_path):
@@ -46,56 +47,29 @@ class PDJSON_Group:
                 os.makedirs(output_folder)
 
             # 获取所有JSON文件
-            json_files = [f for f in os.listdir(directory_path) if f.lower().endswith(".json")]
+            json_files = [os.path.basename(f) for f in list_files(directory_path, (".json",))]
             if not json_files:
                 return (f"错误：没有找到JSON文件: {directory_path}",)
 
-            processed_files = []
-            
+            # 生成新文件名（在原始文件名后添加后缀，保留原扩展名）
+            tasks = []
             for filename in json_files:
-                input_path = os.path.join(directory_path, filename)
-                
-                # 生成新文件名（在原始文件名后添加后缀）
                 base_name, ext = os.path.splitext(filename)
-                new_base_name = f"{base_name}{new_filename}"
-                output_name = f"{new_base_name}{ext}"  # 保留原扩展名
-                output_path = os.path.join(output_folder, output_name)
+                tasks.append((os.path.join(directory_path, filename),
+                              os.path.join(output_folder, f"{base_name}{new_filename}{ext}")))
 
-                # 读取JSON文件
-                try:
-                    with open(input_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                except Exception as e:
-                    print(f"读取JSON文件失败 {input_path}: {e}")
-                    continue
-
-                # 修改数据
-                modified = False
-                for group in data.get("groups", []):
-                    # 修改颜色
-                    if target_color is not None:
-                        group["color"] = target_color
-                        modified = True
-                    
-                    # 修改字体大小
-                    if modify_size == "enable":
-                        should_modify = not target_title or group.get("title") == target_title
-                        if should_modify and "font_size" in group:
-                            old_size = group["font_size"]
-                            group["font_size"] = font_size
-                            print(f"修改组 '{group.get('title')}': 字体大小 {old_size} → {font_size}")
-                            modified = True
-
-                # 保存修改
-                if modified:
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=4)
-                    processed_files.append(output_path)
-                    print(f"已处理文件: {output_path}")
-                else:
-                    print(f"无需修改: {input_path}")
+            edit = GroupStyleEdit(target_color, font_size if modify_size == "enable" else None, target_title)
+            pbar = ProgressBar(len(tasks))
+            report = run_edits(tasks, [edit], output_folder, workers, use_index=skip_processed,
+                               on_progress=pbar.update)
+            processed_files = report.written
+            print(report.summary())
 
             result_msg = f"处理完成！已修改 {len(processed_files)} 个文件"
+            if report.skipped:
+                result_msg += f"，跳过未变化的文件 {report.skipped} 个"
+            if report.errors:
+                result_msg += f"，失败 {len(report.errors)} 个"
             if output_folder != directory_path:
                 result_msg += f"\n输出目录: {output_folder}"
             
@@ -122,6 +96,10 @@ class BatchJsonIncremental:
                 "increment": ("INT", {"default": 20}),  # 坐标递增步长
                 "file_prefix": ("STRING", {"default": "Modified"}),  # 输出文件前缀
             },
+            "optional": {
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "step": 1}),  # 进程数，1为单进程，0为CPU核心数
+                "skip_processed": ("BOOLEAN", {"default": True}),  # 按 .pd_workflow_edits.json 跳过已按相同规则处理且未变化的文件
+            },
         }
 
     CATEGORY = "image/PD_jsonincremental"  # 节点类别
@@ -130,7 +108,8 @@ class BatchJsonIncremental:
     RETURN_NAMES = ("result_message",)  # 返回的结果名称
     FUNCTION = "arrange_nodes_batch"
 
-    def arrange_nodes_batch(self, input_folder, output_folder, start_x, start_y, increment, file_prefix):
+    def arrange_nodes_batch(self, input_folder, output_folder, start_x, start_y, increment, file_prefix,
+                            workers=1, skip_processed=True):
         try:
             # 自动规范路径
             input_folder = os.path.normpath(input_folder)
@@ -152,63 +131,25 @@ class BatchJsonIncremental:
                 print(f"Output folder created: {output_folder}")
 
             # 获取输入文件夹中所有 JSON 文件
-            json_files = [f for f in os.listdir(input_folder) if f.endswith(".json")]
-            print(f"Found JSON files: {json_files}")
+            json_files = [os.path.basename(f) for f in list_files(input_folder, (".json",))]
+            print(f"Found {len(json_files)} JSON files")
 
             if not json_files:
                 error_msg = f"Error: 输入文件夹中没有找到 JSON 文件: {input_folder}"
                 print(error_msg)
                 return (error_msg,)
 
-            processed_files = []  # 用于记录已处理的文件列表
-
-            # 遍历所有 JSON 文件
-            for idx, json_file in enumerate(json_files):
-                input_file = os.path.join(input_folder, json_file)
-                output_file = os.path.join(output_folder, f"{file_prefix}_{idx + 1}.json")
-
-                print(f"Processing file: {input_file}")
-
-                # 读取 JSON 文件
-                try:
-                    with open(input_file, "r", encoding="utf-8") as file:
-                        data = json.load(file)
-                    print(f"Successfully loaded JSON: {input_file}")
-                except json.JSONDecodeError as e:
-                    error_msg = f"Error decoding JSON file {input_file}: {e}"
-                    print(error_msg)
-                    continue
-
-                # 提取节点列表
-                nodes = data.get("nodes", [])
-
-                if not nodes:
-                    print(f"No nodes found in file: {input_file}")
-                    continue
-
-                print(f"Found {len(nodes)} nodes in file: {input_file}")
-
-                # 按照 `id` 字段从小到大排序
-                nodes.sort(key=lambda x: x.get("id", 0))
-                print(f"Nodes sorted by ID for file: {input_file}")
-
-                # 更新每个节点的 `pos` 和 `xy`
-                for i, node in enumerate(nodes):
-                    new_x = start_x + i * increment
-                    new_y = start_y + i * increment
-                    node["pos"] = [new_x, new_y]
-                    node["xy"] = [new_x, new_y]
-                    print(f"Updated node {i} position to pos: {node['pos']}")
-
-                # 将修改后的节点写回数据
-                data["nodes"] = nodes
-
-                # 保存到新的 JSON 文件
-                with open(output_file, "w", encoding="utf-8") as file:
-                    json.dump(data, file, ensure_ascii=False, indent=4)
-
-                print(f"File saved to: {output_file}")
-                processed_files.append(output_file)
+            # 按编号生成输出文件名；节点按 id 排序后依次设置 pos/xy，没有节点的文件不输出
+            tasks = [(os.path.join(input_folder, json_file), os.path.join(output_folder, f"{file_prefix}_{idx + 1}.json"))
+                     for idx, json_file in enumerate(json_files)]
+            pbar = ProgressBar(len(tasks))
+            report = run_edits(tasks, [NodeLayoutEdit(start_x, start_y, increment)], output_folder, workers,
+                               use_index=skip_processed, on_progress=pbar.update)
+            print(report.summary())
+            # 已跳过的输出文件同样是本次结果的一部分；没有节点的文件不生成输出，不列出
+            processed_files = [r["output"] for r in report.results
+                               if r["status"] == "modified" or (r["status"] in ("unchanged", "skipped") and r["entry"]
+                                                                and not r["entry"].get("no_output"))]
 
             # 返回结果信息
             result_msg = (
@@ -224,15 +165,183 @@ class BatchJsonIncremental:
             return (error_msg,)
 
 
+class PDJSON_Pipeline:
+    """
+    按顺序执行多个工作流编辑操作：每个文件只解析一次、在内存中执行全部操作后写入一次，并输出逐文件改动报告。
+
+    操作列表每行一个：操作名 key=value ...，可用操作：
+    - group_style color=Blue font_size=20 target_title=xxx（与 PDJSON_Group 相同）
+    - group title=xxx / title_contains=xxx / match_color=Blue / not_color=Blue 筛选，color= font_size= new_title= 修改
+    - node_layout start_x=0 start_y=0 increment=20（与 PDJSON_incrementalnumber 相同）
+    - widget_replace old=xxx new=yyy node_type=xxx index=0 substring=true
+    - link_rewrite origin_id=3 origin_slot=0 new_origin_id=7 new_origin_slot=0
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "input_folder": ("STRING", {"default": r"A:\path\to\json_files"}),
+                "output_folder": ("STRING", {"default": ""}),  # 为空时写回输入文件夹
+                "operations": ("STRING", {"default": "group title_contains=Load color=Blue\nnode_layout start_x=0 start_y=0 increment=20",
+                                          "multiline": True}),
+                "filename_suffix": ("STRING", {"default": ""}),  # 输出文件名后缀，为空时与源文件同名
+                "dry_run": ("BOOLEAN", {"default": False}),  # 只生成报告，不写入文件
+            },
+            "optional": {
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "step": 1}),  # 进程数，1为单进程，0为CPU核心数
+                "skip_processed": ("BOOLEAN", {"default": True}),  # 按 .pd_workflow_edits.json 跳过已按相同规则处理且未变化的文件
+                "file_list": ("STRING", {"forceInput": True}),  # 只处理这些文件（每行一个路径，如 PDJSON_Query 的输出），此时忽略 input_folder 的文件列表
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("summary", "report")
+    FUNCTION = "run_pipeline"
+    CATEGORY = "PD Custom Nodes"
+
+    def run_pipeline(self, input_folder, output_folder, operations, filename_suffix, dry_run,
+                     workers=1, skip_processed=True, file_list=None):
+        try:
+            input_folder = os.path.normpath(input_folder)
+            in_place = not output_folder
+            output_folder = os.path.normpath(output_folder) if output_folder else input_folder
+
+            edits = parse_operations(operations)
+            if not edits:
+                return (f"错误：没有可执行的操作（可用: {', '.join(OPERATIONS)}）", "")
+
+            invalid = []
+            if file_list and file_list.strip():
+                # 只处理指定的文件；未指定输出文件夹时写回各自所在的文件夹，
+                # 否则在输出文件夹中保留相对于这些文件共同上级文件夹的路径，不同文件夹中的同名文件不会互相覆盖
+                json_files = []
+                for line in file_list.splitlines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    path = os.path.normpath(line)
+                    if not path.lower().endswith(".json"):
+                        invalid.append(f"{line}（不是 .json 文件）")
+                    elif not os.path.isfile(path):
+                        invalid.append(f"{line}（文件不存在）")
+                    elif path not in json_files:
+                        json_files.append(path)
+                if not json_files:
+                    return ("错误：file_list 中没有可处理的JSON文件\n" + "\n".join(f"  • {line}" for line in invalid), "")
+                try:
+                    source_root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in json_files])
+                except ValueError:
+                    # 不在同一磁盘上，没有共同的上级文件夹
+                    source_root = None
+            else:
+                if not os.path.exists(input_folder):
+                    return (f"错误：输入文件夹不存在: {input_folder}", "")
+                json_files = list_files(input_folder, (".json",))
+                source_root = input_folder
+            if not json_files:
+                return (f"错误：没有找到JSON文件: {input_folder}", "")
+
+            tasks = []
+            for path in json_files:
+                base_name, ext = os.path.splitext(os.path.basename(path))
+                if in_place:
+                    target_folder = os.path.dirname(path)
+                elif source_root is None:
+                    target_folder = output_folder
+                else:
+                    target_folder = os.path.join(output_folder, os.path.relpath(os.path.dirname(os.path.abspath(path)),
+                                                                                source_root))
+                tasks.append((path, os.path.normpath(os.path.join(target_folder, f"{base_name}{filename_suffix}{ext}"))))
+            targets = {}
+            for path, target in tasks:
+                if target in targets:
+                    return (f"错误：输出文件重复: {target}\n  {targets[target]}\n  {path}", "")
+                targets[target] = path
+            if not dry_run and not in_place:
+                for target in targets:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            pbar = ProgressBar(len(tasks))
+            report = run_edits(tasks, edits, None if in_place else output_folder, workers, dry_run=dry_run,
+                               use_index=skip_processed and not dry_run, on_progress=pbar.update)
+            summary = report.summary() + f"\n执行操作: {' → '.join(edit.name for edit in edits)}"
+            if not in_place:
+                summary += f"\n输出目录: {output_folder}"
+            if invalid:
+                summary += f"\nfile_list 中忽略 {len(invalid)} 个路径：\n" + "\n".join(f"  • {line}" for line in invalid)
+            print(summary)
+            return (summary, report.details())
+        except Exception as e:
+            return (f"处理出错: {str(e)}", "")
+
+class PDJSON_Query:
+    """
+    在工作流存档索引中查询，输出匹配的文件列表（可接到 PDJSON_Pipeline 的 file_list，只编辑这些文件）。
+    索引保存在 ComfyUI 用户目录的 pd_cache/workflow_index.sqlite3，每次运行只重新解析新增和修改过的文件。
+
+    查询每行一个条件，结果为同时满足所有条件的文件：
+    - node type=KSampler / type_contains=Loader
+    - model name=sd_xl_base_1.0.safetensors / contains=sdxl node_type=CheckpointLoaderSimple
+    - widget value=euler / contains=xxx node_type=KSampler name=4
+    - group title="Load Models" / title_contains=Load，color=Blue / not_color=Blue
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "folders": ("STRING", {"default": "", "multiline": True}),  # 每行一个文件夹，为空时为插件自带的 workflow 和 input 文件夹
+                "query": ("STRING", {"default": "group title_contains=Load not_color=Blue", "multiline": True}),
+                "recursive": ("BOOLEAN", {"default": False}),  # 是否包括子文件夹
+            },
+            "optional": {
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "step": 1}),  # 解析进程数，1为单进程，0为CPU核心数
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "INT")
+    RETURN_NAMES = ("file_list", "report", "count")
+    FUNCTION = "run_query"
+    CATEGORY = "PD Custom Nodes"
+
+    @staticmethod
+    def _folders(folders):
+        return [line.strip() for line in (folders or "").splitlines() if line.strip()] or DEFAULT_FOLDERS
+
+    @classmethod
+    def IS_CHANGED(cls, folders="", query="", recursive=False, **kwargs):
+        # 存档中的文件有增删改时才重新执行
+        return folders_fingerprint(cls._folders(folders), recursive)
+
+    def run_query(self, folders, query, recursive, workers=1):
+        try:
+            folder_list = self._folders(folders)
+            index = get_workflow_index()
+            stats = index.refresh(folder_list, recursive, workers)
+            result = index.find(query, folder_list, recursive)
+
+            report = f"{stats.summary()}\n匹配 {len(result.paths)} 个文件"
+            if stats.errors:
+                report += "\n解析失败：\n" + "\n".join(f"  • {path}: {error}" for path, error in stats.errors[:20])
+            if result.paths:
+                report += "\n" + result.report()
+            print(report)
+            return ("\n".join(result.paths), report, len(result.paths))
+        except Exception as e:
+            return ("", f"查询出错: {str(e)}（可用查询: {', '.join(QUERIES)}）", 0)
+
 
 # 将节点类映射到 ComfyUI 节点
 NODE_CLASS_MAPPINGS = {
     "PDJSON_BatchJsonIncremental": BatchJsonIncremental,  # 节点内部名称
     "PDJSON_Group": PDJSON_Group,   
+    "PDJSON_Pipeline": PDJSON_Pipeline,
+    "PDJSON_Query": PDJSON_Query,
 }
 
 # 可选：为节点增加更友好的名称
 NODE_DISPLAY_NAME_MAPPINGS = {
     "PDJSON_BatchJsonIncremental": "PDJSON_incrementalnumber",  # 节点显示名称
     "PDJSON_Group": "PDJSON_Group",
+    "PDJSON_Pipeline": "PDJSON_Pipeline",
+    "PDJSON_Query": "PDJSON_Query",
 }
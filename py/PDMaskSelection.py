@@ -22,46 +22,46 @@ class PD_MASK_SELECTION:
 
     def mask_selection(self, mask1, image1, mask2, image2):
         def calculate_mask_area(mask):
-            # Convert to numpy if it's a tensor
-            if isinstance(mask, torch.Tensor):
-                mask_np = mask.cpu().numpy()
-            else:
-                mask_np = np.array(mask)
-            
-            # Handle batch dimension if present
-            if len(mask_np.shape) == 4:  # [B, H, W, C] or [B, H, W]
-                mask_np = mask_np[0]  # Take first in batch
-            
-            # If still 3D (H,W,C), convert to 2D by taking max across channels
-            if len(mask_np.shape) == 3:
-                mask_np = mask_np.max(axis=-1)
-            
-            # Calculate non-zero area
-            area = (mask_np > 0).sum()
-            return area
-        
-        # Calculate areas
+            """Per-frame non-zero area, one reduction over (B, H, W) on the mask's own device"""
+            if not isinstance(mask, torch.Tensor):
+                mask = torch.as_tensor(np.array(mask))
+            if mask.dim() == 2:  # [H, W]
+                mask = mask.unsqueeze(0)
+            elif mask.dim() == 4:  # [B, H, W, C] -> max across channels
+                mask = mask.amax(dim=-1)
+            return (mask > 0).flatten(1).sum(dim=1)
+
+        # Calculate areas, one value per frame (a single-frame input broadcasts against a batch)
         area1 = calculate_mask_area(mask1)
-        area2 = calculate_mask_area(mask2)
-        
-        # If both masks are empty (black), return first pair (or could return empty)
-        if area1 == 0 and area2 == 0:
+        area2 = calculate_mask_area(mask2).to(area1.device)
+        if area1.shape[0] != area2.shape[0] and 1 not in (area1.shape[0], area2.shape[0]):
+            # Batch sizes that cannot be paired frame by frame (e.g. 2 vs 3): choose the whole pair
+            # from the first frames, as the single-frame comparison did
+            print(f"PD_MASK_SELECTION: batch sizes {area1.shape[0]} and {area2.shape[0]} differ, "
+                  f"using the first frame's choice")
+            area1, area2 = area1[:1], area2[:1]
+
+        # Per frame: prefer the non-empty mask, and the smaller one when both have content;
+        # when both are empty keep the first pair
+        use_second = ((area1 == 0) & (area2 > 0)) | ((area1 > 0) & (area2 > 0) & (area2 <= area1))
+
+        if not use_second.any():
+            return (mask1, image1)
+        if use_second.all():
+            return (mask2, image2)
+
+        # Mixed batch: pick per frame
+        try:
+            pick = use_second.to(mask1.device)
+            selected_mask = torch.where(pick.view(-1, *[1] * (mask1.dim() - 1)), mask2.to(mask1.device), mask1)
+            pick = use_second.to(image1.device)
+            selected_image = torch.where(pick.view(-1, 1, 1, 1), image2.to(image1.device), image1)
+        except RuntimeError as e:
+            # Pairs whose sizes differ cannot be mixed frame by frame; fall back to the first frame's choice
+            print(f"PD_MASK_SELECTION: cannot mix frames of different sizes ({e}), using the first frame's choice")
+            if use_second[0]:
+                return (mask2, image2)
             return (mask1, image1)
-        
-        # Select mask-image pair with smaller non-zero area
-        if area1 == 0:  # mask1 is empty, use mask2 pair
-            selected_mask = mask2
-            selected_image = image2
-        elif area2 == 0:  # mask2 is empty, use mask1 pair
-            selected_mask = mask1
-            selected_image = image1
-        else:  # Both have content, choose smaller
-            if area1 < area2:
-                selected_mask = mask1
-                selected_image = image1
-            else:
-                selected_mask = mask2
-                selected_image = image2
         
         return (selected_mask, selected_image)
 
@@ -1,54 +1,55 @@
 import torch
-from PIL import Image
-import numpy as np
+import torch.nn.functional as F
 import math
 
-def tensor2pil(tensor):
-    # 将 tensor 转换为 PIL Image
-    return Image.fromarray((tensor.cpu().numpy().squeeze() * 255).astype(np.uint8))
-
-def pil2tensor(pil_image):
-    # 将 PIL Image 转换为 tensor
-    return torch.from_numpy(np.array(pil_image).astype(np.float32) / 255.0).unsqueeze(0)
-
 def get_min_bounding_rect(width, height, angle):
     """
     计算旋转后的最小外接矩形尺寸
+    旋转后的矩形外接框宽为 |W·cos| + |H·sin|，高为 |W·sin| + |H·cos|
     """
     angle_rad = math.radians(angle)
     cos_angle = abs(math.cos(angle_rad))
     sin_angle = abs(math.sin(angle_rad))
-    
-    # 计算旋转后的四个角点
-    corners = [
-        (0, 0),
-        (width, 0),
-        (width, height),
-        (0, height)
-    ]
-    
-    # 旋转角点
-    rotated_corners = []
-    for x, y in corners:
-        # 将坐标原点移到中心
-        x -= width / 2
-        y -= height / 2
-        # 旋转
-        new_x = x * cos_angle - y * sin_angle
-        new_y = x * sin_angle + y * cos_angle
-        rotated_corners.append((new_x, new_y))
-    
-    # 计算最小外接矩形的尺寸
-    min_x = min(x for x, _ in rotated_corners)
-    max_x = max(x for x, _ in rotated_corners)
-    min_y = min(y for _, y in rotated_corners)
-    max_y = max(y for _, y in rotated_corners)
-    
-    new_width = int(max_x - min_x)
-    new_height = int(max_y - min_y)
-    
+
+    # 减去极小值避免浮点误差导致多出一行/列空白
+    new_width = max(1, math.ceil(width * cos_angle + height * sin_angle - 1e-6))
+    new_height = max(1, math.ceil(width * sin_angle + height * cos_angle - 1e-6))
+
     return new_width, new_height
 
+def rotate_batch(images, rotation, sampler="bilinear"):
+    """
+    整批旋转图片（逆时针，与 PIL rotate 方向一致），输出尺寸为旋转后的最小外接矩形，
+    外接矩形内原图未覆盖的区域填充为黑色
+
+    参数：
+    - images: 图像张量 [B, H, W, C]
+    - rotation: 旋转角度（度）
+    - sampler: 插值方式 nearest / bilinear / bicubic
+
+    返回：
+    - 旋转后的图像张量 [B, H', W', C]
+    """
+    batch, height, width, channels = images.shape
+    new_width, new_height = get_min_bounding_rect(width, height, rotation)
+
+    # 输出像素 -> 输入像素的逆映射（归一化坐标，align_corners=False）
+    angle_rad = math.radians(rotation)
+    cos_a, sin_a = math.cos(angle_rad), math.sin(angle_rad)
+    theta = torch.tensor([[
+        [cos_a * new_width / width, -sin_a * new_height / width, 0.0],
+        [sin_a * new_width / height, cos_a * new_height / height, 0.0],
+    ]], dtype=torch.float32, device=images.device)
+    grid = F.affine_grid(theta, [1, channels, new_height, new_width], align_corners=False)
+    grid = grid.expand(batch, -1, -1, -1)
+
+    samples = images.permute(0, 3, 1, 2).float()
+    rotated = F.grid_sample(samples, grid, mode=sampler, padding_mode="zeros", align_corners=False)
+    # bicubic 会产生超出范围的过冲
+    rotated = rotated.clamp(0.0, 1.0)
+
+    return rotated.permute(0, 2, 3, 1).to(images.dtype)
+
 class PD_Image_Rotate_v1:
     """
     对输入的图片进行旋转，支持任意角度旋转，并且可以选择不同的插值方式（nearest、bilinear、bicubic），还可以选择旋转模式（internal 或 transpose）。
@@ -75,66 +76,22 @@ class PD_Image_Rotate_v1:
     CATEGORY = "PD Suite/Image/Transform"
 
     def image_rotate(self, images, mode, rotation, sampler):
-        batch_tensor = []
-        for image in images:
-            # PIL Image
-            image = tensor2pil(image)
-            original_width, original_height = image.size
-
-            # Check rotation
-            if rotation > 360:
-                rotation = int(360)
-            if rotation < -360:
-                rotation = int(-360)
-
-            # Set Sampler
-            if sampler:
-                if sampler == 'nearest':
-                    sampler = Image.NEAREST
-                elif sampler == 'bicubic':
-                    sampler = Image.BICUBIC
-                elif sampler == 'bilinear':
-                    sampler = Image.BILINEAR
-                else:
-                    sampler = Image.BILINEAR
-
-            # Rotate Image
-            if mode == 'internal':
-                # 先转为RGBA，背景透明
-                image_rgba = image.convert('RGBA')
-                rotated = image_rgba.rotate(rotation, sampler, expand=True)
-                # 自动裁剪非透明内容
-                bbox = rotated.getbbox()
-                if bbox:
-                    rotated = rotated.crop(bbox)
-                # 转回RGB，透明部分填充为黑色
-                image = rotated.convert('RGB')
-            else:
-                # 对于非90度倍数的角度，强制使用internal模式
-                if rotation % 90 != 0:
-                    # 计算最小外接矩形尺寸
-                    new_width, new_height = get_min_bounding_rect(original_width, original_height, rotation)
-                    # 创建新的透明背景
-                    new_image = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
-                    # 将原图粘贴到中心位置
-                    paste_x = (new_width - original_width) // 2
-                    paste_y = (new_height - original_height) // 2
-                    new_image.paste(image, (paste_x, paste_y))
-                    # 旋转图片
-                    image_rgba = new_image.convert('RGBA')
-                    rotated = image_rgba.rotate(rotation, sampler, expand=True)
-                    bbox = rotated.getbbox()
-                    if bbox:
-                        rotated = rotated.crop(bbox)
-                    image = rotated.convert('RGB')
-                else:
-                    rot = int(rotation / 90)
-                    for _ in range(rot):
-                        image = image.transpose(2)
-
-            batch_tensor.append(pil2tensor(image))
-
-        batch_tensor = torch.cat(batch_tensor, dim=0)
+        # Check rotation
+        rotation = max(-360, min(360, int(rotation)))
+
+        if sampler not in ("nearest", "bilinear", "bicubic"):
+            sampler = "bilinear"
+
+        # 输出始终为 RGB
+        images = images[..., :3]
+
+        if mode == "transpose" and rotation % 90 == 0:
+            # transpose：90度的整数倍用 rot90 无损旋转（负角度为顺时针），不经过插值
+            batch_tensor = torch.rot90(images, k=(rotation // 90) % 4, dims=(1, 2))
+        else:
+            # internal，以及 transpose 下非90度倍数的角度（与旧版本一致改为任意角度旋转）：
+            # 整批做一次仿射采样，并直接输出旋转后的最小外接矩形
+            batch_tensor = rotate_batch(images, rotation, sampler)
 
         return (batch_tensor,)
 
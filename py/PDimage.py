@@ -185,7 +185,8 @@ class PD_GetImageSize:
 from PIL import Image, ImageOps
 import folder_paths
 from typing import Tuple
-from math import floor
+from ._dir_index import list_files
+from ._batch_resize import build_tasks, run_batch
 
 class BatchImageRename:
     """
@@ -198,6 +199,7 @@ class BatchImageRename:
     批量图片重命名(带输出路径选项)
     输入: 文件路径, 输出路径, 后缀, 输出格式, 开始编号, 前缀
     输出: 处理结果文本摘要
+    workers > 1 时按分片交给进程池处理，单个文件失败不会中断整批任务
     """
     @classmethod
     def INPUT_TYPES(cls):
@@ -214,6 +216,8 @@ class BatchImageRename:
             "optional": {
                 "keep_aspect_ratio": ("BOOLEAN", {"default": True}),
                 "resize_enabled": ("BOOLEAN", {"default": True}),
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "step": 1}),  # 进程数，1为单进程，0为CPU核心数
+                "exact_output": ("BOOLEAN", {"default": True}),  # 关闭后JPEG按draft()低分辨率解码再缩放，速度更快
             }
         }
     
@@ -224,7 +228,8 @@ class BatchImageRename:
     
     def process_images(self, input_folder: str, output_folder: str, filename: str, suffix: str, 
                      output_format: str, max_side_length: int, start_number: int,
-                     keep_aspect_ratio: bool = True, resize_enabled: bool = True) -> Tuple[str]:
+                     keep_aspect_ratio: bool = True, resize_enabled: bool = True, workers: int = 1,
+                     exact_output: bool = True) -> Tuple[str]:
         
         # 处理 output_format 可能为索引的情况
         if isinstance(output_format, int):
@@ -242,71 +247,27 @@ class BatchImageRename:
             
         # 获取输入文件夹中的所有图片文件
         image_extensions = ['.png', '.jpg', '.jpeg', '.webp', '.bmp']
-        input_files = []
-        for file in os.listdir(input_folder):
-            if any(file.lower().endswith(ext) for ext in image_extensions):
-                input_files.append(os.path.join(input_folder, file))
+        input_files = list_files(input_folder, image_extensions)
         
         if not input_files:
             return (f"错误: 在文件夹中未找到图片文件: {input_folder}",)
         
-        renamed_files = []
-        counter = start_number
-        processed_count = 0
-        resize_info = []
-        
-        for input_file in sorted(input_files):
-            try:
-                # 获取原文件名（不带扩展名）
-                original_name = os.path.splitext(os.path.basename(input_file))[0]
-                
-                # 确定新文件名
-                if filename:  # 如果指定了新文件名
-                    new_name = f"{filename}{suffix}{counter}"
-                else:  # 否则保留原文件名
-                    new_name = original_name
-                
-                new_filename = f"{new_name}.{output_format}"
-                output_path = os.path.join(output_folder, new_filename)
-                
-                # 打开图片
-                img = Image.open(input_file)
-                original_width, original_height = img.size
-                
-                # 调整尺寸逻辑
-                if resize_enabled and keep_aspect_ratio:
-                    # 强制将最长边缩放到 max_side_length（无论原始尺寸大小）
-                    if original_width >= original_height:
-                        scale_ratio = max_side_length / original_width
-                        new_width = max_side_length
-                        new_height = floor(original_height * scale_ratio)
-                    else:
-                        scale_ratio = max_side_length / original_height
-                        new_height = max_side_length
-                        new_width = floor(original_width * scale_ratio)
-                    
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
-                    resize_info.append(
-                        f"{os.path.basename(input_file)}: {img.size[0]}x{img.size[1]} (最长边已强制为 {max_side_length}px)"
-                    )
-                elif resize_enabled and not keep_aspect_ratio:
-                    # 不保持宽高比，强制为正方形
-                    img = ImageOps.fit(img, (max_side_length, max_side_length), method=Image.LANCZOS)
-                    resize_info.append(
-                        f"{os.path.basename(input_file)}: 强制调整为 {max_side_length}x{max_side_length}"
-                    )
-                
-                # 保存图片
-                if output_format.lower() == 'png':
-                    img.save(output_path, format='PNG', compress_level=4)
-                elif output_format.lower() == 'jpg':
-                    img.save(output_path, format='JPEG', quality=90)
-                
-                renamed_files.append(new_filename)
-                counter += 1
-                processed_count += 1
-            except Exception as e:
-                return (f"处理文件 {os.path.basename(input_file)} 时出错: {str(e)}",)
+        # 编号在分发前按排序后的文件列表确定，多进程处理时结果保持确定
+        tasks = build_tasks(input_files, output_folder, filename, suffix, output_format, start_number)
+        options = {
+            "max_side_length": max_side_length,
+            "keep_aspect_ratio": keep_aspect_ratio,
+            "resize_enabled": resize_enabled,
+            "output_format": output_format.lower(),
+            "exact_output": exact_output,
+        }
+
+        pbar = comfy.utils.ProgressBar(len(tasks))
+        results = run_batch(tasks, options, workers, on_progress=pbar.update)
+
+        processed_count = sum(1 for r in results if r["ok"])
+        resize_info = [r["info"] for r in results if r["ok"] and r["info"]]
+        failures = [r for r in results if not r["ok"]]
         
         # 生成结果摘要
         summary_lines = [
@@ -319,6 +280,9 @@ class BatchImageRename:
             f"• 最长边强制为: {max_side_length}px",
             f"• 保持宽高比: {'是' if keep_aspect_ratio else '否'}",
         ]
+
+        if failures:
+            summary_lines.append(f"• 处理失败: {len(failures)}张")
         
         if resize_info:
             summary_lines.append("\n尺寸调整详情:")
@@ -326,16 +290,41 @@ class BatchImageRename:
                 summary_lines.append(f"  {info}")
             if len(resize_info) > 3:
                 summary_lines.append(f"  (共处理 {len(resize_info)} 张图片...)")
+
+        if failures:
+            summary_lines.append("\n失败详情:")
+            for failure in failures[:10]:
+                summary_lines.append(f"  处理文件 {os.path.basename(failure['src'])} 时出错: {failure['error']}")
+            if len(failures) > 10:
+                summary_lines.append(f"  (共 {len(failures)} 个文件失败...)")
         
         summary = "\n".join(summary_lines)
         
         return (summary,)
 
-from PIL import Image, ImageOps
+from ._image_cache import get_image_cache
+from ._image_io import DecodeOptions, DirectoryImageStream, load_with_cap
 
 class Load_Images:
     """
     A ComfyUI node to load multiple images from a directory with various options.
+
+    With stream_mode enabled the directory is indexed once and only the window
+    [start_index + page * window_size, +window_size) is decoded, so memory use
+    stays flat regardless of the folder size.
+
+    decode_workers > 1 decodes files on a thread pool (0 = one per CPU core);
+    output order always follows the sorted listing. prefetch_next decodes the
+    next window in the background while downstream nodes run.
+
+    use_cache keeps decoded pixels in an on-disk cache keyed by path, mtime and
+    size (LRU-evicted above cache_size_mb), and IS_CHANGED fingerprints the
+    window's files plus the folder's image count and mtime, so unchanged
+    folders are not re-executed.
+
+    max_side_length > 0 shrinks images whose longer side exceeds it (LANCZOS).
+    With exact_output disabled, JPEGs are decoded at a reduced scale via
+    draft() (other formats via reduce()) before the final resample.
     """
     
     def __init__(self):
@@ -368,6 +357,54 @@ class Load_Images:
                 "load_always": ([False, True], {
                     "default": False
                 }),
+                "stream_mode": ("BOOLEAN", {
+                    "default": False
+                }),
+                "window_size": ("INT", {
+                    "default": 16,
+                    "min": 1,
+                    "max": 100000,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "page": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 0xffffffffffffffff,
+                    "step": 1,
+                    "display": "number",
+                    "control_after_generate": True
+                }),
+                "decode_workers": ("INT", {
+                    "default": 1,
+                    "min": 0,
+                    "max": 256,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "prefetch_next": ("BOOLEAN", {
+                    "default": False
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": False
+                }),
+                "cache_size_mb": ("INT", {
+                    "default": 4096,
+                    "min": 64,
+                    "max": 1048576,
+                    "step": 64,
+                    "display": "number"
+                }),
+                "max_side_length": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 16384,
+                    "step": 8,
+                    "display": "number"
+                }),
+                "exact_output": ("BOOLEAN", {
+                    "default": True
+                }),
             }
         }
 
@@ -381,56 +418,51 @@ class Load_Images:
     def IS_CHANGED(cls, **kwargs):
         if 'load_always' in kwargs and kwargs['load_always']:
             return float("NaN")
-        else:
-            return hash(frozenset(kwargs))
 
-    def load_images(self, directory: str, image_load_cap: int = 0, start_index: int = 0, load_always=False):
+        directory = kwargs.get('directory', "")
+        start_index = kwargs.get('start_index', 0)
+        if kwargs.get('stream_mode', False):
+            window_size = kwargs.get('window_size', 16)
+            offset, size = start_index + kwargs.get('page', 0) * window_size, window_size
+        else:
+            offset, size = start_index, kwargs.get('image_load_cap', 0)
+
+        try:
+            return DirectoryImageStream(directory).fingerprint(offset, size)
+        except OSError:
+            # 目录不存在时交给 load_images 报错
+            return hash(frozenset(kwargs.items()))
+
+    def load_images(self, directory: str, image_load_cap: int = 0, start_index: int = 0, load_always=False,
+                    stream_mode: bool = False, window_size: int = 16, page: int = 0,
+                    decode_workers: int = 1, prefetch_next: bool = False,
+                    use_cache: bool = False, cache_size_mb: int = 4096,
+                    max_side_length: int = 0, exact_output: bool = True):
         if not os.path.isdir(directory):
             raise FileNotFoundError(f"Directory '{directory}' cannot be found.")
-        
-        dir_files = os.listdir(directory)
-        if len(dir_files) == 0:
+
+        stream = DirectoryImageStream(directory)
+        if len(stream) == 0:
             raise FileNotFoundError(f"No files in directory '{directory}'.")
 
-        # Filter files by extension
-        valid_extensions = ['.jpg', '.jpeg', '.png', '.webp']
-        dir_files = [f for f in dir_files if any(f.lower().endswith(ext) for ext in valid_extensions)]
-        dir_files = sorted(dir_files)
-        dir_files = [os.path.join(directory, x) for x in dir_files]
+        cache = get_image_cache(cache_size_mb) if use_cache else None
+        options = DecodeOptions(max_side_length, exact_output)
+
+        if stream_mode:
+            # 流式模式：只解码当前页对应的窗口
+            offset = start_index + page * window_size
+            if offset >= len(stream):
+                raise ValueError(
+                    f"Page {page} is out of range: offset {offset} >= {len(stream)} images in '{directory}'."
+                )
+            images, masks, file_paths = stream.load_window(offset, window_size, decode_workers, prefetch_next, cache, options)
+            if not images:
+                raise ValueError("No valid images found in the directory.")
+            return (images, masks, file_paths)
 
         # Apply start index
-        dir_files = dir_files[start_index:]
-
-        images = []
-        masks = []
-        file_paths = []
-
-        limit_images = image_load_cap > 0
-        image_count = 0
-
-        for image_path in dir_files:
-            if limit_images and image_count >= image_load_cap:
-                break
-                
-            try:
-                i = Image.open(image_path)
-                i = ImageOps.exif_transpose(i)
-                image = i.convert("RGB")
-                image = np.array(image).astype(np.float32) / 255.0
-                image = torch.from_numpy(image)[None,]
-
-                if 'A' in i.getbands():
-                    mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
-                    mask = 1. - torch.from_numpy(mask)
-                else:
-                    mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
-
-                images.append(image)
-                masks.append(mask)
-                file_paths.append(str(image_path))
-                image_count += 1
-            except Exception as e:
-                print(f"Error loading image {image_path}: {e}")
+        dir_files = stream.window_paths(start_index, 0)
+        images, masks, file_paths = load_with_cap(dir_files, image_load_cap, decode_workers, cache, options)
 
         if not images:
             raise ValueError("No valid images found in the directory.")
@@ -438,8 +470,7 @@ class Load_Images:
         return (images, masks, file_paths)
     
 from torchvision.transforms import InterpolationMode
-import torch.nn.functional as F
-from comfy.utils import common_upscale
+from ._resize import RESIZE_METHODS, fit_side, resize_images
 
 class PDIMAGE_LongerSize:
     """
@@ -457,47 +488,33 @@ class PDIMAGE_LongerSize:
                     "max": 99999, 
                     "step": 1
                 }),
-                "interpolation": (["nearest", "bilinear", "bicubic", "area", "nearest-exact"], {
+                "interpolation": (RESIZE_METHODS, {
                     "default": "bicubic"
                 }),
             },
+            "optional": {
+                # Tile the resize under this memory budget (MB); 0 resizes the whole batch at once
+                "memory_budget_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64}),
+            },
         }
     
     RETURN_TYPES = ("IMAGE",)
     FUNCTION = "resize_longer_side"
     CATEGORY = "image/transform"
 
-    def resize_longer_side(self, image: torch.Tensor, size: int, interpolation: str = "bicubic"):
+    def resize_longer_side(self, image: torch.Tensor, size: int, interpolation: str = "bicubic",
+                           memory_budget_mb: int = 0):
         if len(image.shape) != 4:
             raise ValueError("Input image must be 4-dimensional (BxHxWxC)")
             
         _, h, w, _ = image.shape
         
         # Calculate new dimensions while maintaining aspect ratio
-        if h >= w:
-            new_h = size
-            new_w = int(w * (size / h))
-        else:
-            new_w = size
-            new_h = int(h * (size / w))
-        
-        # Convert to CHW format for upscaling
-        samples = image.movedim(-1, 1)
-        
-        # Map interpolation string to ComfyUI's method
-        if interpolation == "nearest-exact":
-            interpolation = "nearest_exact"
-            
-        samples = common_upscale(
-            samples, 
-            new_w, 
-            new_h, 
-            interpolation, 
-            False
-        )
-        
-        # Convert back to HWC format
-        image = samples.movedim(1, -1)
+        new_h, new_w = fit_side(h, w, size, "longest")
+
+        # Whole batch in one call; an explicit method is used as-is (plain "bicubic" like common_upscale),
+        # "auto" picks area / antialiased bicubic / bicubic
+        image = resize_images(image, new_h, new_w, interpolation, memory_budget_mb=memory_budget_mb)
         
         return (image,)
 
@@ -0,0 +1,109 @@
+"""
+PD后台写盘队列
+把编码、压缩、写文件交给线程池执行，节点提交后立即返回；
+排队中的任务数超过上限时提交会阻塞（背压），避免待写帧占满内存；
+写入失败的信息保存下来，在下一次执行时取出报告
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Set
+
+
+class AsyncWriter:
+    """
+    后台写盘队列
+
+    参数：
+    - workers: 写盘线程数
+    - max_pending: 最多同时排队/执行的任务数（每个任务通常持有一帧像素）
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pd_writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending: Set[Future] = set()
+        self._errors: List[str] = []
+
+    def submit(self, fn: Callable, *args, label: str = "") -> Future:
+        """
+        提交写盘任务，队列已满时阻塞直到有任务完成
+
+        参数：
+        - fn: 在写盘线程中执行的函数
+        - label: 出错时用于报告的标识（通常为文件路径）
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda f: self._done(f, label))
+        return future
+
+    def _done(self, future: Future, label: str) -> None:
+        with self._lock:
+            self._pending.discard(future)
+            error = future.exception()
+            if error is not None:
+                self._errors.append(f"{label}: {error}" if label else str(error))
+        self._slots.release()
+
+    def pending(self) -> int:
+        """当前排队/执行中的任务数"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已提交的任务完成，超时返回 False"""
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return True
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def take_errors(self) -> List[str]:
+        """取出并清空累计的写入错误"""
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def shutdown(self) -> None:
+        """等待队列写完并关闭线程池"""
+        self._executor.shutdown(wait=True)
+
+
+_writer: Optional[AsyncWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_async_writer(workers: int = 2, max_pending: int = 16) -> AsyncWriter:
+    """
+    获取共享写盘队列；参数变化时等待旧队列写完再重建，
+    旧队列中未报告的错误会转移到新队列
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None and (_writer.workers, _writer.max_pending) != (workers, max_pending):
+            _writer.shutdown()
+            errors = _writer.take_errors()
+            _writer = AsyncWriter(workers, max_pending)
+            _writer._errors.extend(errors)
+        elif _writer is None:
+            _writer = AsyncWriter(workers, max_pending)
+        return _writer
+
+
+def take_writer_errors() -> List[str]:
+    """取出共享写盘队列累计的写入错误（队列尚未创建时返回空列表）"""
+    with _writer_lock:
+        writer = _writer
+    return writer.take_errors() if writer is not None else []
+
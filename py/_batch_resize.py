@@ -0,0 +1,161 @@
+"""
+PD批量缩放/重新编码引擎
+供 PDIMAGE:Rename 使用：编号在分发前按排序后的文件列表确定，
+文件按分片交给进程池处理（见 _process_pool），单个文件失败不会中断整批任务
+"""
+
+import os
+from math import floor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from ._process_pool import run_sharded
+
+# EXIF 方向值 5~8 表示 exif_transpose 后宽高互换
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def reduce_for_target(img: Image.Image, target_size: Tuple[int, int], exact: bool = False,
+                      exif_oriented: bool = False) -> Image.Image:
+    """
+    在最终 LANCZOS 缩放之前降低解码分辨率，缩小后的尺寸始终不小于目标尺寸：
+    - JPEG 使用 draft() 直接按 1/2、1/4、1/8 比例解码，解码耗时和内存都成倍下降
+    - 其他格式解码后用 reduce() 按 2 的幂次整数倍缩小，降低后续重采样的开销
+
+    参数：
+    - img: 刚打开、尚未 load 的图片
+    - target_size: 最终输出尺寸 (宽, 高)
+    - exact: 为 True 时不做任何处理，保证结果与全分辨率解码完全一致
+    - exif_oriented: target_size 是否为 exif_transpose 之后的方向
+
+    返回：
+    - 降低分辨率后的图片（结果与全分辨率缩放近似一致）
+    """
+    if exact:
+        return img
+
+    target_w, target_h = target_size
+    if exif_oriented and img.getexif().get(EXIF_ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+        target_w, target_h = target_h, target_w
+    if target_w <= 0 or target_h <= 0:
+        return img
+
+    width, height = img.size
+    if width < target_w * 2 or height < target_h * 2:
+        return img
+
+    if img.format == "JPEG":
+        img.draft(img.mode, (target_w, target_h))
+        return img
+
+    factor = 1
+    while width // (factor * 2) >= target_w and height // (factor * 2) >= target_h:
+        factor *= 2
+    if factor > 1:
+        if img.mode in ("1", "P"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        img = img.reduce(factor)
+    return img
+
+
+def build_tasks(input_files: List[str], output_folder: str, filename: str, suffix: str,
+                output_format: str, start_number: int) -> List[Dict]:
+    """
+    为排序后的文件列表预先分配输出文件名（编号在分发前确定，与处理顺序无关）
+
+    返回：
+    - 任务列表，每项包含 index、src、dst、new_filename
+    """
+    tasks = []
+    for index, input_file in enumerate(sorted(input_files)):
+        counter = start_number + index
+        if filename:  # 如果指定了新文件名
+            new_name = f"{filename}{suffix}{counter}"
+        else:  # 否则保留原文件名
+            new_name = os.path.splitext(os.path.basename(input_file))[0]
+        new_filename = f"{new_name}.{output_format}"
+        tasks.append({
+            "index": index,
+            "src": input_file,
+            "dst": os.path.join(output_folder, new_filename),
+            "new_filename": new_filename,
+        })
+    return tasks
+
+
+def process_task(task: Dict, options: Dict) -> Dict:
+    """
+    处理单个文件：打开、按需缩放、保存
+
+    参数：
+    - task: build_tasks 生成的任务
+    - options: max_side_length / keep_aspect_ratio / resize_enabled / output_format / exact_output
+
+    返回：
+    - 结果字典，ok 为 True 时包含 info（尺寸调整说明），否则包含 error
+    """
+    result = {"index": task["index"], "src": task["src"], "new_filename": task["new_filename"]}
+    max_side_length = options["max_side_length"]
+    basename = os.path.basename(task["src"])
+
+    try:
+        img = Image.open(task["src"])
+        original_width, original_height = img.size
+        info = None
+
+        if options["resize_enabled"] and options["keep_aspect_ratio"]:
+            # 强制将最长边缩放到 max_side_length（无论原始尺寸大小）
+            if original_width >= original_height:
+                scale_ratio = max_side_length / original_width
+                new_width = max_side_length
+                new_height = floor(original_height * scale_ratio)
+            else:
+                scale_ratio = max_side_length / original_height
+                new_height = max_side_length
+                new_width = floor(original_width * scale_ratio)
+
+            img = reduce_for_target(img, (new_width, new_height), options.get("exact_output", True))
+            img = img.resize((new_width, new_height), Image.LANCZOS)
+            info = f"{basename}: {img.size[0]}x{img.size[1]} (最长边已强制为 {max_side_length}px)"
+        elif options["resize_enabled"] and not options["keep_aspect_ratio"]:
+            # 不保持宽高比，强制为正方形
+            img = reduce_for_target(img, (max_side_length, max_side_length), options.get("exact_output", True))
+            img = ImageOps.fit(img, (max_side_length, max_side_length), method=Image.LANCZOS)
+            info = f"{basename}: 强制调整为 {max_side_length}x{max_side_length}"
+
+        # 保存图片
+        if options["output_format"] == 'png':
+            img.save(task["dst"], format='PNG', compress_level=4)
+        elif options["output_format"] == 'jpg':
+            img.save(task["dst"], format='JPEG', quality=90)
+
+        result["ok"] = True
+        result["info"] = info
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = str(e)
+    return result
+
+
+def run_batch(tasks: List[Dict], options: Dict, workers: int = 1,
+              on_progress: Optional[Callable[[int], None]] = None) -> List[Dict]:
+    """
+    执行批量任务
+
+    参数：
+    - tasks: build_tasks 生成的任务列表
+    - options: 处理参数，见 process_task
+    - workers: 进程数，1 为在当前进程中顺序处理，0 为 CPU 核心数
+    - on_progress: 进度回调，参数为本次完成的文件数
+
+    返回：
+    - 按任务编号排序的结果列表（包含失败项）
+    """
+    results = run_sharded(process_task, tasks, (options,), workers, on_progress,
+                          error_result=lambda task, error: {"index": task["index"], "src": task["src"],
+                                                            "new_filename": task["new_filename"],
+                                                            "ok": False, "error": error})
+    results.sort(key=lambda r: r["index"])
+    return results
@@ -0,0 +1,157 @@
+"""
+PD混合模式内核
+对整批 float32 图像张量 (B, H, W, C) 做图层混合，透明度和遮罩在同一次运算中应用，
+全程保持浮点精度（不做 8 位量化）。公式与 PIL ImageChops 对应函数一致，
+并补全了 color_dodge / color_burn / exclusion 三种模式
+"""
+
+from typing import Callable, Dict, Optional, Union
+
+import torch
+
+# 混合模式列表（与节点下拉框一致）
+BLEND_MODES = [
+    'normal', 'multiply', 'screen', 'overlay', 'soft_light', 'hard_light',
+    'color_dodge', 'color_burn', 'darken', 'lighten', 'difference', 'exclusion'
+]
+
+
+def _normal(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return b
+
+
+def _multiply(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return a * b
+
+
+def _screen(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return 1.0 - (1.0 - a) * (1.0 - b)
+
+
+def _overlay(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    # 以背景亮度区分：暗部正片叠底，亮部滤色
+    return torch.where(a < 0.5, 2.0 * a * b, 1.0 - 2.0 * (1.0 - a) * (1.0 - b))
+
+
+def _soft_light(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    # PIL 使用的 Pegtop 公式
+    return (1.0 - a) * a * b + a * _screen(a, b)
+
+
+def _hard_light(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    # 与 overlay 相同，但以图层亮度区分
+    return torch.where(b < 0.5, 2.0 * a * b, 1.0 - 2.0 * (1.0 - a) * (1.0 - b))
+
+
+def _color_dodge(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    dodge = torch.clamp(a / torch.clamp(1.0 - b, min=1e-6), max=1.0)
+    return torch.where(a <= 0.0, torch.zeros_like(dodge), dodge)
+
+
+def _color_burn(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    burn = 1.0 - torch.clamp((1.0 - a) / torch.clamp(b, min=1e-6), max=1.0)
+    return torch.where(a >= 1.0, torch.ones_like(burn), burn)
+
+
+def _darken(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return torch.minimum(a, b)
+
+
+def _lighten(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return torch.maximum(a, b)
+
+
+def _difference(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return torch.abs(a - b)
+
+
+def _exclusion(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return a + b - 2.0 * a * b
+
+
+BLEND_KERNELS: Dict[str, Callable[[torch.Tensor, torch.Tensor], torch.Tensor]] = {
+    'normal': _normal,
+    'multiply': _multiply,
+    'screen': _screen,
+    'overlay': _overlay,
+    'soft_light': _soft_light,
+    'hard_light': _hard_light,
+    'color_dodge': _color_dodge,
+    'color_burn': _color_burn,
+    'darken': _darken,
+    'lighten': _lighten,
+    'difference': _difference,
+    'exclusion': _exclusion,
+}
+
+
+def blend_images(background: torch.Tensor, layer: torch.Tensor, blend_mode: str,
+                 opacity: float = 1.0, mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    混合两批图像：result = background + (blend(background, layer) - background) * opacity * mask
+
+    参数：
+    - background: 背景图像 (B, H, W, C)，取值 0-1
+    - layer: 图层图像，形状需可广播到 background
+    - blend_mode: 混合模式，见 BLEND_MODES，未知模式按 normal 处理
+    - opacity: 不透明度 0-1
+    - mask: 遮罩 (B, H, W) 或 (H, W)，取值 0-1，None 表示整幅生效
+
+    返回：
+    - 混合后的图像 (B, H, W, C) float32
+    """
+    a = background.float()
+    b = layer.float()
+    blended = BLEND_KERNELS.get(blend_mode, _normal)(a, b)
+
+    if mask is None:
+        if opacity >= 1.0:
+            return blended.clamp(0.0, 1.0)
+        weight: Union[float, torch.Tensor] = float(opacity)
+    else:
+        # 透明度和遮罩合成一个权重，一次插值完成
+        weight = mask.float().unsqueeze(-1) * float(opacity)
+
+    return torch.lerp(a, blended.expand_as(a), weight).clamp_(0.0, 1.0)
+
+
+if __name__ == "__main__":
+    # 基准测试：与原先的 PIL ImageChops 逐帧实现对比
+    import time
+
+    import numpy as np
+    from PIL import Image, ImageChops
+
+    pil_chops = {
+        'multiply': ImageChops.multiply, 'screen': ImageChops.screen, 'overlay': ImageChops.overlay,
+        'soft_light': ImageChops.soft_light, 'hard_light': ImageChops.hard_light,
+        'difference': ImageChops.difference, 'darken': ImageChops.darker, 'lighten': ImageChops.lighter,
+    }
+
+    def pil_blend(bg: torch.Tensor, fg: torch.Tensor, mode: str, opacity: float) -> torch.Tensor:
+        frames = []
+        for i in range(bg.shape[0]):
+            image1 = Image.fromarray((bg[i].numpy() * 255).astype(np.uint8))
+            image2 = Image.fromarray((fg[i].numpy() * 255).astype(np.uint8))
+            result = pil_chops[mode](image1, image2) if mode in pil_chops else image2
+            result = Image.blend(image1, result, opacity)
+            frames.append(torch.from_numpy(np.array(result).astype(np.float32) / 255.0))
+        return torch.stack(frames)
+
+    batch, height, width = 16, 512, 512
+    torch.manual_seed(0)
+    bg = torch.rand(batch, height, width, 3)
+    fg = torch.rand(batch, height, width, 3)
+
+    print(f"{'mode':<12} {'PIL (ms)':>10} {'tensor (ms)':>12} {'max diff':>10}")
+    for mode in BLEND_MODES:
+        start = time.perf_counter()
+        reference = pil_blend(bg, fg, mode, 0.8)
+        pil_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        result = blend_images(bg, fg, mode, 0.8)
+        tensor_ms = (time.perf_counter() - start) * 1000
+
+        diff = (result - reference).abs().max().item() if mode in pil_chops or mode == 'normal' else float('nan')
+        print(f"{mode:<12} {pil_ms:>10.1f} {tensor_ms:>12.1f} {diff:>10.4f}")
@@ -0,0 +1,24 @@
+"""
+PD缓存目录
+持久缓存（解码图片缓存、工作流存档索引）保存在 ComfyUI 用户目录下的 pd_cache 中，不写入插件自身的目录，
+通过 git 更新插件时不会出现未跟踪的缓存文件；
+没有 ComfyUI 的 folder_paths 时（如单独运行模块）退回插件目录下的 cache（已在 .gitignore 中忽略）
+"""
+
+import os
+
+PLUGIN_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cache_root() -> str:
+    """缓存根目录"""
+    try:
+        import folder_paths
+        return os.path.join(folder_paths.get_user_directory(), "pd_cache")
+    except (ImportError, AttributeError):
+        return os.path.join(PLUGIN_ROOT, "cache")
+
+
+def cache_path(*parts: str) -> str:
+    """缓存根目录下的路径"""
+    return os.path.join(cache_root(), *parts)
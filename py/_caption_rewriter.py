@@ -0,0 +1,230 @@
+"""
+PD标注文件夹批量改写
+文件按分片交给进程池处理（见 _process_pool），改写通过 临时文件 + os.replace 原子替换，中途中断不会留下写了一半的文件；
+dry_run 时只统计差异（按删除词、按子文件夹计数），不写入任何文件；
+.pd_caption_index.json 记录每个文件在当前规则下处理后的内容哈希，重复运行时直接跳过已处理且未变化的文件
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from ._process_pool import run_sharded
+
+CAPTION_INDEX_FILENAME = ".pd_caption_index.json"
+
+
+def rules_fingerprint(*rules) -> str:
+    """根据编辑规则生成标识，规则变化后索引中的记录全部失效"""
+    return hashlib.sha1(json.dumps(rules, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class CaptionIndex:
+    """
+    标注处理索引: 相对路径 -> {"hash", "mtime_ns", "size", "rules"}
+
+    参数：
+    - root: 标注根文件夹
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.path = os.path.join(root, CAPTION_INDEX_FILENAME)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries: Dict[str, Dict] = json.load(f).get("files", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def key(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.root)
+
+    def save(self) -> None:
+        """原子替换写回索引"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入标注索引失败 {self.path}: {e}")
+
+
+def atomic_write_text(file_path: str, content: str) -> None:
+    """写入临时文件后原子替换目标文件"""
+    directory, name = os.path.split(file_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def process_caption(file_path: str, editor, dry_run: bool = False, known: Optional[Dict] = None,
+                    rules: str = "") -> Dict:
+    """
+    处理单个标注文件
+
+    参数：
+    - file_path: 标注文件路径
+    - editor: 标注编辑器（见 _caption_tags）
+    - dry_run: 只统计不写入
+    - known: 索引中该文件的记录，文件未变化且规则相同时跳过
+    - rules: 当前规则标识
+
+    返回：
+    - 结果字典：status 为 skipped / unchanged / modified / error，
+      counts 为各删除词的命中次数，entry 为新的索引记录
+    """
+    result = {"path": file_path, "counts": Counter(), "entry": None}
+    try:
+        st = os.stat(file_path)
+        if known is not None and known.get("rules") == rules \
+                and known.get("mtime_ns") == st.st_mtime_ns and known.get("size") == st.st_size:
+            result["status"] = "skipped"
+            result["entry"] = known
+            return result
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        digest = content_hash(content)
+        if known is not None and known.get("rules") == rules and known.get("hash") == digest:
+            # 内容与上次处理后的结果相同（只是 mtime 变了）
+            result["status"] = "skipped"
+            result["entry"] = dict(known, mtime_ns=st.st_mtime_ns, size=st.st_size)
+            return result
+
+        new_content, counts = editor.edit(content)
+        result["counts"] = counts
+        if new_content == content:
+            result["status"] = "unchanged"
+            result["entry"] = {"hash": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "rules": rules}
+            return result
+
+        result["status"] = "modified"
+        if not dry_run:
+            atomic_write_text(file_path, new_content)
+            st = os.stat(file_path)
+            result["entry"] = {"hash": content_hash(new_content), "mtime_ns": st.st_mtime_ns,
+                               "size": st.st_size, "rules": rules}
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def _process_item(item: Tuple[str, Optional[Dict]], editor, dry_run: bool, rules: str) -> Dict:
+    """run_sharded 的单项任务：(路径, 索引记录)"""
+    path, known = item
+    return process_caption(path, editor, dry_run, known, rules)
+
+
+class RewriteReport:
+    """
+    批量改写的统计结果
+
+    属性：
+    - scanned / modified / unchanged / skipped: 文件数
+    - errors: [(路径, 错误信息)]
+    - tag_counts: 各删除词/替换规则的命中次数
+    - dir_counts: 各子文件夹中被修改（dry_run 时为将被修改）的文件数
+    - written: 实际写入的文件路径
+    """
+
+    def __init__(self, root: str, dry_run: bool):
+        self.root = root
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.modified = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.tag_counts: Counter = Counter()
+        self.dir_counts: Counter = Counter()
+        self.written: List[str] = []
+
+    def add(self, result: Dict) -> None:
+        self.scanned += 1
+        status = result["status"]
+        if status == "error":
+            self.errors.append((result["path"], result.get("error", "")))
+            return
+        if status == "skipped":
+            self.skipped += 1
+            return
+        self.tag_counts.update(result["counts"])
+        if status == "modified":
+            self.modified += 1
+            self.dir_counts[os.path.relpath(os.path.dirname(result["path"]), self.root)] += 1
+            if not self.dry_run:
+                self.written.append(result["path"])
+        else:
+            self.unchanged += 1
+
+    def summary(self, top: int = 20) -> str:
+        """生成差异摘要文本"""
+        verb = "将修改" if self.dry_run else "实际修改了"
+        lines = [f"{'[预览] ' if self.dry_run else ''}共扫描 {self.scanned} 个文件，{verb} {self.modified} 个，"
+                 f"无需修改 {self.unchanged} 个，跳过已处理 {self.skipped} 个，失败 {len(self.errors)} 个"]
+        if self.tag_counts:
+            lines.append("按规则统计：")
+            for tag, count in self.tag_counts.most_common(top):
+                lines.append(f"  • {tag!r}: {count}")
+        if self.dir_counts:
+            lines.append("按文件夹统计：")
+            for directory, count in self.dir_counts.most_common(top):
+                lines.append(f"  • {directory}: {count}")
+        if self.errors:
+            lines.append("失败详情：")
+            for path, error in self.errors[:top]:
+                lines.append(f"  • {path}: {error}")
+        return "\n".join(lines)
+
+
+def rewrite_captions(root: str, files: List[str], editor, rules: str, workers: int = 1, dry_run: bool = False,
+                     use_index: bool = True, on_progress=None) -> RewriteReport:
+    """
+    批量改写标注文件
+
+    参数：
+    - root: 标注根文件夹（索引文件和文件夹统计的基准）
+    - files: 要处理的文件路径
+    - editor: 标注编辑器
+    - rules: 规则标识（rules_fingerprint）
+    - workers: 进程数，1 为在当前进程中顺序处理，0 为 CPU 核心数
+    - dry_run: 只统计不写入（也不更新索引）
+    - use_index: 是否使用 .pd_caption_index.json 跳过已处理的文件
+    - on_progress: 进度回调，参数为本次完成的文件数
+
+    返回：
+    - RewriteReport
+    """
+    index = CaptionIndex(root) if use_index else None
+    tasks = [(path, index.entries.get(index.key(path)) if index else None) for path in files]
+    report = RewriteReport(root, dry_run)
+
+    results = run_sharded(_process_item, tasks, (editor, dry_run, rules), workers, on_progress,
+                          error_result=lambda item, error: {"path": item[0], "counts": Counter(), "entry": None,
+                                                            "status": "error", "error": error})
+    results.sort(key=lambda r: r["path"])
+    for result in results:
+        report.add(result)
+        if index is not None and not dry_run and result.get("entry") is not None:
+            index.entries[index.key(result["path"])] = result["entry"]
+
+    if index is not None and not dry_run:
+        index.save()
+    return report
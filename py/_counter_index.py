@@ -0,0 +1,160 @@
+"""
+PD文件编号索引
+每个输出文件夹在 .pd_counters.json 中记录各文件名序列的下一个编号，
+只在序列第一次使用（或索引文件丢失）时扫描一次文件夹重建；
+编号通过 O_CREAT | O_EXCL 创建文件来占用，多个线程/进程同时保存也不会重名
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, Optional, Pattern, Tuple
+
+COUNTER_INDEX_FILENAME = ".pd_counters.json"
+
+
+class CounterIndex:
+    """
+    单个文件夹的编号索引
+
+    参数：
+    - directory: 文件夹路径
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._dirty = False
+        # 文件名序列标识 -> 下一个编号
+        self._counters: Dict[str, int] = self._load()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, COUNTER_INDEX_FILENAME)
+
+    def _load(self) -> Dict[str, int]:
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {str(k): int(v) for k, v in data.get("counters", {}).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _rebuild(self, pattern: Pattern, start: int) -> int:
+        """扫描文件夹，返回 pattern 第一个分组匹配到的最大编号 + 1"""
+        next_number = start
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    match = pattern.match(entry.name)
+                    if match:
+                        next_number = max(next_number, int(match.group(1)) + 1)
+        except FileNotFoundError:
+            pass
+        return next_number
+
+    def claim(self, series: str, pattern: Pattern, make_name: Callable[[int], str],
+              start: int = 1, persist: bool = True) -> Tuple[int, str]:
+        """
+        占用序列中的下一个编号（以空文件的形式创建，调用方随后覆盖写入内容）
+
+        参数：
+        - series: 文件名序列标识（同一文件夹内唯一，如 前缀+分隔符+位数+扩展名）
+        - pattern: 识别该序列已有文件的正则，第一个分组为编号（仅在重建时使用）
+        - make_name: 编号 -> 文件名
+        - start: 序列的起始编号
+        - persist: 是否立即写回索引文件（批量占用时可设为 False，最后调用 flush）
+
+        返回：
+        - (编号, 文件完整路径)
+        """
+        with self._lock:
+            number = self._counters.get(series)
+            if number is None:
+                number = self._rebuild(pattern, start)
+
+            while True:
+                file_path = os.path.join(self.directory, make_name(number))
+                try:
+                    fd = os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    # 其他进程或外部程序已占用，优先跳到磁盘索引记录的位置
+                    on_disk = self._load().get(series, 0)
+                    number = max(number + 1, on_disk)
+                    continue
+                os.close(fd)
+                break
+
+            self._counters[series] = number + 1
+            self._dirty = True
+
+        if persist:
+            self.flush()
+        return number, file_path
+
+    def flush(self) -> None:
+        """把索引写回磁盘（原子替换，与其他进程的记录合并取较大值）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            for series, number in self._load().items():
+                if number > self._counters.get(series, 0):
+                    self._counters[series] = number
+            data = json.dumps({"counters": self._counters}, ensure_ascii=False)
+            self._dirty = False
+
+        tmp_path = self._index_path() + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self._index_path())
+        except OSError as e:
+            print(f"写入编号索引失败 {self.directory}: {e}")
+
+
+_indexes: Dict[str, CounterIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_counter_index(directory: str) -> CounterIndex:
+    """获取文件夹的共享编号索引（文件夹不存在时自动创建）"""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            os.makedirs(key, exist_ok=True)
+            index = CounterIndex(key)
+            _indexes[key] = index
+        return index
+
+
+def claim_numbered_file(directory: str, prefix: str, delimiter: str, padding: int, extension: str,
+                        start: int = 1, persist: bool = True) -> Tuple[int, str]:
+    """
+    占用 {prefix}{delimiter}{编号(补零到 padding 位)}{extension} 形式的下一个文件名
+
+    返回：
+    - (编号, 文件完整路径)
+    """
+    series = f"{prefix}{delimiter}#{padding}{extension}"
+    pattern = re.compile(f"{re.escape(prefix)}{re.escape(delimiter)}(\\d{{{padding}}}){re.escape(extension)}$")
+    return get_counter_index(directory).claim(
+        series, pattern, lambda n: f"{prefix}{delimiter}{n:0{padding}}{extension}", start, persist
+    )
+
+
+def claim_comfy_image_file(directory: str, filename: str, extension: str, batch_number: int = 0,
+                           persist: bool = True, index: Optional[CounterIndex] = None) -> Tuple[int, str]:
+    """
+    按 ComfyUI 的命名方式 {filename}_{编号:05}_.{extension} 占用下一个文件名，
+    filename 中的 %batch_num% 替换为批次序号；编号在同一 filename 的所有扩展名间共享
+
+    返回：
+    - (编号, 文件完整路径)
+    """
+    if index is None:
+        index = get_counter_index(directory)
+    series = f"comfy:{filename}"
+    pattern = re.compile(f"{re.escape(filename.replace('%batch_num%', str(batch_number)))}_(\\d+)_")
+    name = filename.replace("%batch_num%", str(batch_number))
+    return index.claim(series, pattern, lambda n: f"{name}_{n:05}_.{extension}", 1, persist)
@@ -0,0 +1,219 @@
+"""
+PD目录索引服务
+基于 os.scandir 扫描文件夹并缓存每个文件的 stat 结果（mtime、大小），
+与上一次快照比较得到 新增/修改/删除 的文件集合，供所有扫描文件夹的节点共用；
+只列出文件（files / list_files）时非递归索引默认按文件夹 mtime 跳过重复扫描，
+需要发现文件内容修改的使用方（changes、工作流存档索引）每次都完整 stat；
+以 . 开头的文件和文件夹不参与索引：插件写在输出文件夹中的索引（.pd_workflow_edits.json、.pd_counters.json、
+.pd_caption_index.json）和原子写入的临时文件都以 . 开头，不会被当作输入
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 快照: 文件路径 -> (mtime_ns, 文件大小)
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+class DirectoryChanges:
+    """
+    一次扫描相对于上一次快照的变化
+
+    属性：
+    - added: 新增文件路径（已排序）
+    - modified: 修改过的文件路径（已排序）
+    - deleted: 已删除的文件路径（已排序）
+    - unchanged: 未变化的文件路径（已排序）
+    """
+
+    def __init__(self, added: List[str], modified: List[str], deleted: List[str], unchanged: List[str]):
+        self.added = added
+        self.modified = modified
+        self.deleted = deleted
+        self.unchanged = unchanged
+
+    @property
+    def changed(self) -> List[str]:
+        """新增和修改的文件（需要重新处理的文件）"""
+        return sorted(self.added + self.modified)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+    def __repr__(self) -> str:
+        return (f"DirectoryChanges(added={len(self.added)}, modified={len(self.modified)}, "
+                f"deleted={len(self.deleted)}, unchanged={len(self.unchanged)})")
+
+
+def _match_extensions(name: str, extensions: Optional[Sequence[str]]) -> bool:
+    return extensions is None or name.lower().endswith(tuple(extensions))
+
+
+class DirectoryIndex:
+    """
+    单个文件夹的索引
+
+    参数：
+    - directory: 文件夹路径
+    - recursive: 是否递归扫描子文件夹
+    """
+
+    def __init__(self, directory: str, recursive: bool = False):
+        self.directory = directory
+        self.recursive = recursive
+        self._lock = threading.Lock()
+        self._snapshot: Snapshot = {}
+        self._dir_mtime: Optional[int] = None
+        # 每个使用方各自的基准快照，互不影响
+        self._baselines: Dict[str, Snapshot] = {}
+
+    def scan(self, quick: bool = False) -> Snapshot:
+        """
+        重新扫描文件夹并更新缓存的 stat 结果
+
+        参数：
+        - quick: 非递归索引在文件夹 mtime 未变化时直接复用上次结果
+                 （只能发现文件的增删，发现不了文件内容修改）
+
+        返回：
+        - 当前快照
+        """
+        with self._lock:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+            if quick and not self.recursive and self._dir_mtime == dir_mtime:
+                return self._snapshot
+
+            snapshot: Snapshot = {}
+            pending = [self.directory]
+            while pending:
+                current = pending.pop()
+                try:
+                    with os.scandir(current) as it:
+                        for entry in it:
+                            if entry.name.startswith("."):
+                                continue
+                            try:
+                                if entry.is_file():
+                                    st = entry.stat()
+                                    snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+                                elif self.recursive and entry.is_dir():
+                                    pending.append(entry.path)
+                            except OSError:
+                                continue
+                except OSError as e:
+                    if current == self.directory:
+                        raise
+                    print(f"跳过无法读取的文件夹 {current}: {e}")
+
+            self._snapshot = snapshot
+            self._dir_mtime = dir_mtime
+            return snapshot
+
+    @property
+    def dir_mtime(self) -> Optional[int]:
+        """上次扫描时文件夹的 mtime（纳秒），尚未扫描时为 None"""
+        return self._dir_mtime
+
+    def files(self, extensions: Optional[Sequence[str]] = None, quick: bool = True) -> List[str]:
+        """
+        扫描并返回排序后的文件路径列表，可按扩展名过滤（不区分大小写）
+
+        只列出文件时默认 quick：文件夹 mtime 未变化就不再逐个 stat 文件；
+        需要发现文件内容修改时用 changes，或传入 quick=False
+        """
+        snapshot = self.scan(quick)
+        return sorted(p for p in snapshot if _match_extensions(os.path.basename(p), extensions))
+
+    def changes(self, consumer: str, extensions: Optional[Sequence[str]] = None,
+                update: bool = True) -> DirectoryChanges:
+        """
+        扫描文件夹，返回相对于该使用方上一次调用的变化，并把当前快照记为新的基准
+
+        参数：
+        - consumer: 使用方标识（通常为节点名），不同使用方的基准互相独立
+        - extensions: 只关心的扩展名
+        - update: 为 False 时只查看变化，不更新基准（用于预览）
+
+        返回：
+        - DirectoryChanges，第一次调用时所有文件都算作新增
+        """
+        snapshot = self.scan()
+        current = {p: s for p, s in snapshot.items() if _match_extensions(os.path.basename(p), extensions)}
+
+        with self._lock:
+            old_baseline = self._baselines.get(consumer, {})
+            previous, baseline = {}, {}
+            for path, stat in old_baseline.items():
+                if _match_extensions(os.path.basename(path), extensions):
+                    previous[path] = stat
+                else:
+                    baseline[path] = stat
+            baseline.update(current)
+            if update:
+                self._baselines[consumer] = baseline
+
+        added, modified, unchanged = [], [], []
+        for path, stat in current.items():
+            old = previous.get(path)
+            if old is None:
+                added.append(path)
+            elif old != stat:
+                modified.append(path)
+            else:
+                unchanged.append(path)
+        deleted = [p for p in previous if p not in current]
+
+        return DirectoryChanges(sorted(added), sorted(modified), sorted(deleted), sorted(unchanged))
+
+    def commit(self, consumer: str, paths: Iterable[str]) -> None:
+        """
+        重新读取指定文件的 stat 并写入使用方的基准，
+        用于节点自己改写文件后，避免下次把这些文件当作外部修改
+        """
+        with self._lock:
+            baseline = self._baselines.setdefault(consumer, {})
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    baseline.pop(path, None)
+                    self._snapshot.pop(path, None)
+                    continue
+                baseline[path] = (st.st_mtime_ns, st.st_size)
+                self._snapshot[path] = (st.st_mtime_ns, st.st_size)
+
+    def forget(self, consumer: str) -> None:
+        """清除使用方的基准，下次调用 changes 时所有文件都算作新增"""
+        with self._lock:
+            self._baselines.pop(consumer, None)
+
+
+_indexes: Dict[Tuple[str, bool], DirectoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_directory_index(directory: str, recursive: bool = False) -> DirectoryIndex:
+    """获取文件夹的共享索引实例"""
+    key = (directory, recursive)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = DirectoryIndex(directory, recursive)
+            _indexes[key] = index
+        return index
+
+
+def list_files(directory: str, extensions: Optional[Sequence[str]] = None,
+               recursive: bool = False, quick: bool = True) -> List[str]:
+    """
+    返回文件夹中排序后的文件路径（共享索引，重复扫描只更新 stat 缓存）
+
+    参数：
+    - directory: 文件夹路径
+    - extensions: 扩展名过滤，如 ('.png', '.jpg')，None 表示全部文件
+    - recursive: 是否递归子文件夹
+    - quick: 文件夹 mtime 未变化时复用上次列表（仅非递归，默认开启；只需要文件列表时
+             文件增删一定会改变文件夹 mtime，结果与完整扫描相同）
+    """
+    return get_directory_index(directory, recursive).files(extensions, quick)
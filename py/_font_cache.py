@@ -0,0 +1,108 @@
+"""
+PD字体与文字排版缓存
+字体按 (路径, 字号) 缓存（LRU），加载失败时回退的默认字体同样按 (路径, 字号) 缓存，
+单字宽度和整行排版按 (字体, 文本, 字距) 缓存，批量标注大量图片时不会重复读取字体文件、
+重复尝试加载缺失的字体或逐字测量
+"""
+
+import os
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from PIL import ImageFont
+
+# 插件根目录下的 fonts 文件夹
+PLUGIN_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FONTS_DIR = os.path.join(PLUGIN_ROOT, "fonts")
+
+FONT_CACHE_SIZE = 32
+LAYOUT_CACHE_SIZE = 4096
+
+
+class LineLayout(NamedTuple):
+    """
+    单行文字排版结果
+
+    - offsets: 每个字相对行首的 x 偏移（已包含字距）
+    - width: 行宽（整行包围盒宽度 + 字距）
+    - height: 行高（整行包围盒高度）
+    """
+    offsets: Tuple[float, ...]
+    width: float
+    height: int
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """加载 TrueType/OpenType 字体（按路径和字号缓存），加载失败时抛出 OSError"""
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=1)
+def default_font() -> ImageFont.ImageFont:
+    """Pillow 内置默认字体（只创建一次）"""
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font_or_default(font_path: str, font_size: int, quiet: bool = False) -> ImageFont.ImageFont:
+    """
+    加载字体，失败时回退到默认字体
+
+    成功和失败的结果都按 (路径, 字号) 缓存：字体缺失时只尝试读取和提示一次，之后直接返回默认字体
+
+    参数：
+    - font_path: 字体文件路径
+    - font_size: 字号
+    - quiet: 为 True 时加载失败不打印提示（如尝试系统字体 arial.ttf）
+    """
+    try:
+        return load_font(font_path, font_size)
+    except OSError as e:
+        if not quiet:
+            print(f"⚠️ 字体加载失败: {font_path}, 回退到系统默认字体。错误: {e}")
+        return default_font()
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE * 4)
+def glyph_width(font: ImageFont.ImageFont, char: str) -> int:
+    """单个字的包围盒宽度"""
+    bbox = font.getbbox(char)
+    return bbox[2] - bbox[0]
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def text_bbox(font: ImageFont.ImageFont, text: str) -> Tuple[int, int, int, int]:
+    """整段文字的包围盒 (left, top, right, bottom)"""
+    return tuple(font.getbbox(text))
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def text_length(font: ImageFont.ImageFont, text: str) -> float:
+    """整段文字的排版宽度（font.getlength）"""
+    return font.getlength(text)
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout_line(font: ImageFont.ImageFont, text: str, letter_gap: float = 0.0) -> LineLayout:
+    """
+    逐字排版一行文字
+
+    参数：
+    - font: 字体（应来自 load_font / default_font，保证同一字体为同一对象）
+    - text: 文本
+    - letter_gap: 字距（像素，可为负）
+
+    返回：
+    - LineLayout
+    """
+    left, top, right, bottom = text_bbox(font, text)
+
+    offsets = []
+    current_x = 0.0
+    for char in text:
+        offsets.append(current_x)
+        current_x += glyph_width(font, char) + letter_gap
+
+    width = right - left + (len(text) - 1) * letter_gap
+    return LineLayout(tuple(offsets), width, bottom - top)
@@ -0,0 +1,190 @@
+"""
+PD解码图片磁盘缓存
+以 (绝对路径, mtime, 文件大小) 为键，把解码后的 uint8 像素保存为 .npy 文件，
+读取时通过内存映射加载；index.json 记录每个条目的大小和最近访问时间，
+总大小超过上限时按最近最少使用（LRU）顺序淘汰
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ._cache_dir import cache_path
+
+# ComfyUI 用户目录下的缓存目录（见 _cache_dir）
+DEFAULT_CACHE_DIR = cache_path("decoded_images")
+
+INDEX_FILENAME = "index.json"
+
+
+def file_fingerprint(path: str, st: Optional[os.stat_result] = None) -> str:
+    """根据绝对路径、mtime 和大小生成缓存键"""
+    if st is None:
+        st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DecodedImageCache:
+    """
+    解码图片磁盘缓存
+
+    参数：
+    - cache_dir: 缓存目录
+    - max_bytes: 缓存总大小上限（字节）
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 4096 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._dirty = False
+        os.makedirs(cache_dir, exist_ok=True)
+        # 按最近访问时间排序，最久未使用的条目在最前面
+        self._entries: "OrderedDict[str, dict]" = self._load_index()
+        self._total_bytes = sum(entry["bytes"] for entry in self._entries.values())
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def _load_index(self) -> "OrderedDict[str, dict]":
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            entries = {}
+        return OrderedDict(sorted(entries.items(), key=lambda item: item[1].get("atime", 0)))
+
+    def _entry_files(self, key: str):
+        return (os.path.join(self.cache_dir, f"{key}.npy"),
+                os.path.join(self.cache_dir, f"{key}_alpha.npy"))
+
+    def get(self, path: str, variant: str = "") -> Optional[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """
+        读取缓存
+
+        参数：
+        - path: 原图路径
+        - variant: 解码参数标识（不同解码参数的结果分开缓存）
+
+        返回：
+        - (rgb[H, W, 3] uint8, alpha[H, W] uint8 或 None)，未命中时返回 None
+        """
+        try:
+            key = self._key(path, variant)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry["atime"] = time.time()
+            self._entries.move_to_end(key)
+            self._dirty = True
+
+        rgb_file, alpha_file = self._entry_files(key)
+        try:
+            rgb = np.load(rgb_file, mmap_mode='r')
+            alpha = np.load(alpha_file, mmap_mode='r') if entry.get("alpha") else None
+        except (OSError, ValueError):
+            # 缓存文件丢失或损坏，删除条目后按未命中处理
+            with self._lock:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._total_bytes -= entry["bytes"]
+                    self._dirty = True
+            return None
+        return rgb, alpha
+
+    def put(self, path: str, rgb: np.ndarray, alpha: Optional[np.ndarray] = None, variant: str = "") -> None:
+        """写入缓存，写入后按 LRU 淘汰超出上限的条目"""
+        try:
+            key = self._key(path, variant)
+        except OSError:
+            return
+
+        rgb_file, alpha_file = self._entry_files(key)
+        try:
+            self._write_array(rgb_file, rgb)
+            if alpha is not None:
+                self._write_array(alpha_file, alpha)
+        except OSError as e:
+            print(f"写入解码缓存失败 {path}: {e}")
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous["bytes"]
+            self._entries[key] = {
+                "path": os.path.abspath(path),
+                "bytes": int(rgb.nbytes + (alpha.nbytes if alpha is not None else 0)),
+                "alpha": alpha is not None,
+                "atime": time.time(),
+            }
+            self._total_bytes += self._entries[key]["bytes"]
+            self._dirty = True
+            self._evict()
+
+    def flush(self) -> None:
+        """把索引写回磁盘（原子替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({"entries": self._entries}, ensure_ascii=False)
+            self._dirty = False
+
+        tmp_path = self._index_path() + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self._index_path())
+        except OSError as e:
+            print(f"写入解码缓存索引失败: {e}")
+
+    def _key(self, path: str, variant: str) -> str:
+        key = file_fingerprint(path)
+        if variant:
+            key = hashlib.sha1(f"{key}|{variant}".encode("utf-8")).hexdigest()
+        return key
+
+    @staticmethod
+    def _write_array(file_path: str, arr: np.ndarray) -> None:
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp_path, file_path)
+
+    def _evict(self) -> None:
+        """按最近访问时间淘汰条目直到总大小不超过上限（调用方持有锁）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["bytes"]
+            for file_path in self._entry_files(key):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+
+_caches: Dict[str, DecodedImageCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_image_cache(max_mb: int, cache_dir: str = DEFAULT_CACHE_DIR) -> DecodedImageCache:
+    """获取（共享的）缓存实例，并更新大小上限"""
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = DecodedImageCache(cache_dir, max_mb * 1024 * 1024)
+            _caches[cache_dir] = cache
+        else:
+            cache.max_bytes = max_mb * 1024 * 1024
+        return cache
@@ -0,0 +1,223 @@
+"""
+PD图像编码器
+为保存节点提供可选的输出格式（PNG / 无损WebP / WebP / JPEG / 原始 .npy），
+编码参数和元数据整批只构建一次，并统计每帧耗时和写入吞吐量
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+# 输出格式 -> 文件扩展名
+OUTPUT_FORMATS = {
+    "png": "png",
+    "webp_lossless": "webp",
+    "webp": "webp",
+    "jpg": "jpg",
+    "npy": "npy",
+}
+
+# PNG 的 zlib 压缩策略（Pillow compress_type）
+# rle / huffman_only 配合低压缩级别即接近 fpng 一类快速编码器的取舍
+PNG_STRATEGIES = {
+    "default": 0,       # Z_DEFAULT_STRATEGY
+    "filtered": 1,      # Z_FILTERED
+    "huffman_only": 2,  # Z_HUFFMAN_ONLY
+    "rle": 3,           # Z_RLE
+    "fixed": 4,         # Z_FIXED
+}
+
+# ComfyUI 在 WebP/JPEG 中保存工作流所用的 EXIF 标签
+EXIF_PROMPT_TAG = 0x0110
+EXIF_EXTRA_FIRST_TAG = 0x010f
+
+
+def build_save_params(output_format: str, prompt=None, extra_pnginfo=None, quality: int = 95,
+                      compress_level: int = 4, png_strategy: str = "default",
+                      embed_metadata: bool = True) -> Dict:
+    """
+    构建一整批共用的编码参数（元数据只序列化一次）
+
+    参数：
+    - output_format: 输出格式，见 OUTPUT_FORMATS
+    - prompt / extra_pnginfo: 要嵌入的工作流信息
+    - quality: JPEG/WebP 质量；无损 WebP 时为压缩力度
+    - compress_level: PNG 压缩级别 0-9
+    - png_strategy: PNG 压缩策略，见 PNG_STRATEGIES
+    - embed_metadata: 是否嵌入元数据
+
+    返回：
+    - 传给 Image.save 的参数字典（npy 格式为空字典）
+    """
+    if output_format == "npy":
+        return {}
+
+    if output_format == "png":
+        params = {"compress_level": compress_level, "compress_type": PNG_STRATEGIES.get(png_strategy, 0)}
+        if embed_metadata:
+            metadata = PngInfo()
+            if prompt is not None:
+                metadata.add_text("prompt", json.dumps(prompt))
+            if extra_pnginfo is not None:
+                for x in extra_pnginfo:
+                    metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+            params["pnginfo"] = metadata
+        return params
+
+    if output_format == "webp_lossless":
+        params = {"lossless": True, "quality": quality, "method": 4}
+    elif output_format == "webp":
+        params = {"quality": quality, "method": 4}
+    else:
+        params = {"quality": quality}
+
+    if embed_metadata and (prompt is not None or extra_pnginfo is not None):
+        # 与 ComfyUI 保存 WebP 的方式一致：prompt 写入 0x0110，其余信息从 0x010f 依次向下
+        exif = Image.Exif()
+        if prompt is not None:
+            exif[EXIF_PROMPT_TAG] = "prompt:{}".format(json.dumps(prompt))
+        if extra_pnginfo is not None:
+            tag = EXIF_EXTRA_FIRST_TAG
+            for x in extra_pnginfo:
+                exif[tag] = "{}:{}".format(x, json.dumps(extra_pnginfo[x]))
+                tag -= 1
+        params["exif"] = exif.tobytes()
+    return params
+
+
+def encode_to_file(pixels: np.ndarray, file_path: str, output_format: str, params: Dict) -> int:
+    """
+    编码单帧并写入文件
+
+    参数：
+    - pixels: uint8 像素 [H, W, C]
+    - file_path: 输出文件路径
+    - output_format: 输出格式
+    - params: build_save_params 的结果
+
+    返回：
+    - 写入的字节数
+    """
+    if output_format == "npy":
+        with open(file_path, 'wb') as f:
+            np.save(f, pixels)
+        return os.path.getsize(file_path)
+
+    img = Image.fromarray(pixels)
+    if output_format == "png":
+        img.save(file_path, format="PNG", **params)
+    elif output_format in ("webp", "webp_lossless"):
+        img.save(file_path, format="WEBP", **params)
+    else:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        try:
+            img.save(file_path, format="JPEG", **params)
+        except ValueError as e:
+            # JPEG 的 EXIF 段最大 64KB，工作流过大时不嵌入元数据
+            if "exif" not in params:
+                raise
+            print(f"⚠️ 元数据过大，JPEG 不嵌入元数据: {e}")
+            params = {k: v for k, v in params.items() if k != "exif"}
+            img.save(file_path, format="JPEG", **params)
+    return os.path.getsize(file_path)
+
+
+def timed_encode(pixels: np.ndarray, file_path: str, output_format: str, params: Dict,
+                 stats: Optional["SaveStats"] = None) -> int:
+    """
+    编码写盘并把耗时和字节数计入 stats
+
+    失败时删除 file_path（编号占用时创建的空文件或写了一半的文件），计为失败帧后继续抛出
+    """
+    start = time.perf_counter()
+    try:
+        written = encode_to_file(pixels, file_path, output_format, params)
+    except Exception:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        if stats is not None:
+            stats.add_failure()
+        raise
+    if stats is not None:
+        stats.add(written, time.perf_counter() - start)
+    return written
+
+
+class SaveStats:
+    """
+    一批保存的耗时统计，全部帧写完（或失败）后输出一次每帧耗时和吞吐量
+
+    参数：
+    - label: 输出时的标识（如 格式 和 输出目录）
+    - total: 本批帧数；中途出错时由 seal 改为实际提交的帧数
+    """
+
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = total
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._failed = 0
+        self._bytes = 0
+        self._seconds = 0.0
+        self._reported = False
+        self._wall_start = time.perf_counter()
+
+    def add(self, written: int, seconds: float) -> None:
+        with self._lock:
+            self._frames += 1
+            self._bytes += written
+            self._seconds += seconds
+        self._report_if_finished()
+
+    def add_failure(self) -> None:
+        with self._lock:
+            self._failed += 1
+        self._report_if_finished()
+
+    def seal(self, submitted: int) -> None:
+        """提交结束（包括中途出错），之后只等待已提交的 submitted 帧"""
+        with self._lock:
+            self.total = submitted
+        self._report_if_finished()
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            return self._frames + self._failed >= self.total
+
+    def _report_if_finished(self) -> None:
+        with self._lock:
+            if self._reported or self._frames + self._failed < self.total:
+                return
+            self._reported = True
+        self.report()
+
+    def summary(self) -> Tuple[float, float, float]:
+        """返回 (每帧编码耗时 ms, 编码吞吐量 MB/s, 整批墙钟耗时 s)"""
+        with self._lock:
+            frames, written, seconds = self._frames, self._bytes, self._seconds
+        ms_per_frame = seconds * 1000 / frames if frames else 0.0
+        mb_per_second = written / seconds / (1024 * 1024) if seconds > 0 else 0.0
+        return ms_per_frame, mb_per_second, time.perf_counter() - self._wall_start
+
+    def text(self) -> str:
+        """统计结果（一行文字）"""
+        ms_per_frame, mb_per_second, wall = self.summary()
+        with self._lock:
+            frames, failed, written = self._frames, self._failed, self._bytes
+        failures = f", 失败 {failed} 帧" if failed else ""
+        return (f"{'⚠️' if failed else '✅'} {self.label}: {frames} 帧{failures}, {written / (1024 * 1024):.2f} MB, "
+                f"{ms_per_frame:.1f} ms/帧, {mb_per_second:.1f} MB/s, 总耗时 {wall:.2f}s")
+
+    def report(self) -> None:
+        print(self.text())
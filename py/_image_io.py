@@ -0,0 +1,323 @@
+"""
+PD图像读取工具
+提供目录图片索引与按窗口解码的公共逻辑，供 Load_Images 等节点复用
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from math import floor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image, ImageOps
+
+from ._batch_resize import EXIF_ORIENTATION_TAG, TRANSPOSED_ORIENTATIONS, reduce_for_target
+from ._dir_index import get_directory_index, list_files
+from ._image_cache import DecodedImageCache
+
+# Load_Images 支持的图片扩展名
+VALID_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+class DecodeOptions(NamedTuple):
+    """
+    解码参数
+
+    - max_side_length: 最长边超过该值时等比缩小到该值（LANCZOS），0 表示保持原尺寸
+    - exact_output: 为 False 时 JPEG 按 draft() 低分辨率解码、其他格式先 reduce()，
+                    再做最终 LANCZOS 缩放（结果近似一致，速度和内存开销成倍下降）
+    """
+    max_side_length: int = 0
+    exact_output: bool = True
+
+    @property
+    def variant(self) -> str:
+        """用于区分磁盘缓存条目的标识，原尺寸解码为空字符串"""
+        if self.max_side_length <= 0:
+            return ""
+        return f"max{self.max_side_length}|{'exact' if self.exact_output else 'draft'}"
+
+
+def _target_size(width: int, height: int, max_side_length: int) -> Optional[Tuple[int, int]]:
+    """计算最长边缩小到 max_side_length 后的尺寸，不需要缩小时返回 None"""
+    if max_side_length <= 0 or max(width, height) <= max_side_length:
+        return None
+    if width >= height:
+        return max_side_length, max(1, floor(height * max_side_length / width))
+    return max(1, floor(width * max_side_length / height)), max_side_length
+
+
+def decode_pixels(image_path: str, options: DecodeOptions = DecodeOptions()) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    解码单张图片为 uint8 像素
+
+    返回：
+    - rgb: RGB 像素 [H, W, 3] uint8
+    - alpha: 透明通道 [H, W] uint8，无透明通道时为 None
+    """
+    i = Image.open(image_path)
+
+    target = None
+    if options.max_side_length > 0:
+        # 目标尺寸按 exif_transpose 之后的方向计算
+        width, height = i.size
+        if i.getexif().get(EXIF_ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        target = _target_size(width, height, options.max_side_length)
+        if target is not None:
+            i = reduce_for_target(i, target, options.exact_output, exif_oriented=True)
+
+    i = ImageOps.exif_transpose(i)
+    if target is not None:
+        i = i.convert("RGBA" if 'A' in i.getbands() else "RGB")
+        i = i.resize(target, Image.LANCZOS)
+
+    rgb = np.array(i.convert("RGB"))
+    alpha = np.array(i.getchannel('A')) if 'A' in i.getbands() else None
+    return rgb, alpha
+
+
+def pixels_to_tensors(rgb: np.ndarray, alpha: Optional[np.ndarray]) -> Tuple[torch.Tensor, torch.Tensor]:
+    """把 uint8 像素转换为图像张量 [1, H, W, 3] 和遮罩张量 [H, W]"""
+    image = torch.from_numpy(rgb.astype(np.float32) / 255.0)[None,]
+
+    if alpha is not None:
+        mask = alpha.astype(np.float32) / 255.0
+        mask = 1. - torch.from_numpy(mask)
+    else:
+        mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
+
+    return image, mask
+
+
+def decode_image(image_path: str, cache: Optional[DecodedImageCache] = None,
+                 options: DecodeOptions = DecodeOptions()) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    解码单张图片，提供 cache 时优先从磁盘缓存读取
+
+    参数：
+    - image_path: 图片路径
+    - cache: 解码缓存（可选）
+    - options: 解码参数
+
+    返回：
+    - image: 图像张量 [1, H, W, 3]
+    - mask: 遮罩张量 [H, W]（无透明通道时为 64x64 的全零遮罩）
+    """
+    cached = cache.get(image_path, options.variant) if cache is not None else None
+    if cached is not None:
+        return pixels_to_tensors(*cached)
+
+    rgb, alpha = decode_pixels(image_path, options)
+    if cache is not None:
+        cache.put(image_path, rgb, alpha, options.variant)
+    return pixels_to_tensors(rgb, alpha)
+
+
+# 解码线程池（Pillow 解码时会释放 GIL，线程即可并行）
+_decode_pool: Optional[ThreadPoolExecutor] = None
+_decode_pool_workers = 0
+_decode_pool_lock = threading.Lock()
+
+# 预取调度线程，与解码线程池分开，避免占满解码线程导致死锁
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pd_prefetch")
+
+# 最多保留预取窗口的目录数，超出后丢弃最久未使用的目录的预取结果
+PREFETCH_MAX_DIRECTORIES = 4
+
+
+def resolve_workers(workers: int) -> int:
+    """workers 为 0 时使用 CPU 核心数"""
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _submit_decodes(workers: int, paths: List[str], cache: Optional[DecodedImageCache],
+                    options: DecodeOptions) -> List[Future]:
+    """
+    把解码任务提交到共享解码线程池，线程数变化时重建
+
+    重建和提交都在锁内完成：旧线程池 shutdown(wait=False) 后不再接受新任务，但已提交的任务会照常执行完，
+    其他线程不会拿到已关闭的线程池
+    """
+    global _decode_pool, _decode_pool_workers
+    with _decode_pool_lock:
+        if _decode_pool is None or _decode_pool_workers != workers:
+            if _decode_pool is not None:
+                _decode_pool.shutdown(wait=False)
+            _decode_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pd_decode")
+            _decode_pool_workers = workers
+        return [_decode_pool.submit(_safe_decode, p, cache, options) for p in paths]
+
+
+def _safe_decode(image_path: str, cache: Optional[DecodedImageCache] = None,
+                 options: DecodeOptions = DecodeOptions()):
+    try:
+        return decode_image(image_path, cache, options)
+    except Exception as e:
+        print(f"Error loading image {image_path}: {e}")
+        return None
+
+
+def decode_images(paths: List[str], workers: int = 1, cache: Optional[DecodedImageCache] = None,
+                  options: DecodeOptions = DecodeOptions()) -> Tuple[List[torch.Tensor], List[torch.Tensor], List[str]]:
+    """
+    并行解码多张图片，输出顺序与输入路径顺序一致，解码失败的文件会被跳过
+
+    参数：
+    - paths: 图片路径列表
+    - workers: 解码线程数，1 为顺序解码，0 为 CPU 核心数
+    - cache: 解码缓存（可选）
+    - options: 解码参数
+
+    返回：
+    - images: 图像张量列表 [1, H, W, 3]
+    - masks: 遮罩张量列表 [H, W]
+    - file_paths: 成功加载的图片路径
+    """
+    # 线程池大小只取决于 workers，窗口较短时只是提交的任务较少，不会重建共享线程池
+    workers = resolve_workers(workers)
+    if workers <= 1 or len(paths) <= 1:
+        results = [_safe_decode(p, cache, options) for p in paths]
+    else:
+        results = [future.result() for future in _submit_decodes(workers, paths, cache, options)]
+    if cache is not None:
+        cache.flush()
+
+    images = []
+    masks = []
+    file_paths = []
+    for image_path, result in zip(paths, results):
+        if result is None:
+            continue
+        images.append(result[0])
+        masks.append(result[1])
+        file_paths.append(str(image_path))
+    return images, masks, file_paths
+
+
+def load_with_cap(paths: List[str], image_load_cap: int = 0, workers: int = 1,
+                  cache: Optional[DecodedImageCache] = None, options: DecodeOptions = DecodeOptions()):
+    """
+    按顺序加载图片直到成功数量达到 image_load_cap（0 表示不限制），
+    失败的文件会被跳过并由后续文件补足，与逐张加载的结果一致
+    """
+    if image_load_cap <= 0:
+        return decode_images(paths, workers, cache, options)
+
+    images, masks, file_paths = [], [], []
+    position = 0
+    while len(images) < image_load_cap and position < len(paths):
+        need = image_load_cap - len(images)
+        chunk = paths[position:position + need]
+        position += len(chunk)
+        chunk_images, chunk_masks, chunk_paths = decode_images(chunk, workers, cache, options)
+        images.extend(chunk_images)
+        masks.extend(chunk_masks)
+        file_paths.extend(chunk_paths)
+    return images, masks, file_paths
+
+
+class DirectoryImageStream:
+    """
+    目录图片流
+    目录只在内容变化（目录 mtime 改变）时重新索引一次，
+    之后按 offset/size 窗口按需解码，内存中只保留当前窗口的图片（以及最近几个目录各一个预取窗口）
+    """
+
+    # 预取结果（LRU）: 目录绝对路径 -> ((窗口路径元组, 解码参数), Future)，
+    # 每个目录只保留一个预取窗口，最多保留 PREFETCH_MAX_DIRECTORIES 个目录
+    _prefetched: "OrderedDict[str, Tuple[Tuple[Tuple[str, ...], DecodeOptions], Future]]" = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files = self._index(directory)
+
+    @staticmethod
+    def _index(directory: str) -> List[str]:
+        """获取目录的排序图片列表，目录未增删文件时直接复用共享索引"""
+        return list_files(directory, VALID_IMAGE_EXTENSIONS, quick=True)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def window_paths(self, offset: int, size: int) -> List[str]:
+        """返回窗口内的图片路径，size <= 0 表示取到末尾"""
+        if size <= 0:
+            return self.files[offset:]
+        return self.files[offset:offset + size]
+
+    def fingerprint(self, offset: int = 0, size: int = 0) -> str:
+        """
+        计算窗口内文件的内容指纹（文件名、mtime、大小），加上整个目录的图片数和目录 mtime，
+        用于 IS_CHANGED 判断目录内容是否变化（跳过解码失败的文件时会读到窗口之外）
+        """
+        digest = hashlib.sha1(os.path.abspath(self.directory).encode("utf-8"))
+        digest.update(f"|{len(self.files)}|{get_directory_index(self.directory).dir_mtime}".encode("utf-8"))
+        for image_path in self.window_paths(offset, size):
+            try:
+                st = os.stat(image_path)
+            except OSError:
+                continue
+            digest.update(f"|{os.path.basename(image_path)}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def load_window(self, offset: int, size: int, workers: int = 1, prefetch_next: bool = False,
+                    cache: Optional[DecodedImageCache] = None,
+                    options: DecodeOptions = DecodeOptions()) -> Tuple[List[torch.Tensor], List[torch.Tensor], List[str]]:
+        """
+        解码一个窗口内的图片，解码失败的文件会被跳过
+
+        参数：
+        - offset: 窗口起点
+        - size: 窗口大小
+        - workers: 解码线程数
+        - prefetch_next: 是否在后台预取下一个窗口（下游节点执行期间解码）
+        - cache: 解码缓存（可选）
+        - options: 解码参数
+
+        返回：
+        - images: 图像张量列表 [1, H, W, 3]
+        - masks: 遮罩张量列表 [H, W]
+        - file_paths: 成功加载的图片路径
+        """
+        paths = tuple(self.window_paths(offset, size))
+        key = os.path.abspath(self.directory)
+        prefetch_key = (paths, options)
+
+        with self._lock:
+            pending = self._prefetched.pop(key, None)
+
+        result = None
+        if pending is not None and pending[0] == prefetch_key:
+            try:
+                result = pending[1].result()
+            except Exception as e:
+                print(f"Prefetch failed for '{self.directory}': {e}")
+        elif pending is not None:
+            pending[1].cancel()
+
+        if result is None:
+            result = decode_images(list(paths), workers, cache, options)
+
+        if prefetch_next:
+            next_paths = tuple(self.window_paths(offset + size, size))
+            if next_paths:
+                future = _prefetch_executor.submit(decode_images, list(next_paths), workers, cache, options)
+                with self._lock:
+                    replaced = self._prefetched.pop(key, None)
+                    self._prefetched[key] = ((next_paths, options), future)
+                    evicted = [replaced] if replaced is not None else []
+                    while len(self._prefetched) > PREFETCH_MAX_DIRECTORIES:
+                        evicted.append(self._prefetched.popitem(last=False)[1])
+                # 丢弃的预取：尚未开始的直接取消，已解码的结果随 Future 一起释放
+                for _, stale in evicted:
+                    stale.cancel()
+
+        return result
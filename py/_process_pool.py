@@ -0,0 +1,204 @@
+"""
+PD进程池分片执行
+批量任务按分片交给进程池处理，供批量缩放、标注改写、工作流编辑和工作流索引共用：
+- 进程池在第一次使用时创建并保留复用，进程数变化或进程池损坏时重建
+- 固定使用 spawn 方式启动子进程，不 fork 持有 CUDA 上下文和服务器线程的 ComfyUI 进程；
+  创建进程池时一次启动全部子进程，只在启动期间把 __main__ 换成空模块，子进程不会重新执行父进程的入口脚本
+  （ComfyUI 的 main.py 在模块级导入 comfy.model_management，每个子进程都会建立自己的 CUDA 上下文）；
+  之后提交任务不再启动新进程，也不再替换 __main__
+- 插件模块都是包内相对导入，全新的解释器无法按名称导入；子进程启动时先按父进程的 __path__
+  登记插件所在的包（不执行包的 __init__），任务函数和参数即可按原模块名反序列化
+- 任务函数自身负责捕获单项任务的异常，未捕获的异常直接抛出，不会在当前进程中重跑；
+  子进程异常退出时未返回结果的分片可能已部分执行，同样不重跑，按 error_result 逐项报告失败
+
+代价：每个子进程是独立的解释器，首次使用时要启动并导入任务模块（PIL 等），之后常驻内存直到 ComfyUI 退出；
+任务和结果要序列化传输，单项任务很轻（小文件）时收益有限。workers 为 1 时不启动进程池
+"""
+
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from math import ceil
+from typing import Callable, List, Optional, Sequence
+
+# 进程池本身的失败：子进程异常退出、任务或结果无法序列化/反序列化
+POOL_ERRORS = (BrokenProcessPool, pickle.PicklingError, pickle.UnpicklingError)
+
+# 子进程初始化脚本：登记插件所在的各级包（以内置 exec 作为 initializer，本身无需导入任何插件模块），
+# 再等待全部子进程启动：初始化完成前子进程不会空闲，创建进程池时的每次 submit 都会启动一个新进程
+_BOOTSTRAP = """
+import sys, types
+for name, path in packages:
+    if name not in sys.modules:
+        module = types.ModuleType(name)
+        module.__path__ = list(path)
+        module.__package__ = name
+        sys.modules[name] = module
+started.wait(timeout)
+"""
+
+# 等待全部子进程启动的超时（秒），超时后进程池视为损坏
+_START_TIMEOUT = 120
+
+# 共享进程池
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _package_chain() -> List:
+    """当前插件包及其各级父包的 (名称, __path__)"""
+    chain = []
+    parts = (__package__ or "").split(".")
+    for i in range(1, len(parts) + 1):
+        name = ".".join(parts[:i])
+        module = sys.modules.get(name)
+        path = getattr(module, "__path__", None)
+        if not name or path is None:
+            break
+        chain.append((name, list(path)))
+    return chain
+
+
+@contextmanager
+def _plain_main():
+    """
+    临时把 __main__ 换成空模块：spawn 按 __main__ 的 __spec__ / __file__ 在子进程中重新执行入口脚本，
+    空模块两者都没有，子进程只导入任务函数所在的模块。
+    替换对整个进程可见，只在创建进程池、启动子进程的 submit 期间使用
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        if main is not None:
+            sys.modules["__main__"] = main
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _run_shard(func: Callable, shard: Sequence, args: tuple) -> List:
+    """子进程中执行的分片任务"""
+    return [func(item, *args) for item in shard]
+
+
+def resolve_workers(workers: int, count: int) -> int:
+    """进程数：0 为 CPU 核心数，且不超过任务数"""
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return min(workers, max(count, 1))
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """获取共享进程池（调用方持有 _pool_lock），进程数变化时重建"""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=exec,
+                                   initargs=(_BOOTSTRAP, {"packages": _package_chain(), "started": context.Barrier(workers),
+                                                          "timeout": _START_TIMEOUT}))
+        # 一次启动全部子进程并等待其完成初始化，启动失败在这里直接抛出；
+        # 进程数已满且不会被替换（子进程退出时进程池即损坏），之后的 submit 不再启动进程
+        with _plain_main():
+            ready = [pool.submit(_ready) for _ in range(workers)]
+        try:
+            for future in ready:
+                future.result()
+        except BaseException:
+            pool.shutdown(wait=False)
+            raise
+        _pool, _pool_workers = pool, workers
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """丢弃已损坏的进程池，下次使用时重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def run_sharded(func: Callable, items: Sequence, args: tuple = (), workers: int = 1,
+                on_progress: Optional[Callable[[int], None]] = None,
+                error_result: Optional[Callable[[object, str], object]] = None) -> List:
+    """
+    对每一项执行 func(item, *args)
+
+    参数：
+    - func: 模块级函数（子进程按模块名导入），自身负责捕获单项任务的异常
+    - items: 任务列表
+    - args: 每次调用附加的参数（需可被 pickle）
+    - workers: 进程数，1 为在当前进程中顺序处理，0 为 CPU 核心数
+    - on_progress: 进度回调，参数为本次完成的任务数
+    - error_result: error_result(item, 错误信息) 生成单项失败结果，子进程异常退出时用于报告未返回结果的任务；
+                    为 None 时直接抛出 BrokenProcessPool
+
+    返回：
+    - 与 items 顺序相同的结果列表
+    """
+    items = list(items)
+    workers = resolve_workers(workers, len(items))
+    if workers <= 1:
+        results = []
+        for item in items:
+            results.append(func(item, *args))
+            if on_progress is not None:
+                on_progress(1)
+        return results
+
+    try:
+        pickle.dumps((func, args))
+    except Exception as e:
+        raise pickle.PicklingError(f"任务无法交给进程池（{type(e).__name__}: {e}），请把 workers 设为 1") from e
+
+    # 每个进程分到多个较小的分片，兼顾负载均衡和进度刷新频率
+    shard_size = max(1, ceil(len(items) / (workers * 4)))
+    starts = range(0, len(items), shard_size)
+    with _pool_lock:
+        pool = _get_pool(workers)
+        futures = {pool.submit(_run_shard, func, items[start:start + shard_size], args): start for start in starts}
+
+    shard_results = {}
+    failure = None
+    try:
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                shard_results[start] = future.result()
+            except POOL_ERRORS as e:
+                failure = e
+                continue
+            if on_progress is not None:
+                on_progress(len(shard_results[start]))
+    finally:
+        # 任务函数抛出异常时，尚未开始的分片不再执行
+        for future in futures:
+            future.cancel()
+
+    if failure is not None:
+        if isinstance(failure, BrokenProcessPool):
+            _discard_pool(pool)
+        pending = [start for start in starts if start not in shard_results]
+        message = f"进程池处理失败（{type(failure).__name__}: {failure}），结果未返回"
+        print(f"⚠️ {message}：{sum(len(items[start:start + shard_size]) for start in pending)} 项，不重新执行")
+        if error_result is None:
+            raise failure
+        for start in pending:
+            shard_results[start] = [error_result(item, message) for item in items[start:start + shard_size]]
+            if on_progress is not None:
+                on_progress(len(shard_results[start]))
+    return [result for start in starts for result in shard_results[start]]
@@ -0,0 +1,394 @@
+"""
+PD批量缩放
+图像 (B, H, W, C) 和遮罩 (B, H, W) 整批一起缩放，目标尺寸只计算一次；
+auto 模式按缩放关系选择代价最低且结果准确的插值核：
+- 尺寸不变：直接返回
+- 两个方向都是整数倍缩小：area（等价于整块求平均）
+- 其他缩小：bicubic + antialias
+- 放大：bicubic
+
+不限制内存（memory_budget_mb = 0）时直接使用 PyTorch 的原生实现：整数倍 area 为一次 avg_pool2d，
+其他为 F.interpolate；lanczos 没有原生实现，由下面的分块引擎计算（float32，不经过 PIL 的 8 位量化）。
+
+指定内存预算时由可分离的分块引擎计算：每个插值核预先算出两个方向上每个输出像素对应的源像素下标和权重，
+先横向后纵向按权重逐项累加；输出按批次分组、按行（必要时再按列）分块，
+每块只读取其权重覆盖到的源像素（即按插值核支撑范围带上的重叠边），临时张量不超过预算。
+逐元素累加的顺序与分块方式无关，任意非零预算之间的结果逐位相同；采样位置和权重与 F.interpolate 相同，
+但与不限制内存时（原生实现）的结果不保证逐位相同，只有浮点舍入误差（约 1e-5）
+"""
+
+import math
+from typing import Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+RESIZE_METHODS = ["auto", "nearest", "nearest-exact", "bilinear", "bicubic", "area", "lanczos"]
+
+# 会产生过冲的插值核，结果需要截断到 [0, 1]
+_OVERSHOOT_METHODS = ("bicubic", "bicubic_aa", "lanczos")
+
+
+def fit_side(height: int, width: int, size: int, side: str = "longest") -> Tuple[int, int]:
+    """
+    等比缩放到指定边长
+
+    参数：
+    - height, width: 原尺寸
+    - size: 目标边长
+    - side: longest 为最长边等于 size，shortest 为最短边等于 size
+
+    返回：
+    - (新高度, 新宽度)，另一边向下取整且至少为 1
+    """
+    match_height = (height >= width) if side == "longest" else (height <= width)
+    if match_height:
+        return size, max(int(width * (size / height)), 1)
+    return max(int(height * (size / width)), 1), size
+
+
+def pick_method(src_h: int, src_w: int, dst_h: int, dst_w: int, method: str = "auto") -> str:
+    """
+    确定实际使用的插值核：指定的插值核原样使用（bicubic 缩小时也不带 antialias，与 common_upscale 相同），
+    auto 按缩放关系选择
+
+    返回：
+    - none（无需缩放） / area / bicubic_aa（带 antialias 的 bicubic） / 其他 RESIZE_METHODS 中的名称
+    """
+    if (src_h, src_w) == (dst_h, dst_w):
+        return "none"
+    if method != "auto":
+        return method
+    if dst_h <= src_h and dst_w <= src_w:
+        if src_h % dst_h == 0 and src_w % dst_w == 0:
+            return "area"
+        return "bicubic_aa"
+    return "bicubic"
+
+
+# ---------------------------------------------------------------- 分块执行 --
+
+# 抗锯齿插值核的半支撑宽度（与 PIL / PyTorch antialias 的定义相同）
+_AA_SUPPORT = {"bicubic_aa": 2.0, "lanczos": 3.0}
+
+
+def _aa_filter(x: torch.Tensor, kernel: str) -> torch.Tensor:
+    ax = x.abs()
+    if kernel == "lanczos":
+        return torch.where(ax < 3.0, torch.sinc(x) * torch.sinc(x / 3.0), torch.zeros_like(x))
+    a = -0.5
+    near = ((a + 2) * ax - (a + 3)) * ax * ax + 1
+    far = ((a * ax - 5 * a) * ax + 8 * a) * ax - 4 * a
+    return torch.where(ax < 1.0, near, torch.where(ax < 2.0, far, torch.zeros_like(x)))
+
+
+def axis_weights(src: int, dst: int, kernel: str) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    计算一个方向上的插值下标和权重（与 F.interpolate 的采样位置一致）
+
+    参数：
+    - src / dst: 源长度 / 目标长度
+    - kernel: pick_method 返回的插值核
+
+    返回：
+    - (下标 [dst, T] int64, 权重 [dst, T] float32)，T 为每个输出像素的抽头数
+    """
+    scale = src / dst
+    i = torch.arange(dst, dtype=torch.float64)
+
+    if kernel in ("nearest", "nearest-exact"):
+        pos = torch.floor((i + 0.5) * scale if kernel == "nearest-exact" else i * scale)
+        idx = pos.clamp(max=src - 1).long().unsqueeze(1)
+        return idx, torch.ones(idx.shape, dtype=torch.float32)
+
+    if kernel == "bilinear":
+        pos = ((i + 0.5) * scale - 0.5).clamp(min=0)
+        i0 = torch.floor(pos)
+        lam = pos - i0
+        idx = torch.stack([i0, (i0 + 1).clamp(max=src - 1)], dim=1).long()
+        return idx, torch.stack([1 - lam, lam], dim=1).float()
+
+    if kernel == "bicubic":
+        a = -0.75
+        pos = (i + 0.5) * scale - 0.5
+        i0 = torch.floor(pos)
+        t = pos - i0
+        w0 = ((a * (t + 1) - 5 * a) * (t + 1) + 8 * a) * (t + 1) - 4 * a
+        w1 = ((a + 2) * t - (a + 3)) * t * t + 1
+        w2 = ((a + 2) * (1 - t) - (a + 3)) * (1 - t) * (1 - t) + 1
+        w3 = 1 - w0 - w1 - w2
+        idx = (i0.unsqueeze(1) + torch.arange(-1, 3, dtype=torch.float64)).clamp(0, src - 1).long()
+        return idx, torch.stack([w0, w1, w2, w3], dim=1).float()
+
+    if kernel == "area":
+        j = torch.arange(dst, dtype=torch.int64)
+        start = (j * src) // dst
+        end = ((j + 1) * src + dst - 1) // dst
+        taps = int((end - start).max())
+        idx = start.unsqueeze(1) + torch.arange(taps)
+        valid = idx < end.unsqueeze(1)
+        weights = valid.double() / (end - start).unsqueeze(1).double()
+        return idx.clamp(max=src - 1), weights.float()
+
+    # bicubic_aa / lanczos：缩小时按比例放宽支撑范围
+    support = _AA_SUPPORT[kernel] * max(scale, 1.0)
+    invscale = 1.0 / scale if scale >= 1.0 else 1.0
+    center = scale * (i + 0.5)
+    xmin = torch.trunc(center - support + 0.5).clamp(min=0)
+    xmax = torch.trunc(center + support + 0.5).clamp(max=src)
+    taps = int((xmax - xmin).max())
+    j = torch.arange(taps, dtype=torch.float64)
+    weights = _aa_filter((xmin.unsqueeze(1) + j - center.unsqueeze(1) + 0.5) * invscale, kernel)
+    weights = weights * (j < (xmax - xmin).unsqueeze(1))
+    weights = weights / weights.sum(dim=1, keepdim=True)
+    idx = (xmin.unsqueeze(1) + j).clamp(max=src - 1).long()
+    return idx, weights.float()
+
+
+def _apply_axis(x: torch.Tensor, idx: torch.Tensor, weights: torch.Tensor, dim: int) -> torch.Tensor:
+    """沿 dim（1 为行，2 为列）对 (B, H, W, C) 张量按下标和权重累加"""
+    shape = [1, 1, 1, 1]
+    shape[dim] = -1
+    out = None
+    for k in range(idx.shape[1]):
+        taps = x.index_select(dim, idx[:, k])
+        taps.mul_(weights[:, k].view(shape))
+        if out is None:
+            out = taps
+        else:
+            out.add_(taps)
+    return out
+
+
+def resize_tiled(images: torch.Tensor, height: int, width: int, kernel: str, memory_budget_mb: float,
+                 window: Optional[Tuple[int, int, int, int]] = None, out: Optional[torch.Tensor] = None,
+                 clamp: bool = False) -> torch.Tensor:
+    """
+    按内存预算分块缩放 (B, H, W, C) 张量
+
+    参数：
+    - kernel: pick_method 返回的插值核（不能为 none）
+    - memory_budget_mb: 单块临时张量的内存上限（MB，可为小数），0 为不限制（整批一块）
+    - window: (top, left, 高, 宽)，只计算缩放结果中的这一区域（缩放后裁切），源图只读取该区域用到的部分
+    - out: 预分配的输出（如拼接画布的一个视图），形状为 (B, 区域高, 区域宽, C)
+    - clamp: 是否把结果截断到 [0, 1]
+
+    返回：
+    - (B, 区域高, 区域宽, C) 张量（传入 out 时即为 out，否则与输入同为浮点类型）
+    """
+    batch, src_h, src_w, channels = images.shape
+    top, left, out_h, out_w = window if window is not None else (0, 0, height, width)
+    idx_h, w_h = axis_weights(src_h, height, kernel)
+    idx_w, w_w = axis_weights(src_w, width, kernel)
+    idx_h, w_h = idx_h[top:top + out_h], w_h[top:top + out_h]
+    idx_w, w_w = idx_w[left:left + out_w], w_w[left:left + out_w]
+    device = images.device
+    idx_h, w_h, idx_w, w_w = idx_h.to(device), w_h.to(device), idx_w.to(device), w_w.to(device)
+
+    budget = int(memory_budget_mb * 1024 * 1024)
+    taps_h, taps_w = idx_h.shape[1], idx_w.shape[1]
+
+    def tile_bytes(samples: int, rows: int, cols: int) -> int:
+        # 源像素（float32 副本）+ 横向结果 + 横向抽头，以及纵向累加和抽头
+        src_rows = min(math.ceil(rows * src_h / height) + taps_h, src_h)
+        src_cols = min(math.ceil(cols * src_w / width) + taps_w, src_w)
+        return samples * channels * 4 * (src_rows * (src_cols + 2 * cols) + 2 * rows * cols)
+
+    def largest(limit: int, fits) -> int:
+        # 满足 fits 的最大值（至少为 1），二分查找
+        lo, hi = 1, limit
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    chunk, rows, cols = batch, out_h, out_w
+    if budget > 0:
+        per_sample = tile_bytes(1, out_h, out_w)
+        if per_sample <= budget:
+            chunk = max(1, min(batch, budget // per_sample))
+        elif tile_bytes(1, 1, out_w) <= budget:
+            chunk = 1
+            rows = largest(out_h, lambda n: tile_bytes(1, n, out_w) <= budget)
+        else:
+            # 一行都超出预算时再按列分块
+            chunk, rows = 1, 1
+            cols = largest(out_w, lambda n: tile_bytes(1, 1, n) <= budget)
+            if tile_bytes(1, 1, cols) > budget:
+                print(f"⚠️ 缩放 {src_h}x{src_w} → {height}x{width}：最小分块（1 个像素）约需 "
+                      f"{tile_bytes(1, 1, 1) / 1024:.1f}KB，超出内存预算 {memory_budget_mb}MB")
+
+    if out is None:
+        dtype = images.dtype if images.is_floating_point() else torch.float32
+        out = torch.empty((batch, out_h, out_w, channels), dtype=dtype, device=device)
+    for b0 in range(0, batch, chunk):
+        b1 = min(b0 + chunk, batch)
+        for r0 in range(0, out_h, rows):
+            r1 = min(r0 + rows, out_h)
+            row_idx = idx_h[r0:r1]
+            row_lo = int(row_idx.min())
+            row_hi = int(row_idx.max()) + 1
+            for c0 in range(0, out_w, cols):
+                c1 = min(c0 + cols, out_w)
+                col_idx = idx_w[c0:c1]
+                col_lo = int(col_idx.min())
+                col_hi = int(col_idx.max()) + 1
+                source = images[b0:b1, row_lo:row_hi, col_lo:col_hi].to(torch.float32)
+                horizontal = _apply_axis(source, col_idx - col_lo, w_w[c0:c1], 2)
+                tile = _apply_axis(horizontal, row_idx - row_lo, w_h[r0:r1], 1)
+                if clamp:
+                    tile.clamp_(0.0, 1.0)
+                out[b0:b1, r0:r1, c0:c1] = tile
+    return out
+
+
+def resize_crop(images: torch.Tensor, height: int, width: int, top: int, left: int, crop_h: int, crop_w: int,
+                method: str = "auto", memory_budget_mb: int = 0,
+                out: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    缩放到 (height, width) 后裁切 [top:top+crop_h, left:left+crop_w]，两步合为一步：
+    只对保留下来的区域插值，尺寸不变时只做裁切
+
+    参数：
+    - images: (B, H, W, C)
+    - method: 见 RESIZE_METHODS
+    - memory_budget_mb: 分块执行的内存预算（MB），0 为不限制
+    - out: 预分配的输出视图，结果直接写入其中
+
+    返回：
+    - (B, crop_h, crop_w, C) 张量（传入 out 时即为 out）
+    """
+    _, src_h, src_w, _ = images.shape
+    kernel = pick_method(src_h, src_w, height, width, method)
+    if kernel == "none":
+        region = images[:, top:top + crop_h, left:left + crop_w]
+        if out is None:
+            return region
+        out.copy_(region)
+        return out
+    return resize_tiled(images, height, width, kernel, memory_budget_mb, (top, left, crop_h, crop_w), out,
+                        clamp=kernel in _OVERSHOOT_METHODS)
+
+
+def _interpolate(images: torch.Tensor, height: int, width: int, kernel: str, clamp: bool) -> torch.Tensor:
+    """不限制内存时的快速路径：PyTorch 原生实现（lanczos 以外的插值核）"""
+    _, src_h, src_w, _ = images.shape
+    dtype = images.dtype if images.is_floating_point() else torch.float32
+    samples = images.movedim(-1, 1).to(torch.float32)
+    if kernel == "area" and src_h % height == 0 and src_w % width == 0:
+        # 整数倍缩小：每块求一次平均
+        result = F.avg_pool2d(samples, (src_h // height, src_w // width))
+    elif kernel == "bicubic_aa":
+        result = F.interpolate(samples, size=(height, width), mode="bicubic", align_corners=False, antialias=True)
+    elif kernel in ("bilinear", "bicubic"):
+        result = F.interpolate(samples, size=(height, width), mode=kernel, align_corners=False)
+    else:
+        result = F.interpolate(samples, size=(height, width), mode=kernel)
+    if clamp:
+        result = result.clamp_(0.0, 1.0)
+    return result.movedim(1, -1).contiguous().to(dtype)
+
+
+def resize_images(images: torch.Tensor, height: int, width: int, method: str = "auto",
+                  clamp: bool = True, memory_budget_mb: int = 0) -> torch.Tensor:
+    """
+    缩放一批图像
+
+    参数：
+    - images: (B, H, W, C)
+    - height, width: 目标尺寸
+    - method: 见 RESIZE_METHODS（另可传入 bicubic_aa：缩小和放大都使用带 antialias 的 bicubic）
+    - clamp: 是否把 bicubic/lanczos 的过冲截断到 [0, 1]
+    - memory_budget_mb: 大于 0 时按该内存预算分块执行，任意非零预算之间的结果逐位相同（见 resize_tiled）；
+                        0 时使用 PyTorch 原生实现（lanczos 除外），与分块结果只有浮点舍入误差
+
+    返回：
+    - (B, height, width, C) 的连续张量
+    """
+    _, src_h, src_w, _ = images.shape
+    kernel = pick_method(src_h, src_w, height, width, method)
+    if kernel == "none":
+        return images
+    clamp = clamp and kernel in _OVERSHOOT_METHODS
+    if memory_budget_mb <= 0 and kernel != "lanczos":
+        return _interpolate(images, height, width, kernel, clamp)
+    return resize_tiled(images, height, width, kernel, memory_budget_mb, clamp=clamp)
+
+
+def resize_masks(masks: torch.Tensor, height: int, width: int, method: str = "auto",
+                 memory_budget_mb: int = 0) -> torch.Tensor:
+    """
+    缩放一批遮罩，插值核与同尺寸图像相同
+
+    参数：
+    - masks: (B, H, W) 或 (H, W)
+
+    返回：
+    - (B, height, width)
+    """
+    if masks.dim() == 2:
+        masks = masks.unsqueeze(0)
+    _, src_h, src_w = masks.shape
+    kernel = pick_method(src_h, src_w, height, width, method)
+    if kernel == "none":
+        return masks
+    clamp = kernel in _OVERSHOOT_METHODS
+    if memory_budget_mb <= 0 and kernel != "lanczos":
+        return _interpolate(masks.unsqueeze(-1), height, width, kernel, clamp).squeeze(-1)
+    return resize_tiled(masks.unsqueeze(-1), height, width, kernel, memory_budget_mb, clamp=clamp).squeeze(-1)
+
+
+def resize_batch(images: torch.Tensor, height: int, width: int, method: str = "auto",
+                 masks: Optional[torch.Tensor] = None,
+                 memory_budget_mb: int = 0) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    """
+    图像与遮罩一起缩放到相同尺寸
+
+    返回：
+    - (图像, 遮罩)，未传入遮罩时遮罩为 None
+    """
+    images = resize_images(images, height, width, method, memory_budget_mb=memory_budget_mb)
+    if masks is not None:
+        masks = resize_masks(masks, height, width, method, memory_budget_mb)
+    return images, masks
+
+
+
+if __name__ == "__main__":
+    # 一致性检查：python _resize.py
+    # 各种非零预算（整批一块 / 按批次 / 按行 / 按列分块）的结果必须逐位相同，
+    # 不限制内存时的原生实现与分块引擎只允许浮点舍入误差
+    import time
+
+    torch.manual_seed(0)
+    images = torch.rand(3, 97, 131, 4)
+    cases = [(40, 50, "auto"), (60, 131, "area"), (200, 150, "bicubic"), (50, 70, "lanczos"),
+             (300, 40, "lanczos"), (97, 262, "bilinear"), (33, 77, "nearest-exact"), (150, 200, "bicubic_aa"),
+             (30, 40, "area")]
+    for height, width, method in cases:
+        reference = resize_images(images, height, width, method, memory_budget_mb=1024)
+        for budget_mb in (0.5, 0.05, 0.005, 0.002):
+            tiled = resize_images(images, height, width, method, memory_budget_mb=budget_mb)
+            assert torch.equal(reference, tiled), (height, width, method, budget_mb)
+        masks = images[..., 0]
+        assert torch.equal(resize_masks(masks, height, width, method, memory_budget_mb=1024),
+                           resize_masks(masks, height, width, method, memory_budget_mb=0.002))
+        error = float((resize_images(images, height, width, method) - reference).abs().max())
+        assert error < 1e-3, (height, width, method, error)
+        print(f"{method:>14} 97x131 → {height}x{width}: 各预算结果逐位相同，与原生实现最大误差 {error:.1e}")
+
+    # 默认路径（不限制内存）的耗时
+    images = torch.rand(2, 1536, 2048, 3)
+    for height, width, method in [(768, 1024, "auto"), (1000, 1333, "auto"), (2304, 3072, "auto"),
+                                  (512, 683, "lanczos")]:
+        start = time.perf_counter()
+        resize_images(images, height, width, method)
+        default = time.perf_counter() - start
+        start = time.perf_counter()
+        resize_images(images, height, width, method, memory_budget_mb=1024)
+        tiled = time.perf_counter() - start
+        print(f"{pick_method(1536, 2048, height, width, method):>14} 2x1536x2048 → {height}x{width}: "
+              f"默认 {default:.2f}s，分块引擎 {tiled:.2f}s")
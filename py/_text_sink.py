@@ -0,0 +1,263 @@
+"""
+PD文本汇总写入
+把逐条保存的文本追加到按大小轮转的 JSONL/CSV 分片文件中，
+写入先进入内存缓冲，按条数或时间间隔批量落盘，避免产生大量小文件；
+另提供把分片展开为逐条 .txt 文件的批量步骤
+"""
+
+import atexit
+import csv
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ._counter_index import claim_numbered_file, get_counter_index
+
+SINK_FORMATS = ("jsonl", "csv")
+
+# 记录字段（CSV 列顺序）
+RECORD_FIELDS = ("filename", "delimiter", "padding", "extension", "text")
+
+
+def _shard_pattern(name: str, fmt: str):
+    return re.compile(f"{re.escape(name)}-(\\d{{5}})\\.{fmt}$")
+
+
+class TextSink:
+    """
+    可追加的文本分片
+
+    参数：
+    - directory: 分片所在文件夹
+    - name: 分片名前缀，分片文件为 {name}-{序号:05}.{fmt}
+    - fmt: jsonl 或 csv
+    - max_shard_bytes: 单个分片的大小上限，超过后写入下一个分片
+    - flush_records: 缓冲达到该条数时立即落盘
+    - flush_seconds: 缓冲中最早的记录最多等待该秒数后落盘
+    """
+
+    def __init__(self, directory: str, name: str, fmt: str = "jsonl", max_shard_bytes: int = 64 * 1024 * 1024,
+                 flush_records: int = 256, flush_seconds: float = 5.0):
+        if fmt not in SINK_FORMATS:
+            raise ValueError(f"Unsupported sink format: {fmt}")
+        self.directory = directory
+        self.name = name
+        self.fmt = fmt
+        self.max_shard_bytes = max_shard_bytes
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._buffer: List[Dict] = []
+        self._timer: Optional[threading.Timer] = None
+        self._shard_index, self._shard_bytes = self._find_last_shard()
+
+    def _shard_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"{self.name}-{index:05}.{self.fmt}")
+
+    def _find_last_shard(self) -> Tuple[int, int]:
+        """找到已有的最后一个分片，继续向其追加"""
+        pattern = _shard_pattern(self.name, self.fmt)
+        last = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    match = pattern.match(entry.name)
+                    if match:
+                        last = max(last, int(match.group(1)))
+        except FileNotFoundError:
+            pass
+        try:
+            size = os.path.getsize(self._shard_path(last))
+        except OSError:
+            size = 0
+        return last, size
+
+    @property
+    def current_shard(self) -> str:
+        return self._shard_path(self._shard_index)
+
+    def append(self, record: Dict) -> None:
+        """追加一条记录（先进入缓冲）"""
+        with self._lock:
+            self._buffer.append(record)
+            should_flush = len(self._buffer) >= self.flush_records
+            if not should_flush and self._timer is None and self.flush_seconds > 0:
+                self._timer = threading.Timer(self.flush_seconds, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if should_flush or self.flush_seconds <= 0:
+            self.flush()
+
+    def _timed_flush(self) -> None:
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"[TextSink] 写入分片失败 {self.current_shard}: {e}")
+
+    def _encode(self, records: List[Dict]) -> str:
+        if self.fmt == "jsonl":
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        lines = []
+        writer = csv.writer(_LineCollector(lines))
+        for r in records:
+            writer.writerow([r.get(field, "") for field in RECORD_FIELDS])
+        return "".join(lines)
+
+    def flush(self) -> None:
+        """把缓冲中的记录写入当前分片，超出大小上限时轮转到新分片"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            records, self._buffer = self._buffer, []
+            if not records:
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+            pending = records
+            while pending:
+                if self._shard_bytes >= self.max_shard_bytes:
+                    self._shard_index += 1
+                    self._shard_bytes = 0
+                # 按剩余空间估算本分片可写入的条数（至少一条）
+                chunk, pending = self._take_chunk(pending)
+                data = chunk.encode("utf-8")
+                new_shard = self._shard_bytes == 0 and not os.path.exists(self.current_shard)
+                with open(self.current_shard, 'ab') as f:
+                    if new_shard and self.fmt == "csv":
+                        header = self._encode_header().encode("utf-8")
+                        f.write(header)
+                        self._shard_bytes += len(header)
+                    f.write(data)
+                self._shard_bytes += len(data)
+
+    def _take_chunk(self, records: List[Dict]) -> Tuple[str, List[Dict]]:
+        room = self.max_shard_bytes - self._shard_bytes
+        encoded = [self._encode([r]) for r in records]
+        used, count = 0, 0
+        for text in encoded:
+            size = len(text.encode("utf-8"))
+            if count and used + size > room:
+                break
+            used += size
+            count += 1
+        return "".join(encoded[:count]), records[count:]
+
+    def _encode_header(self) -> str:
+        lines = []
+        csv.writer(_LineCollector(lines)).writerow(RECORD_FIELDS)
+        return "".join(lines)
+
+
+class _LineCollector:
+    """csv.writer 的写入目标，收集输出字符串"""
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+
+    def write(self, text: str) -> None:
+        self.lines.append(text)
+
+
+_sinks: Dict[Tuple[str, str, str], TextSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_text_sink(directory: str, name: str, fmt: str = "jsonl", max_shard_mb: int = 64,
+                  flush_records: int = 256, flush_seconds: float = 5.0) -> TextSink:
+    """获取共享分片写入实例，并更新其轮转和落盘参数"""
+    key = (os.path.abspath(directory), name, fmt)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = TextSink(key[0], name, fmt, max_shard_mb * 1024 * 1024, flush_records, flush_seconds)
+            _sinks[key] = sink
+        else:
+            sink.max_shard_bytes = max_shard_mb * 1024 * 1024
+            sink.flush_records = flush_records
+            sink.flush_seconds = flush_seconds
+        return sink
+
+
+def flush_all_sinks() -> None:
+    """把所有分片写入实例的缓冲落盘"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        try:
+            sink.flush()
+        except OSError as e:
+            print(f"[TextSink] 写入分片失败 {sink.current_shard}: {e}")
+
+
+atexit.register(flush_all_sinks)
+
+
+def iter_shard_records(shard_path: str) -> Iterator[Dict]:
+    """逐条读取 JSONL/CSV 分片中的记录"""
+    if shard_path.lower().endswith(".csv"):
+        with open(shard_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                yield row
+    else:
+        with open(shard_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def find_shards(path: str) -> List[str]:
+    """path 为分片文件时返回自身，为文件夹时返回其中所有分片（已排序）"""
+    if os.path.isfile(path):
+        return [path]
+    pattern = re.compile(r".+-\d{5}\.(jsonl|csv)$")
+    with os.scandir(path) as it:
+        return sorted(entry.path for entry in it if entry.is_file() and pattern.match(entry.name))
+
+
+def explode_shards(path: str, output_dir: str = "", overwrite: bool = True) -> Tuple[int, int, List[str]]:
+    """
+    把分片中的每条记录写成单独的文本文件
+
+    参数：
+    - path: 分片文件或包含分片的文件夹
+    - output_dir: 输出文件夹，为空时写到分片所在文件夹
+    - overwrite: 不编号的文件已存在时是否覆盖
+
+    返回：
+    - (写入文件数, 跳过的记录数, 处理过的分片列表)
+    """
+    flush_all_sinks()
+    shards = find_shards(path)
+    written, skipped = 0, 0
+    numbered_dirs = set()
+    for shard in shards:
+        target_dir = output_dir or os.path.dirname(shard)
+        os.makedirs(target_dir, exist_ok=True)
+        for record in iter_shard_records(shard):
+            filename = str(record.get("filename", ""))
+            extension = str(record.get("extension", "") or ".txt")
+            padding = int(record.get("padding", 0) or 0)
+            if not filename:
+                skipped += 1
+                continue
+            if padding > 0:
+                _, file_path = claim_numbered_file(target_dir, filename, str(record.get("delimiter", "")),
+                                                   padding, extension, persist=False)
+                numbered_dirs.add(target_dir)
+            else:
+                file_path = os.path.join(target_dir, f"{filename}{extension}")
+                if not overwrite and os.path.exists(file_path):
+                    skipped += 1
+                    continue
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(str(record.get("text", "")))
+            written += 1
+
+    # 编号索引在全部写完后统一落盘
+    for target_dir in numbered_dirs:
+        get_counter_index(target_dir).flush()
+    return written, skipped, shards
@@ -0,0 +1,440 @@
+"""
+PD工作流存档索引
+把文件夹中的工作流 JSON 提取为 节点类型 / 节点参数 / 分组标题和颜色 / 模型文件名 几张表，保存在 ComfyUI 用户目录的 pd_cache/workflow_index.sqlite3（见 _cache_dir）；
+files 表记录每个文件的 mtime 和大小，刷新时只重新解析新增和修改过的文件（解析可交给进程池），删除的文件从索引中移除；
+查询直接在 SQLite 上按索引列完成，例如 "哪些工作流用了节点 X"、"标题为 Y 且不是 Blue 的分组"，
+结果可作为 PDJSON_Pipeline 的 file_list，只编辑匹配的文件
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from ._cache_dir import PLUGIN_ROOT, cache_path
+from ._dir_index import get_directory_index
+from ._process_pool import run_sharded
+from ._workflow_json import loads, parse_spec_lines, resolve_color
+
+# 默认索引插件自带的 workflow 和 input 文件夹
+DEFAULT_DB_PATH = cache_path("workflow_index.sqlite3")
+DEFAULT_FOLDERS = [os.path.join(PLUGIN_ROOT, "workflow"), os.path.join(PLUGIN_ROOT, "input")]
+
+# 参数值以这些扩展名结尾时记为模型文件
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft", ".onnx")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    folder TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files(folder);
+CREATE TABLE IF NOT EXISTS nodes (file_id INTEGER NOT NULL, node_id TEXT, type TEXT);
+CREATE INDEX IF NOT EXISTS nodes_type ON nodes(type);
+CREATE INDEX IF NOT EXISTS nodes_file ON nodes(file_id);
+CREATE TABLE IF NOT EXISTS widgets (file_id INTEGER NOT NULL, node_id TEXT, node_type TEXT, name TEXT, value TEXT);
+CREATE INDEX IF NOT EXISTS widgets_value ON widgets(value);
+CREATE INDEX IF NOT EXISTS widgets_file ON widgets(file_id);
+CREATE TABLE IF NOT EXISTS groups (file_id INTEGER NOT NULL, title TEXT, color TEXT, font_size INTEGER);
+CREATE INDEX IF NOT EXISTS groups_title ON groups(title);
+CREATE INDEX IF NOT EXISTS groups_file ON groups(file_id);
+CREATE TABLE IF NOT EXISTS models (file_id INTEGER NOT NULL, node_id TEXT, node_type TEXT, filename TEXT COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS models_filename ON models(filename);
+CREATE INDEX IF NOT EXISTS models_file ON models(file_id);
+"""
+
+DETAIL_TABLES = ("nodes", "widgets", "groups", "models")
+
+# 未指定的查询参数（与值为 None 的颜色区分开）
+_UNSET = object()
+
+
+def _value_text(value) -> str:
+    """参数值转为索引中保存的文本：字符串原样保存，其余按 JSON 保存"""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def extract_workflow(data) -> Dict[str, List[Tuple]]:
+    """
+    从工作流数据中提取索引记录，支持界面格式（nodes/groups，包括子图中的节点）和 API 格式（id -> class_type/inputs）
+
+    返回：
+    - {"nodes": [(节点id, 类型)], "widgets": [(节点id, 类型, 参数名或序号, 值)],
+       "groups": [(标题, 颜色, 字体大小)], "models": [(节点id, 类型, 文件名)]}
+    """
+    record = {"nodes": [], "widgets": [], "groups": [], "models": []}
+    if not isinstance(data, dict):
+        return record
+
+    def add_node(node_id, node_type, values):
+        node_id = str(node_id)
+        record["nodes"].append((node_id, node_type))
+        for name, value in values:
+            if value is None or isinstance(value, (dict, list)):
+                continue
+            record["widgets"].append((node_id, node_type, str(name), _value_text(value)))
+            if isinstance(value, str) and value.lower().endswith(MODEL_EXTENSIONS):
+                record["models"].append((node_id, node_type, value.replace("\\", "/").rsplit("/", 1)[-1]))
+
+    if "nodes" in data:
+        graphs = [data] + list(((data.get("definitions") or {}).get("subgraphs")) or [])
+        for graph in graphs:
+            for node in graph.get("nodes", []) or []:
+                values = node.get("widgets_values")
+                if isinstance(values, dict):
+                    values = values.items()
+                elif isinstance(values, list):
+                    values = enumerate(values)
+                else:
+                    values = ()
+                add_node(node.get("id"), node.get("type"), values)
+            for group in graph.get("groups", []) or []:
+                record["groups"].append((group.get("title"), group.get("color"), group.get("font_size")))
+    else:
+        for node_id, node in data.items():
+            if isinstance(node, dict) and "class_type" in node:
+                # 连线输入为 [节点id, 输出序号]，extract 时按列表跳过
+                add_node(node_id, node["class_type"], (node.get("inputs") or {}).items())
+    return record
+
+
+def _extract_file(path: str) -> Tuple[str, Optional[Dict], Optional[str]]:
+    """解析单个文件，返回 (路径, 索引记录, 错误信息)"""
+    try:
+        with open(path, 'rb') as f:
+            return path, extract_workflow(loads(f.read())), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+class RefreshStats(NamedTuple):
+    """一次刷新的统计：扫描 / 新增 / 更新 / 移除的文件数，解析失败的 [(路径, 错误信息)]"""
+    scanned: int
+    added: int
+    updated: int
+    removed: int
+    errors: List[Tuple[str, str]]
+
+    def summary(self) -> str:
+        return (f"索引 {self.scanned} 个文件：新增 {self.added} 个，更新 {self.updated} 个，"
+                f"移除 {self.removed} 个，解析失败 {len(self.errors)} 个")
+
+
+class QueryResult(NamedTuple):
+    """查询结果：匹配的文件路径（已排序）和每个文件的匹配说明"""
+    paths: List[str]
+    details: Dict[str, List[str]]
+
+    def report(self, max_details: int = 20) -> str:
+        lines = []
+        for path in self.paths:
+            lines.append(path)
+            details = self.details.get(path, [])
+            lines.extend(f"  • {detail}" for detail in details[:max_details])
+            if len(details) > max_details:
+                lines.append(f"  … 另有 {len(details) - max_details} 条")
+        return "\n".join(lines)
+
+
+def _normalize_folders(folders: Iterable[str]) -> List[str]:
+    return [os.path.abspath(os.path.normpath(folder)) for folder in folders if folder and folder.strip()]
+
+
+def _scope_clause(folders: Sequence[str], recursive: bool) -> Tuple[str, List]:
+    """限定在指定文件夹（recursive 时包括子文件夹）中的 SQL 条件"""
+    clauses, params = [], []
+    for folder in folders:
+        if recursive:
+            prefix = folder.rstrip(os.sep) + os.sep
+            clauses.append("(f.folder = ? OR substr(f.folder, 1, ?) = ?)")
+            params.extend([folder, len(prefix), prefix])
+        else:
+            clauses.append("f.folder = ?")
+            params.append(folder)
+    return "(" + " OR ".join(clauses or ["0"]) + ")", params
+
+
+def _node_query(type: Optional[str] = None, type_contains: Optional[str] = None):
+    """node type=X / type_contains=X：使用某类节点的工作流"""
+    sql = "SELECT f.path, 'node ' || d.node_id || ': ' || d.type FROM nodes d JOIN files f ON f.id = d.file_id WHERE 1"
+    params = []
+    if type is not None:
+        sql += " AND d.type = ?"
+        params.append(type)
+    if type_contains is not None:
+        sql += " AND instr(d.type, ?) > 0"
+        params.append(type_contains)
+    return sql, params
+
+
+def _model_query(name: Optional[str] = None, contains: Optional[str] = None, node_type: Optional[str] = None):
+    """model name=X（文件名，不区分大小写） / contains=X：使用某个模型文件的工作流"""
+    sql = ("SELECT f.path, 'node ' || d.node_id || ' (' || coalesce(d.node_type, '') || '): ' || d.filename "
+           "FROM models d JOIN files f ON f.id = d.file_id WHERE 1")
+    params = []
+    if name is not None:
+        sql += " AND d.filename = ?"
+        params.append(name)
+    if contains is not None:
+        sql += " AND instr(lower(d.filename), lower(?)) > 0"
+        params.append(contains)
+    if node_type is not None:
+        sql += " AND d.node_type = ?"
+        params.append(node_type)
+    return sql, params
+
+
+def _widget_query(value=_UNSET, contains: Optional[str] = None, node_type: Optional[str] = None,
+                  name: Optional[str] = None):
+    """widget value=X / contains=X，可用 node_type、name（参数名或序号）限定：参数中含某个值的工作流"""
+    sql = ("SELECT f.path, 'node ' || d.node_id || ' (' || coalesce(d.node_type, '') || ') [' || d.name || ']: ' || d.value "
+           "FROM widgets d JOIN files f ON f.id = d.file_id WHERE 1")
+    params = []
+    if value is not _UNSET:
+        sql += " AND d.value = ?"
+        params.append(_value_text(value))
+    if contains is not None:
+        sql += " AND instr(d.value, ?) > 0"
+        params.append(str(contains))
+    if node_type is not None:
+        sql += " AND d.node_type = ?"
+        params.append(node_type)
+    if name is not None:
+        sql += " AND d.name = ?"
+        params.append(str(name))
+    return sql, params
+
+
+def _group_query(title: Optional[str] = None, title_contains: Optional[str] = None, color=_UNSET, not_color=_UNSET):
+    """group title=Y / title_contains=Y，color=Blue / not_color=Blue（颜色名或颜色值，None 为无颜色）"""
+    sql = ("SELECT f.path, 'group ' || quote(d.title) || ': ' || coalesce(d.color, 'None') "
+           "FROM groups d JOIN files f ON f.id = d.file_id WHERE 1")
+    params = []
+    if title is not None:
+        sql += " AND d.title = ?"
+        params.append(title)
+    if title_contains is not None:
+        sql += " AND instr(d.title, ?) > 0"
+        params.append(title_contains)
+    if color is not _UNSET:
+        sql += " AND d.color IS ?"
+        params.append(resolve_color(color))
+    if not_color is not _UNSET:
+        sql += " AND d.color IS NOT ?"
+        params.append(resolve_color(not_color))
+    return sql, params
+
+
+# 查询名 -> 生成 SQL 的函数
+QUERIES = {
+    "node": _node_query,
+    "model": _model_query,
+    "widget": _widget_query,
+    "group": _group_query,
+}
+
+
+class WorkflowIndex:
+    """
+    工作流存档索引
+
+    参数：
+    - db_path: SQLite 数据库路径
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def refresh(self, folders: Iterable[str], recursive: bool = False, workers: int = 1,
+                on_progress=None) -> RefreshStats:
+        """
+        增量刷新：按 mtime 和大小找出新增/修改/删除的 JSON 文件，只重新解析有变化的文件
+
+        参数：
+        - folders: 要索引的文件夹
+        - recursive: 是否包括子文件夹
+        - workers: 解析进程数，1 为在当前进程中顺序处理，0 为 CPU 核心数
+        - on_progress: 进度回调，参数为本次解析完成的文件数
+        """
+        folders = _normalize_folders(folders)
+        current: Dict[str, Tuple[int, int]] = {}
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            snapshot = get_directory_index(folder, recursive).scan()
+            current.update((path, stat) for path, stat in snapshot.items() if path.lower().endswith(".json"))
+
+        scope, scope_params = _scope_clause(folders, recursive)
+        with self._lock:
+            known = {path: (file_id, (mtime_ns, size)) for file_id, path, mtime_ns, size in self._conn.execute(
+                f"SELECT f.id, f.path, f.mtime_ns, f.size FROM files f WHERE {scope}", scope_params)}
+
+        changed = sorted(path for path, stat in current.items() if path not in known or known[path][1] != stat)
+        removed = [file_id for path, (file_id, _) in known.items() if path not in current]
+        # 解析没有副作用：子进程异常退出时直接抛出，不把未解析的文件记为失败，下次刷新时重新解析
+        results = run_sharded(_extract_file, changed, (), workers, on_progress)
+
+        added = updated = 0
+        with self._lock, self._conn:
+            for file_id in removed:
+                self._delete(file_id, remove_file=True)
+            for path, record, error in results:
+                mtime_ns, size = current[path]
+                if path in known:
+                    file_id = known[path][0]
+                    self._delete(file_id)
+                    self._conn.execute("UPDATE files SET mtime_ns = ?, size = ?, error = ? WHERE id = ?",
+                                       (mtime_ns, size, error, file_id))
+                    updated += 1
+                else:
+                    file_id = self._conn.execute(
+                        "INSERT INTO files (path, folder, mtime_ns, size, error) VALUES (?, ?, ?, ?, ?)",
+                        (path, os.path.dirname(path), mtime_ns, size, error)).lastrowid
+                    added += 1
+                if error is not None:
+                    continue
+                for table in DETAIL_TABLES:
+                    rows = record[table]
+                    if rows:
+                        marks = ", ".join("?" * (len(rows[0]) + 1))
+                        self._conn.executemany(f"INSERT INTO {table} VALUES ({marks})",
+                                               [(file_id,) + row for row in rows])
+            # 解析失败的文件（包括之前失败且未修改的）
+            errors = list(self._conn.execute(
+                f"SELECT f.path, f.error FROM files f WHERE f.error IS NOT NULL AND {scope} ORDER BY f.path",
+                scope_params))
+        return RefreshStats(len(current), added, updated, len(removed), errors)
+
+    def _delete(self, file_id: int, remove_file: bool = False) -> None:
+        for table in DETAIL_TABLES:
+            self._conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+        if remove_file:
+            self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def query(self, query_name: str, folders: Iterable[str], recursive: bool = False, /,
+              **kwargs) -> Dict[str, List[str]]:
+        """
+        执行单个查询（见 QUERIES），返回 匹配文件路径 -> 匹配说明
+        前三个参数只能按位置传入，查询条件（包括 model、widget 的 name=）全部放在 kwargs 中
+        """
+        build = QUERIES.get(query_name)
+        if build is None:
+            raise ValueError(f"未知查询: {query_name}（可用: {', '.join(QUERIES)}）")
+        sql, params = build(**kwargs)
+        scope, scope_params = _scope_clause(_normalize_folders(folders), recursive)
+        matches: Dict[str, List[str]] = {}
+        with self._lock:
+            for path, detail in self._conn.execute(f"{sql} AND {scope}", params + scope_params):
+                matches.setdefault(path, []).append(detail)
+        return matches
+
+    def find(self, text: str, folders: Iterable[str], recursive: bool = False) -> QueryResult:
+        """
+        执行多行查询，每行一个条件（格式与 PDJSON_Pipeline 的操作列表相同），结果为同时满足所有条件的文件
+
+        例如：
+        node type=KSampler
+        group title="Load Models" not_color=Blue
+        """
+        folders = list(folders)
+        specs = parse_spec_lines(text)
+        if not specs:
+            raise ValueError(f"没有查询条件（可用: {', '.join(QUERIES)}）")
+        paths = None
+        details: Dict[str, List[str]] = {}
+        for line_no, name, kwargs in specs:
+            try:
+                matches = self.query(name, folders, recursive, **kwargs)
+            except TypeError as e:
+                raise ValueError(f"第 {line_no} 行参数错误 ({name}): {e}")
+            except ValueError as e:
+                raise ValueError(f"第 {line_no} 行: {e}")
+            paths = set(matches) if paths is None else paths & set(matches)
+            for path, lines in matches.items():
+                details.setdefault(path, []).extend(lines)
+        paths = sorted(paths)
+        return QueryResult(paths, {path: details[path] for path in paths})
+
+
+def folders_fingerprint(folders: Iterable[str], recursive: bool = False) -> str:
+    """根据文件夹中 JSON 文件的 mtime 和大小生成标识，用于 IS_CHANGED 判断存档是否变化"""
+    digest = hashlib.sha1()
+    for folder in _normalize_folders(folders):
+        digest.update(f"|{folder}".encode("utf-8"))
+        if not os.path.isdir(folder):
+            continue
+        snapshot = get_directory_index(folder, recursive).scan()
+        for path in sorted(p for p in snapshot if p.lower().endswith(".json")):
+            mtime_ns, size = snapshot[path]
+            digest.update(f"|{path}|{mtime_ns}|{size}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+_indexes: Dict[str, WorkflowIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_workflow_index(db_path: str = DEFAULT_DB_PATH) -> WorkflowIndex:
+    """获取数据库的共享索引实例"""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = WorkflowIndex(db_path)
+            _indexes[db_path] = index
+        return index
+
+
+if __name__ == "__main__":
+    # 查询检查：在插件根目录的上一级运行 python -m Comfyui_PDuse.py._workflow_index
+    # 在临时文件夹中建立索引，检查每种查询（包括 model、widget 的 name= 条件）的结果
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder:
+        workflows = {
+            "a.json": {"nodes": [
+                {"id": 1, "type": "CheckpointLoaderSimple", "widgets_values": ["sd/M.ckpt"]},
+                {"id": 2, "type": "KSampler", "widgets_values": [42, "fixed", 20]}],
+                "groups": [{"title": "Load Models", "color": "#3f789e"}]},
+            "b.json": {"3": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "other.safetensors"}}},
+        }
+        for filename, data in workflows.items():
+            with open(os.path.join(folder, filename), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        index = WorkflowIndex(os.path.join(folder, "index", "workflow_index.sqlite3"))
+        print(index.refresh([folder]).summary())
+        a, b = (os.path.abspath(os.path.join(folder, filename)) for filename in ("a.json", "b.json"))
+        cases = [
+            ("node type=KSampler", [a]),
+            ("model name=m.ckpt", [a]),
+            ("model name=other.safetensors node_type=CheckpointLoaderSimple", [b]),
+            ("model contains=.ckpt", [a]),
+            ("widget name=0 contains=sd/", [a]),
+            ("widget name=ckpt_name value=other.safetensors", [b]),
+            ("widget name=0 value=42", [a]),
+            ("widget name=1 value=42", []),
+            ("group title=\"Load Models\" color=Blue", [a]),
+            ("group title=\"Load Models\" not_color=Blue", []),
+            ("model contains=ckpt\nnode type=KSampler", [a]),
+        ]
+        for text, expected in cases:
+            result = index.find(text, [folder])
+            assert result.paths == expected, (text, result.paths)
+            print(f"{text!r}: {[os.path.basename(path) for path in result.paths]}")
+        index.close()
@@ -0,0 +1,708 @@
+"""
+PD工作流JSON批量编辑
+每个文件只解析一次（有 orjson 时用 orjson 解析，否则用标准库），在内存中执行编辑操作后写回；
+输出与 json.dump(ensure_ascii=False, indent=4) 逐字节相同，
+写入通过 临时文件 + os.replace 原子替换，内容没有变化时不写；
+文件按分片交给进程池处理（见 _process_pool），.pd_workflow_edits.json 记录每个输出在当前规则下对应的源文件哈希，
+重复运行时直接跳过源文件和输出都未变化的文件；
+编辑操作按名称注册（OPERATIONS），PDJSON_Pipeline 把多行操作列表解析后按顺序在同一次解析/写入中执行
+"""
+
+import hashlib
+import json
+import os
+import shlex
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # 未安装时使用标准库
+    orjson = None
+
+from ._process_pool import run_sharded
+
+EDIT_INDEX_FILENAME = ".pd_workflow_edits.json"
+
+# 工作流中分组的预设颜色
+GROUP_COLORS = {
+    "Blue": "#3f789e",
+    "DeepGray": "#444",
+    "Yellow": "#c09430",
+    "Green": "#3c763d",
+    "None": None,
+}
+
+
+def loads(raw: bytes):
+    """解析 JSON；orjson 不接受的内容（如 NaN、BOM）回退到标准库"""
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw.decode("utf-8-sig"))
+
+
+def dumps(data) -> str:
+    """
+    序列化为原先的 indent=4 格式
+    （orjson 只有 2 空格缩进，且浮点数写法与标准库不同，改写后反而比标准库慢，因此输出始终使用标准库）
+    """
+    return json.dumps(data, ensure_ascii=False, indent=4)
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha1(raw).hexdigest()
+
+
+def rules_fingerprint(*rules) -> str:
+    """根据编辑规则生成标识，规则变化后索引中的记录全部失效"""
+    return hashlib.sha1(repr(rules).encode("utf-8")).hexdigest()
+
+
+def atomic_write_bytes(file_path: str, data: bytes) -> None:
+    """写入临时文件后原子替换目标文件"""
+    directory, name = os.path.split(file_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# ---------------------------------------------------------------- 编辑操作 --
+
+# 操作名 -> 编辑操作类（PDJSON_Pipeline 按名称创建）
+OPERATIONS: Dict[str, type] = {}
+
+
+def register_operation(name: str):
+    """注册编辑操作类的装饰器"""
+    def decorator(cls):
+        cls.name = name
+        OPERATIONS[name] = cls
+        return cls
+    return decorator
+
+
+class SkipOutput(Exception):
+    """编辑操作在 apply 中抛出，表示该文件不生成输出（异常信息为原因），之前的修改一并丢弃"""
+
+
+class WorkflowEdit:
+    """
+    编辑操作基类：apply 就地修改工作流数据并返回改动说明（为空表示没有改动），
+    文件不适用该操作、不应生成输出时抛出 SkipOutput；
+    always_output 为 True 时，输出到其他文件时即使没有改动也生成输出；
+    rules 为参与规则标识的参数（默认为全部属性）
+    """
+    name = ""
+
+    def rules(self):
+        return (self.name,) + tuple(sorted(vars(self).items()))
+
+    def always_output(self, data: Dict) -> bool:
+        """在 apply 之前调用"""
+        return False
+
+    def apply(self, data: Dict) -> List[str]:
+        raise NotImplementedError
+
+
+def resolve_color(color: Optional[str]) -> Optional[str]:
+    """预设颜色名转为颜色值，其余原样返回"""
+    if color is None:
+        return None
+    return GROUP_COLORS.get(color, color)
+
+
+@register_operation("group_style")
+class GroupStyleEdit(WorkflowEdit):
+    """
+    修改分组颜色和字体大小（PDJSON_Group）
+
+    参数：
+    - color: 新颜色（如 #3f789e），None 为不修改
+    - font_size: 新字体大小，None 为不修改；只修改已有 font_size 字段的分组
+    - target_title: 只修改该标题分组的字体大小，为空时修改全部分组
+    """
+
+    def __init__(self, color: Optional[str] = None, font_size: Optional[int] = None, target_title: str = ""):
+        self.color = resolve_color(color)
+        self.font_size = font_size
+        self.target_title = target_title
+
+    def _sizes(self, group: Dict) -> bool:
+        return self.font_size is not None and "font_size" in group \
+            and (not self.target_title or group.get("title") == self.target_title)
+
+    def always_output(self, data: Dict) -> bool:
+        # 与旧节点一致：选择了颜色，或有分组的字体大小要修改时，即使已是目标值也生成输出
+        return any(self.color is not None or self._sizes(group) for group in data.get("groups", []) or [])
+
+    def apply(self, data: Dict) -> List[str]:
+        changes = []
+        for group in data.get("groups", []) or []:
+            title = group.get("title")
+            # 只记录实际发生变化的值；原地修改时全部已是目标值的文件不会被重写
+            if self.color is not None and group.get("color") != self.color:
+                changes.append(f"组 '{title}': 颜色 {group.get('color')} → {self.color}")
+                group["color"] = self.color
+            if self._sizes(group) and group["font_size"] != self.font_size:
+                changes.append(f"组 '{title}': 字体大小 {group['font_size']} → {self.font_size}")
+                group["font_size"] = self.font_size
+        return changes
+
+
+@register_operation("group")
+class GroupEdit(WorkflowEdit):
+    """
+    按条件筛选分组后修改颜色/字体大小/标题，只记录实际发生变化的改动
+
+    参数：
+    - title / title_contains / match_color: 筛选条件（标题相同 / 标题包含 / 当前颜色相同），都为空时选中全部分组
+    - not_color: 只选中当前颜色不是该值的分组
+    - color / font_size / new_title: 新值，None 为不修改
+    """
+
+    def __init__(self, title: Optional[str] = None, title_contains: Optional[str] = None,
+                 match_color: Optional[str] = None, not_color: Optional[str] = None, color: Optional[str] = None,
+                 font_size: Optional[int] = None, new_title: Optional[str] = None):
+        self.title = title
+        self.title_contains = title_contains
+        self.match_color = resolve_color(match_color)
+        self.not_color = resolve_color(not_color)
+        self.color = resolve_color(color)
+        self.font_size = font_size
+        self.new_title = new_title
+
+    def matches(self, group: Dict) -> bool:
+        title = group.get("title") or ""
+        if self.title is not None and title != self.title:
+            return False
+        if self.title_contains is not None and self.title_contains not in title:
+            return False
+        if self.match_color is not None and group.get("color") != self.match_color:
+            return False
+        if self.not_color is not None and group.get("color") == self.not_color:
+            return False
+        return True
+
+    def apply(self, data: Dict) -> List[str]:
+        changes = []
+        for group in data.get("groups", []) or []:
+            if not self.matches(group):
+                continue
+            title = group.get("title")
+            for key, value in (("color", self.color), ("font_size", self.font_size), ("title", self.new_title)):
+                if value is not None and group.get(key) != value:
+                    changes.append(f"组 '{title}': {key} {group.get(key)} → {value}")
+                    group[key] = value
+        return changes
+
+
+@register_operation("node_layout")
+class NodeLayoutEdit(WorkflowEdit):
+    """
+    按 id 从小到大排列节点，依次设置 pos/xy 为 起点 + 序号 * 步长（BatchJsonIncremental）
+    """
+
+    def __init__(self, start_x: int = 0, start_y: int = 0, increment: int = 20):
+        self.start_x = start_x
+        self.start_y = start_y
+        self.increment = increment
+
+    def always_output(self, data: Dict) -> bool:
+        # 与旧节点一致：有节点的文件都生成输出（已排列好的也输出）
+        return bool(data.get("nodes"))
+
+    def apply(self, data: Dict) -> List[str]:
+        nodes = data.get("nodes", [])
+        if not nodes:
+            # 与旧节点一致：没有节点的文件不输出
+            raise SkipOutput("没有节点，不输出")
+        changes = []
+        ordered = sorted(nodes, key=lambda x: x.get("id", 0))
+        if any(a is not b for a, b in zip(ordered, nodes)):
+            changes.append("按 id 重新排序节点")
+        moved = 0
+        for i, node in enumerate(ordered):
+            new_pos = [self.start_x + i * self.increment, self.start_y + i * self.increment]
+            if node.get("pos") != new_pos or node.get("xy") != new_pos:
+                moved += 1
+            node["pos"] = list(new_pos)
+            node["xy"] = list(new_pos)
+        if moved:
+            changes.append(f"排列 {moved} 个节点")
+        data["nodes"] = ordered
+        return changes
+
+
+@register_operation("widget_replace")
+class WidgetReplaceEdit(WorkflowEdit):
+    """
+    替换节点的 widgets_values
+
+    参数：
+    - old / new: 旧值 / 新值
+    - node_type: 只处理该类型的节点，为空时处理全部节点
+    - index: 只处理该位置的值，None 为全部位置
+    - substring: 为 True 时把字符串值中的 old 子串替换为 new（如替换模型文件名的一部分），否则整值相等才替换
+    """
+
+    def __init__(self, old=None, new=None, node_type: Optional[str] = None, index: Optional[int] = None,
+                 substring: bool = False):
+        self.old = old
+        self.new = new
+        self.node_type = node_type
+        self.index = index
+        self.substring = substring
+
+    def _replace(self, value):
+        if self.substring:
+            if isinstance(value, str) and isinstance(self.old, str) and self.old and self.old in value:
+                return value.replace(self.old, str(self.new))
+            return value
+        return self.new if value == self.old and type(value) is type(self.old) else value
+
+    def apply(self, data: Dict) -> List[str]:
+        changes = []
+        for node in data.get("nodes", []) or []:
+            if self.node_type and node.get("type") != self.node_type:
+                continue
+            values = node.get("widgets_values")
+            if isinstance(values, dict):
+                items = [(k, values[k]) for k in values]
+            elif isinstance(values, list):
+                items = list(enumerate(values))
+            else:
+                continue
+            for key, value in items:
+                if self.index is not None and key != self.index:
+                    continue
+                new_value = self._replace(value)
+                if new_value != value:
+                    values[key] = new_value
+                    changes.append(f"节点 {node.get('id')} ({node.get('type')}) [{key}]: {value!r} → {new_value!r}")
+        return changes
+
+
+def _link_fields(link):
+    """链接的 (id, origin_id, origin_slot)，兼容列表和字典两种格式"""
+    if isinstance(link, dict):
+        return link.get("id"), link.get("origin_id"), link.get("origin_slot")
+    return link[0], link[1], link[2]
+
+
+def _set_link_origin(link, origin_id, origin_slot) -> None:
+    if isinstance(link, dict):
+        link["origin_id"], link["origin_slot"] = origin_id, origin_slot
+    else:
+        link[1], link[2] = origin_id, origin_slot
+
+
+@register_operation("link_rewrite")
+class LinkRewriteEdit(WorkflowEdit):
+    """
+    把从某个节点输出出发的链接改为从另一个节点输出出发（同时更新两个节点 outputs 中的 links 列表）
+
+    参数：
+    - origin_id / origin_slot: 原来的起点节点 id 和输出序号（origin_slot 为 None 时匹配全部输出）
+    - new_origin_id / new_origin_slot: 新的起点（new_origin_slot 为 None 时保持原序号）
+    """
+
+    def __init__(self, origin_id: int = 0, new_origin_id: int = 0, origin_slot: Optional[int] = None,
+                 new_origin_slot: Optional[int] = None):
+        self.origin_id = origin_id
+        self.new_origin_id = new_origin_id
+        self.origin_slot = origin_slot
+        self.new_origin_slot = new_origin_slot
+
+    def apply(self, data: Dict) -> List[str]:
+        nodes = {node.get("id"): node for node in data.get("nodes", []) or []}
+        new_node = nodes.get(self.new_origin_id)
+        if new_node is None:
+            return []
+        old_node = nodes.get(self.origin_id)
+        changes = []
+        for link in data.get("links", []) or []:
+            link_id, origin_id, origin_slot = _link_fields(link)
+            if origin_id != self.origin_id or (self.origin_slot is not None and origin_slot != self.origin_slot):
+                continue
+            new_slot = origin_slot if self.new_origin_slot is None else self.new_origin_slot
+            _set_link_origin(link, self.new_origin_id, new_slot)
+
+            if old_node is not None:
+                outputs = old_node.get("outputs") or []
+                if origin_slot is not None and origin_slot < len(outputs) and outputs[origin_slot].get("links"):
+                    outputs[origin_slot]["links"] = [i for i in outputs[origin_slot]["links"] if i != link_id]
+            outputs = new_node.get("outputs") or []
+            if new_slot is not None and new_slot < len(outputs):
+                links = outputs[new_slot].get("links") or []
+                if link_id not in links:
+                    links.append(link_id)
+                outputs[new_slot]["links"] = links
+            changes.append(f"链接 {link_id}: {origin_id}:{origin_slot} → {self.new_origin_id}:{new_slot}")
+        return changes
+
+
+def parse_spec_lines(text: str) -> List[Tuple[int, str, Dict]]:
+    """
+    解析多行的 名称 key=value key=value ... 列表（操作列表和查询条件共用）
+    值按 JSON 解析（数字、true/false/null、带引号的字符串），解析失败时作为字符串；# 开头的行为注释
+
+    返回：
+    - [(行号, 名称, 参数字典)]
+    """
+    specs = []
+    for line_no, line in enumerate((text or "").splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        tokens = shlex.split(line)
+        name, kwargs = tokens[0], {}
+        for token in tokens[1:]:
+            if "=" not in token:
+                raise ValueError(f"第 {line_no} 行参数格式应为 key=value: {token}")
+            key, value = token.split("=", 1)
+            try:
+                kwargs[key] = json.loads(value)
+            except ValueError:
+                kwargs[key] = value
+        specs.append((line_no, name, kwargs))
+    return specs
+
+
+def parse_operations(text: str) -> List[WorkflowEdit]:
+    """
+    解析操作列表，每行一个操作：操作名 key=value key=value ...
+
+    例如：
+    group title="Load Models" not_color=Blue color=Blue
+    widget_replace node_type=CheckpointLoaderSimple old=sd15.safetensors new=sdxl.safetensors
+    """
+    operations = []
+    for line_no, name, kwargs in parse_spec_lines(text):
+        cls = OPERATIONS.get(name)
+        if cls is None:
+            raise ValueError(f"第 {line_no} 行未知操作: {name}（可用: {', '.join(OPERATIONS)}）")
+        try:
+            operations.append(cls(**kwargs))
+        except TypeError as e:
+            raise ValueError(f"第 {line_no} 行参数错误 ({name}): {e}")
+    return operations
+
+
+# ---------------------------------------------------------------- 批量执行 --
+
+class EditIndex:
+    """
+    编辑索引: 输出文件（相对输出文件夹的路径）-> {"source", "source_mtime_ns", "source_size", "source_hash", "rules", "mtime_ns", "size"}
+
+    参数：
+    - output_dir: 输出文件夹（索引保存在其中）
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, EDIT_INDEX_FILENAME)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries: Dict[str, Dict] = json.load(f).get("files", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入编辑索引失败 {self.path}: {e}")
+
+
+def _output_matches(entry: Dict, output_path: str) -> bool:
+    if entry.get("no_output"):
+        # 上次没有生成输出，源文件和规则都未变化时结果相同
+        return True
+    try:
+        st = os.stat(output_path)
+    except OSError:
+        return False
+    return entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size
+
+
+def edit_file(input_path: str, output_path: str, edits: Sequence, rules: str,
+              known: Optional[Dict] = None, dry_run: bool = False) -> Dict:
+    """
+    编辑单个工作流文件
+
+    参数：
+    - input_path / output_path: 源文件和输出文件（可以相同）
+    - edits: 编辑操作（带 apply(data) -> 改动说明列表 的对象），按顺序执行
+    - rules: 当前规则标识
+    - known: 索引中该输出的记录，源文件和输出都未变化时跳过
+    - dry_run: 只统计不写入
+
+    返回：
+    - 结果字典：status 为 skipped / unchanged / modified / error，changes 为改动说明，entry 为新的索引记录；
+      编辑操作要求跳过（SkipOutput）时不写入输出文件；没有改动时，原地修改不重写，
+      输出到其他文件时只有编辑操作要求输出（always_output）才写入；已有内容相同的输出不重复写入，状态为 unchanged
+    """
+    result = {"path": input_path, "output": output_path, "changes": [], "entry": None}
+    try:
+        st = os.stat(input_path)
+        if known is not None and known.get("rules") == rules and _output_matches(known, output_path) \
+                and known.get("source_mtime_ns") == st.st_mtime_ns and known.get("source_size") == st.st_size:
+            result["status"] = "skipped"
+            result["entry"] = known
+            return result
+
+        with open(input_path, 'rb') as f:
+            raw = f.read()
+        digest = content_hash(raw)
+        entry = {"source_mtime_ns": st.st_mtime_ns, "source_size": st.st_size, "source_hash": digest,
+                 "rules": rules}
+        if known is not None and known.get("rules") == rules and known.get("source_hash") == digest \
+                and _output_matches(known, output_path):
+            # 源文件内容未变（只是修改时间变了）
+            result["status"] = "skipped"
+            result["entry"] = dict(known, **entry)
+            return result
+
+        data = loads(raw)
+        changes = []
+        required = False
+        try:
+            if isinstance(data, dict):
+                for edit in edits:
+                    required = edit.always_output(data) or required
+                    changes.extend(edit.apply(data))
+        except SkipOutput as e:
+            changes, required = [], False
+            result["changes"] = [str(e)]
+        else:
+            result["changes"] = changes
+        if not changes and (output_path == input_path or not required):
+            result["status"] = "unchanged"
+            if output_path == input_path:
+                result["entry"] = dict(entry, mtime_ns=st.st_mtime_ns, size=st.st_size)
+            else:
+                result["entry"] = dict(entry, no_output=True)
+            return result
+        if not changes:
+            result["changes"] = ["没有改动，按原内容生成输出"]
+
+        # 输出到其他文件时，已有相同内容的输出不重复写入
+        encoded = dumps(data).encode("utf-8")
+        if output_path == input_path:
+            existing = raw
+        else:
+            try:
+                with open(output_path, 'rb') as f:
+                    existing = f.read()
+            except OSError:
+                existing = None
+        if existing is not None and content_hash(existing) == content_hash(encoded):
+            result["status"] = "unchanged"
+        else:
+            result["status"] = "modified"
+            if dry_run:
+                return result
+            atomic_write_bytes(output_path, encoded)
+
+        out_st = os.stat(output_path)
+        if output_path == input_path:
+            # 原地修改时，以写回后的内容作为下次比较的源文件
+            entry.update(source_mtime_ns=out_st.st_mtime_ns, source_size=out_st.st_size,
+                         source_hash=content_hash(encoded))
+        entry.update(mtime_ns=out_st.st_mtime_ns, size=out_st.st_size)
+        result["entry"] = entry
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def _edit_job(job: Tuple[str, str, Optional[Dict]], edits: Sequence, rules: str, dry_run: bool) -> Dict:
+    """run_sharded 的单项任务：(源文件, 输出文件, 索引记录)"""
+    input_path, output_path, known = job
+    return edit_file(input_path, output_path, edits, rules, known, dry_run)
+
+
+class EditReport:
+    """
+    批量编辑的统计结果
+
+    属性：
+    - scanned / modified / unchanged / skipped: 文件数
+    - errors: [(路径, 错误信息)]
+    - results: 每个文件的结果（按源文件路径排序）
+    """
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.modified = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.results: List[Dict] = []
+
+    @property
+    def written(self) -> List[str]:
+        return [r["output"] for r in self.results if r["status"] == "modified" and not self.dry_run]
+
+    def add(self, result: Dict) -> None:
+        self.scanned += 1
+        self.results.append(result)
+        status = result["status"]
+        if status == "error":
+            self.errors.append((result["path"], result.get("error", "")))
+        elif status == "skipped":
+            self.skipped += 1
+        elif status == "modified":
+            self.modified += 1
+        else:
+            self.unchanged += 1
+
+    def summary(self, top: int = 20) -> str:
+        """生成统计摘要文本"""
+        verb = "将写入" if self.dry_run else "写入"
+        lines = [f"{'[预览] ' if self.dry_run else ''}共 {self.scanned} 个文件，{verb} {self.modified} 个，"
+                 f"无需修改 {self.unchanged} 个，跳过已处理 {self.skipped} 个，失败 {len(self.errors)} 个"]
+        if self.errors:
+            lines.append("失败详情：")
+            for path, error in self.errors[:top]:
+                lines.append(f"  • {path}: {error}")
+        return "\n".join(lines)
+
+    def details(self, max_changes: int = 50) -> str:
+        """生成逐文件的改动报告（跳过的文件不列出），每个文件最多列出 max_changes 条改动"""
+        labels = {"modified": "将修改" if self.dry_run else "已修改", "unchanged": "无需修改", "error": "失败"}
+        lines = []
+        for result in self.results:
+            status = result["status"]
+            if status == "skipped":
+                continue
+            header = f"[{labels.get(status, status)}] {os.path.basename(result['path'])}"
+            if result["output"] != result["path"]:
+                header += f" → {os.path.basename(result['output'])}"
+            if status == "error":
+                header += f": {result.get('error', '')}"
+            lines.append(header)
+            changes = result.get("changes") or []
+            lines.extend(f"  • {change}" for change in changes[:max_changes])
+            if len(changes) > max_changes:
+                lines.append(f"  … 另有 {len(changes) - max_changes} 条改动")
+        return "\n".join(lines)
+
+
+def run_edits(tasks: Sequence[Tuple[str, str]], edits: Sequence, output_dir: Optional[str], workers: int = 1,
+              dry_run: bool = False, use_index: bool = True, on_progress=None) -> EditReport:
+    """
+    批量编辑工作流文件
+
+    参数：
+    - tasks: [(源文件, 输出文件)]，输出文件不能重复
+    - edits: 编辑操作，按顺序执行（需可被 pickle，以便交给进程池）
+    - output_dir: 输出文件夹（编辑索引保存在其中），None 时每个输出文件所在的文件夹各自保存索引
+    - workers: 进程数，1 为在当前进程中顺序处理，0 为 CPU 核心数
+    - dry_run: 只统计不写入（也不更新索引）
+    - use_index: 是否使用编辑索引跳过已处理的文件
+    - on_progress: 进度回调，参数为本次完成的文件数
+
+    返回：
+    - EditReport
+    """
+    seen: Dict[str, str] = {}
+    for src, dst in tasks:
+        key = os.path.normcase(os.path.abspath(dst))
+        if key in seen:
+            raise ValueError(f"输出文件重复: {dst}（{seen[key]} 和 {src}）")
+        seen[key] = src
+
+    rules = rules_fingerprint(*(edit.rules() for edit in edits))
+    indexes: Dict[str, EditIndex] = {}
+
+    def index_for(dst: str) -> Tuple[EditIndex, str]:
+        # 索引保存在输出文件夹中，以相对该文件夹的路径为键（输出可以在子文件夹中）
+        directory = output_dir if output_dir is not None else os.path.dirname(dst)
+        if directory not in indexes:
+            indexes[directory] = EditIndex(directory)
+        return indexes[directory], os.path.relpath(dst, directory)
+
+    jobs = []
+    for src, dst in tasks:
+        index, key = index_for(dst)
+        jobs.append((src, dst, index.entries.get(key) if use_index else None))
+    report = EditReport(dry_run)
+
+    results = run_sharded(_edit_job, jobs, (edits, rules, dry_run), workers, on_progress,
+                          error_result=lambda job, error: {"path": job[0], "output": job[1], "changes": [],
+                                                           "entry": None, "status": "error", "error": error})
+    results.sort(key=lambda r: r["path"])
+    for result in results:
+        report.add(result)
+        if use_index and not dry_run and result.get("entry") is not None:
+            index, key = index_for(result["output"])
+            index.entries[key] = result["entry"]
+
+    if use_index and not dry_run:
+        for index in indexes.values():
+            index.save()
+    return report
+
+
+if __name__ == "__main__":
+    # 输出检查：在插件根目录的上一级运行 python -m Comfyui_PDuse.py._workflow_json
+    # 输出到其他文件夹时与旧节点一致：有节点（排列）或选择了颜色/字体大小（分组）的文件都生成输出，
+    # 没有节点的文件、颜色为 None 且不修改字体大小时不生成输出
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder:
+        source_dir, output_dir = os.path.join(folder, "src"), os.path.join(folder, "out")
+        os.makedirs(source_dir)
+        os.makedirs(output_dir)
+        workflows = {
+            "empty": {"nodes": [], "groups": [{"title": "A", "color": "#444"}]},
+            "nodes": {"nodes": [{"id": 2}, {"id": 1}], "groups": [{"title": "A", "color": "#3f789e"}]},
+            "arranged": {"nodes": [{"id": 1, "pos": [0, 0], "xy": [0, 0]}, {"id": 2, "pos": [20, 20], "xy": [20, 20]}]},
+        }
+        for name, data in workflows.items():
+            with open(os.path.join(source_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+
+        def outputs_of(edits, suffix, use_index=True):
+            tasks = [(os.path.join(source_dir, f"{name}.json"), os.path.join(output_dir, f"{name}{suffix}.json"))
+                     for name in workflows]
+            report = run_edits(tasks, edits, output_dir, use_index=use_index)
+            written = sorted(f for f in os.listdir(output_dir) if f.endswith(f"{suffix}.json"))
+            print(f"{suffix}: {report.summary()} → {written}")
+            return written
+
+        # BatchJsonIncremental：没有节点的文件不输出，已排列好的文件照常输出
+        assert outputs_of([NodeLayoutEdit()], "_layout") == ["arranged_layout.json", "nodes_layout.json"]
+        # 不使用索引再次运行时，内容相同的输出不重写
+        layout = os.path.join(output_dir, "arranged_layout.json")
+        mtime_ns = os.stat(layout).st_mtime_ns
+        assert outputs_of([NodeLayoutEdit()], "_layout", use_index=False) == ["arranged_layout.json", "nodes_layout.json"]
+        assert os.stat(layout).st_mtime_ns == mtime_ns
+        # PDJSON_Group：颜色为 None、不修改字体大小时不输出任何文件
+        assert outputs_of([GroupStyleEdit(None, None)], "_none") == []
+        # 选择了颜色时，有分组的文件都输出（分组已是该颜色的也输出），没有分组的文件不输出
+        assert outputs_of([GroupStyleEdit("Blue")], "_blue") == ["empty_blue.json", "nodes_blue.json"]
+        # 组合操作中 node_layout 要求跳过时，其余操作的修改也不输出
+        assert outputs_of([GroupStyleEdit("Green"), NodeLayoutEdit()], "_both") == ["arranged_both.json", "nodes_both.json"]
+        # 原地修改：没有改动的文件不重写
+        arranged = os.path.join(source_dir, "arranged.json")
+        mtime_ns = os.stat(arranged).st_mtime_ns
+        report = run_edits([(arranged, arranged)], [NodeLayoutEdit()], source_dir)
+        assert report.unchanged == 1 and os.stat(arranged).st_mtime_ns == mtime_ns
+        print("原地修改：", report.summary())
@@ -0,0 +1,201 @@
+import math
+import os
+import torch
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ._font_cache import FONTS_DIR, load_font_or_default, text_bbox, text_length
+from .imageconcante_V1 import crop_offsets, place_resized
+
+# 背景颜色 -> 通道值
+BACKGROUNDS = {"black": 0.0, "white": 1.0, "gray": 0.5}
+
+
+class PDImageGrid:
+    """
+    @classdesc
+    把多张图片（图片列表或一个批次）排成网格对比图，每个格子下方可加文字标注。
+    先一次算出全部布局（行列数、每张图的缩放/裁切方式、标注区域），
+    再把每张图缩放后直接写入预分配的画布，耗时和内存与图片数量成线性关系。
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        """
+        @returns {dict} 节点输入参数类型
+        """
+        font_files = []
+        if os.path.exists(FONTS_DIR):
+            font_files = [f for f in os.listdir(FONTS_DIR) if f.lower().endswith(('.ttf', '.otf'))]
+        if not font_files:
+            font_files = ["system"]
+
+        return {
+            "required": {
+                "images": ("IMAGE",),
+                "columns": ("INT", {"default": 0, "min": 0, "max": 64, "step": 1}),  # 0 为自动（接近正方形）
+                "cell_width": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 8}),  # 0 为第一张图的宽度
+                "cell_height": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 8}),  # 0 为第一张图的高度
+                "fit_mode": (["fit", "crop", "stretch"], {"default": "fit"}),
+                "crop_position": (["center", "top", "bottom", "left", "right"], {"default": "center"}),
+                "gap": ("INT", {"default": 0, "min": 0, "max": 512, "step": 1}),
+                "background": (list(BACKGROUNDS.keys()), {"default": "black"}),
+            },
+            "optional": {
+                "labels": ("STRING", {"default": "", "multiline": True}),  # 每行一个标注，按图片顺序对应
+                "font_size": ("INT", {"default": 30, "min": 10, "max": 100, "step": 1}),
+                "padding_up": ("INT", {"default": 20, "min": 0, "max": 100, "step": 1}),
+                "padding_down": ("INT", {"default": 20, "min": 0, "max": 1000, "step": 1}),
+                "font_file": (font_files, {"default": font_files[0]}),
+                "memory_budget_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64}),
+            }
+        }
+
+    # 图片可以是多个批次的列表（尺寸可以不同），其余参数取第一个值
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+    FUNCTION = "build_grid"
+    CATEGORY = "PD/ImageProcessing"
+
+    def build_grid(self, images, columns, cell_width, cell_height, fit_mode, crop_position, gap, background,
+                   labels=None, font_size=None, padding_up=None, padding_down=None, font_file=None,
+                   memory_budget_mb=None):
+        """
+        @functiondesc
+        构建网格对比图
+        @param {list} images - 图片张量列表，每个为 (B, H, W, C)，按顺序展开为单张
+        @param {int} columns - 列数，0 为自动
+        @param {int} cell_width - 格子宽度，0 为第一张图的宽度
+        @param {int} cell_height - 格子高度，0 为第一张图的高度
+        @param {str} fit_mode - fit 等比缩放放入格子 / crop 等比缩放铺满后裁切 / stretch 拉伸
+        @param {str} crop_position - crop 模式的裁切位置
+        @param {int} gap - 格子间距
+        @param {str} background - 背景颜色
+        @param {str} labels - 标注文字，每行一个
+        @returns {tuple} 网格图片 (1, H, W, C)
+        """
+        columns, cell_width, cell_height = _first(columns), _first(cell_width), _first(cell_height)
+        fit_mode, crop_position = _first(fit_mode), _first(crop_position)
+        gap, background = _first(gap), _first(background)
+        labels = _first(labels, "")
+        font_size = _first(font_size, 30)
+        padding_up, padding_down = _first(padding_up, 20), _first(padding_down, 20)
+        font_file = _first(font_file, "system")
+        memory_budget_mb = _first(memory_budget_mb, 0)
+
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        frames = []
+        for batch in images:
+            if batch.dim() == 3:
+                batch = batch.unsqueeze(0)
+            frames.extend(batch[i:i + 1] for i in range(batch.shape[0]))
+        if not frames:
+            raise ValueError("没有输入图片")
+
+        count = len(frames)
+        cols = columns if columns > 0 else math.ceil(math.sqrt(count))
+        cols = min(cols, count)
+        rows = math.ceil(count / cols)
+        cell_h = cell_height or frames[0].shape[1]
+        cell_w = cell_width or frames[0].shape[2]
+
+        # 标注区域高度（与 ImageBlendText 相同：文字高度 + 上下间距）
+        label_list = [line.strip() for line in (labels or "").splitlines()]
+        label_list = (label_list + [""] * count)[:count]
+        font = None
+        band_h = 0
+        if any(label_list):
+            font = _load_font(font_size, font_file)
+            _, _, _, text_height = text_bbox(font, "Ag")
+            band_h = text_height + padding_up + padding_down
+
+        # 一次算出全部布局，再分配画布
+        row_h = cell_h + band_h
+        canvas_h = rows * row_h + (rows - 1) * gap
+        canvas_w = cols * cell_w + (cols - 1) * gap
+        channels = max(3, max(frame.shape[-1] for frame in frames))
+        fill = BACKGROUNDS.get(background, 0.0)
+        canvas = torch.full((1, canvas_h, canvas_w, channels), fill, dtype=frames[0].dtype, device=frames[0].device)
+        if channels > 3:
+            canvas[..., 3:] = 1.0
+
+        for index, frame in enumerate(frames):
+            row, col = divmod(index, cols)
+            y0 = row * (row_h + gap)
+            x0 = col * (cell_w + gap)
+            plan, (out_h, out_w), (dy, dx) = _cell_plan(frame.shape[1], frame.shape[2], cell_h, cell_w,
+                                                         fit_mode, crop_position)
+            region = canvas[:, y0 + dy:y0 + dy + out_h, x0 + dx:x0 + dx + out_w]
+            place_resized(region, frame.to(canvas.device), plan, memory_budget_mb)
+
+        if font is not None:
+            for row in range(rows):
+                row_labels = label_list[row * cols:(row + 1) * cols]
+                if not any(row_labels):
+                    continue
+                band = _render_band(row_labels, font, canvas_w, band_h, cell_w, gap, padding_up, fill)
+                y0 = row * (row_h + gap) + cell_h
+                canvas[:, y0:y0 + band_h, :, :3] = band.to(canvas.device, canvas.dtype)
+
+        return (canvas,)
+
+
+def _first(value, default=None):
+    """INPUT_IS_LIST 时取列表中的第一个值"""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else default
+    return default if value is None else value
+
+
+def _cell_plan(h, w, cell_h, cell_w, fit_mode, crop_position):
+    """
+    计算一张图片在格子中的缩放裁切计划
+    @returns {tuple} ((缩放高, 缩放宽, top, left), (输出高, 输出宽), (格内 y 偏移, 格内 x 偏移))
+    """
+    if fit_mode == "stretch":
+        return (cell_h, cell_w, 0, 0), (cell_h, cell_w), (0, 0)
+    if fit_mode == "crop":
+        scale = max(cell_h / h, cell_w / w)
+        resize_h = max(int(h * scale + 0.5), cell_h)
+        resize_w = max(int(w * scale + 0.5), cell_w)
+        top, left = crop_offsets(resize_h, resize_w, cell_h, cell_w, crop_position)
+        return (resize_h, resize_w, top, left), (cell_h, cell_w), (0, 0)
+    scale = min(cell_h / h, cell_w / w)
+    resize_h = min(max(int(h * scale + 0.5), 1), cell_h)
+    resize_w = min(max(int(w * scale + 0.5), 1), cell_w)
+    return (resize_h, resize_w, 0, 0), (resize_h, resize_w), ((cell_h - resize_h) // 2, (cell_w - resize_w) // 2)
+
+
+def _load_font(font_size, font_file="system"):
+    """加载字体（与 ImageBlendText 相同的回退方式）"""
+    if font_file == "system":
+        return load_font_or_default("arial.ttf", font_size, quiet=True)
+    return load_font_or_default(os.path.join(FONTS_DIR, font_file), font_size)
+
+
+def _render_band(row_labels, font, width, band_h, cell_w, gap, padding_up, fill):
+    """
+    绘制一行格子下方的标注区域，文字在各自格子下居中；
+    文字只绘制覆盖度，背景用与画布相同的通道值 fill，标注区域与格子背景颜色一致
+    @returns {torch.Tensor} (band_h, width, 3)
+    """
+    text_value = 0.0 if fill >= 1.0 else 1.0
+    coverage = Image.new("L", (width, band_h), 0)
+    draw = ImageDraw.Draw(coverage)
+    for col, label in enumerate(row_labels):
+        if not label:
+            continue
+        center_x = col * (cell_w + gap) + cell_w // 2
+        draw.text((center_x - int(text_length(font, label)) // 2, padding_up), label, font=font, fill=255)
+    alpha = torch.from_numpy(np.array(coverage).astype(np.float32) / 255.0).unsqueeze(-1)
+    return (fill + (text_value - fill) * alpha).expand(band_h, width, 3)
+
+
+# 节点注册
+NODE_CLASS_MAPPINGS = {
+    "PDImageGrid": PDImageGrid,
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "PDImageGrid": "PD:image_grid_V1",
+}
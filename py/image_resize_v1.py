@@ -1,5 +1,7 @@
 import torch
 
+from ._resize import fit_side, resize_batch
+
 class PDImageResize:
     """
     图片缩放节点，支持通过最长边或最短边缩放图片。
@@ -23,6 +25,8 @@ class PDImageResize:
             },
             "optional": {
                 "mask_optional": ("MASK",),
+                # 大于 0 时按该内存预算（MB）分块缩放，用于超大图片或大批次
+                "memory_budget_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64}),
             },
         }
 
@@ -38,13 +42,14 @@ class PDImageResize:
             return "目标尺寸必须大于0"
         return True
 
-    def resize(self, pixels, resize_mode, target_size, mask_optional=None):
+    def resize(self, pixels, resize_mode, target_size, mask_optional=None, memory_budget_mb=0):
         """
         按照指定模式缩放图片。
         @param pixels {Tensor} 输入图片，形状为 (B, H, W, C)
         @param resize_mode {str} 缩放模式：longest 或 shortest
         @param target_size {int} 目标尺寸
         @param mask_optional {Tensor|None} 可选 mask，形状为 (B, H, W)
+        @param memory_budget_mb {int} 分块缩放的内存预算（MB），0 为整批一次缩放
         @returns {tuple} (缩放后的图片, 缩放后的 mask)
         """
         validity = self.VALIDATE_INPUTS(resize_mode, target_size)
@@ -52,30 +57,14 @@ class PDImageResize:
             raise Exception(validity)
 
         height, width = pixels.shape[1:3]
-        # 计算缩放因子
-        if resize_mode == "shortest":
-            scale_factor = float(target_size) / min(height, width)
-        else:  # longest
-            scale_factor = float(target_size) / max(height, width)
-
-        # 缩放图片
-        pixels = torch.nn.functional.interpolate(
-            pixels.movedim(-1, 1),
-            scale_factor=scale_factor,
-            mode="bicubic",
-            antialias=True
-        ).movedim(1, -1).clamp(0.0, 1.0)
-        new_height, new_width = pixels.shape[1:3]
+        # 目标尺寸只计算一次；与原先的 interpolate(mode="bicubic", antialias=True) 相同，
+        # 放大和缩小都使用带 antialias 的 bicubic（a=-0.5），mask 使用同一插值核
+        new_height, new_width = fit_side(height, width, target_size, resize_mode)
+        pixels, mask = resize_batch(pixels, new_height, new_width, "bicubic_aa", mask_optional,
+                                   memory_budget_mb)
 
-        # 缩放 mask
-        if mask_optional is None:
+        if mask is None:
             mask = torch.zeros(1, new_height, new_width, dtype=torch.float32)
-        else:
-            mask = torch.nn.functional.interpolate(
-                mask_optional.unsqueeze(0),
-                scale_factor=scale_factor,
-                mode="bicubic"
-            ).squeeze(0).clamp(0.0, 1.0)
 
         return (pixels, mask)
 
@@ -1,7 +1,9 @@
 import os
 import torch
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+
+from ._font_cache import FONTS_DIR, load_font_or_default, text_bbox, text_length
 
 class ImageBlendText:
     """
@@ -102,9 +104,9 @@ class ImageBlendText:
         # 计算文本尺寸（兼容新旧Pillow版本）
         try:
             # Pillow 10.0.0+ 使用新的textlength和textbbox方法
-            text1_width = font.getlength(text1)
-            text2_width = font.getlength(text2)
-            _, _, _, text_height = font.getbbox("Ag")  # 使用包含下行字母的文本测量高度
+            text1_width = text_length(font, text1)
+            text2_width = text_length(font, text2)
+            _, _, _, text_height = text_bbox(font, "Ag")  # 使用包含下行字母的文本测量高度
         except AttributeError:
             # 旧版Pillow使用getsize方法
             text1_width, text_height = font.getsize(text1)
@@ -162,28 +164,16 @@ class ImageBlendText:
 
     def _load_font(self, font_size, font_file="system"):
         """
-        * 加载字体，优先从 fonts 目录加载
+        * 加载字体，优先从 fonts 目录加载（按字体和字号缓存，不重复读取文件）
         * @param {int} font_size - 字体大小
         * @param {str} font_file - 字体文件名
         * @return {ImageFont} 字体对象
         """
         if font_file == "system":
-            try:
-                return ImageFont.truetype("arial.ttf", font_size)
-            except:
-                return ImageFont.load_default()
-        else:
-            # 重新计算插件根目录
-            current_file = os.path.abspath(__file__)
-            current_dir = os.path.dirname(current_file)           # 当前 py 文件所在目录（py/）
-            plugin_root = os.path.dirname(current_dir)           # 插件根目录（Comfyui_PDuse/）
-            font_path = os.path.join(plugin_root, "fonts", font_file)  # 拼接字体路径
-
-            try:
-                return ImageFont.truetype(font_path, font_size)
-            except Exception as e:
-                print(f"⚠️ 字体加载失败: {font_file}, 回退到系统默认字体。错误: {e}")
-                return ImageFont.load_default()
+            return load_font_or_default("arial.ttf", font_size, quiet=True)
+        font_path = os.path.join(FONTS_DIR, font_file)  # 拼接字体路径
+        # 加载失败时回退到默认字体，失败结果同样缓存，不会每次绘制都重新读取
+        return load_font_or_default(font_path, font_size)
 
     def _pil_to_tensor(self, image):
         """
@@ -2,7 +2,68 @@ import os
 import torch
 import numpy as np
 from PIL import Image
-from comfy.utils import common_upscale
+
+from ._resize import resize_crop
+
+def crop_offsets(h, w, target_h, target_w, crop_type="center"):
+    """
+    计算按指定方式裁切到目标尺寸时的起点
+    @param {int} h - 原高度
+    @param {int} w - 原宽度
+    @param {int} target_h - 目标高度
+    @param {int} target_w - 目标宽度
+    @param {str} crop_type - 裁切方式 center/top/bottom/left/right
+    @returns {tuple} (top, left)
+    """
+    top = max((h - target_h) // 2, 0)
+    left = max((w - target_w) // 2, 0)
+    if crop_type == "top":
+        top = 0
+    elif crop_type == "bottom":
+        top = max(h - target_h, 0)
+    elif crop_type == "left":
+        left = 0
+    elif crop_type == "right":
+        left = max(w - target_w, 0)
+    return top, left
+
+
+def crop_tensor(img, target_h, target_w, crop_type="center"):
+    """
+    按指定方式裁切图片到目标尺寸
+    @param {torch.Tensor} img - 输入图片 (B, H, W, C)
+    @param {int} target_h - 目标高度
+    @param {int} target_w - 目标宽度
+    @param {str} crop_type - 裁切方式 center/top/bottom/left/right
+    @returns {torch.Tensor} 裁切后的图片
+    """
+    _, h, w, _ = img.shape
+    top, left = crop_offsets(h, w, target_h, target_w, crop_type)
+    return img[:, top:top+target_h, left:left+target_w, :]
+
+
+def place_resized(canvas, image, plan, memory_budget_mb=0):
+    """
+    把图片按缩放裁切计划直接写入画布区域，缺少的通道（alpha）填 1
+    缩放使用 _resize 的 float32 lanczos（任意内存预算结果都相同），不再经过 PIL 的 8 位 lanczos，
+    与原先的结果有 1/255 量级的差别
+    @param {torch.Tensor} canvas - 画布中的目标区域 (B, h, w, C)
+    @param {torch.Tensor} image - 输入图片 (B或1, H, W, c)
+    @param {tuple} plan - (缩放高, 缩放宽, top, left) 缩放后从 (top, left) 起裁切出与目标区域相同的大小
+    @param {int} memory_budget_mb - 分块缩放的内存预算（MB）
+    """
+    resize_h, resize_w, top, left = plan
+    _, out_h, out_w, channels = canvas.shape
+    c = min(image.shape[-1], channels)
+    target = canvas[..., :c]
+    if c < channels:
+        canvas[..., c:] = 1.0
+    if image.shape[0] == canvas.shape[0]:
+        resize_crop(image[..., :c], resize_h, resize_w, top, left, out_h, out_w, "lanczos", memory_budget_mb, out=target)
+    else:
+        # 单张图片与整批拼接时广播
+        target.copy_(resize_crop(image[..., :c], resize_h, resize_w, top, left, out_h, out_w, "lanczos", memory_budget_mb))
+
 
 class PDImageConcante:
     """
@@ -23,6 +84,8 @@ class PDImageConcante:
             },
             "optional": {
                 "image2": ("IMAGE",),
+                # 大于 0 时按该内存预算（MB）分块缩放
+                "memory_budget_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64}),
             }
         }
 
@@ -33,35 +96,11 @@ class PDImageConcante:
 
     def crop_tensor(self, img, target_h, target_w, crop_type="center"):
         """
-        按指定方式裁切图片到目标尺寸
-        @param {torch.Tensor} img - 输入图片 (B, H, W, C)
-        @param {int} target_h - 目标高度
-        @param {int} target_w - 目标宽度
-        @param {str} crop_type - 裁切方式 center/top/bottom/left/right
-        @returns {torch.Tensor} 裁切后的图片
+        按指定方式裁切图片到目标尺寸（见模块函数 crop_tensor）
         """
-        _, h, w, _ = img.shape
-        if crop_type == "center":
-            top = max((h - target_h) // 2, 0)
-            left = max((w - target_w) // 2, 0)
-        elif crop_type == "top":
-            top = 0
-            left = max((w - target_w) // 2, 0)
-        elif crop_type == "bottom":
-            top = max(h - target_h, 0)
-            left = max((w - target_w) // 2, 0)
-        elif crop_type == "left":
-            top = max((h - target_h) // 2, 0)
-            left = 0
-        elif crop_type == "right":
-            top = max((h - target_h) // 2, 0)
-            left = max(w - target_w, 0)
-        else:
-            top = max((h - target_h) // 2, 0)
-            left = max((w - target_w) // 2, 0)
-        return img[:, top:top+target_h, left:left+target_w, :]
+        return crop_tensor(img, target_h, target_w, crop_type)
 
-    def concat_and_load(self, image1, direction, match_size, image2_crop="center", image2=None):
+    def concat_and_load(self, image1, direction, match_size, image2_crop="center", image2=None, memory_budget_mb=0):
         """
         @functiondesc
         合并两张图片，支持最长边等比缩放和按image1尺寸裁切两种模式。
@@ -70,6 +109,7 @@ class PDImageConcante:
         @param {str} match_size - 尺寸匹配模式
         @param {str} image2_crop - image2裁切方式
         @param {torch.Tensor} image2 - 第二张图片（可选）
+        @param {int} memory_budget_mb - 分块缩放的内存预算（MB），0 为整批一次缩放
         @returns {tuple} 合并后的图片张量
         """
         if image2 is None:
@@ -85,60 +125,67 @@ class PDImageConcante:
         h2, w2 = image2.shape[1], image2.shape[2]
         aspect2 = w2 / h2
 
+        # 每张图片的计划: (缩放高, 缩放宽, top, left, 输出高, 输出宽)，尺寸不变时不缩放
         if match_size == "longest":
             # 按最长边等比缩放
             if direction in ["left", "right"]:
                 target_h = max(h1, h2)
                 target_w1 = int(target_h * (w1 / h1))
                 target_w2 = int(target_h * aspect2)
-                image1_for_up = image1.movedim(-1, 1)
-                image1_resized = common_upscale(image1_for_up, target_w1, target_h, "lanczos", "disabled").movedim(1, -1)
-                image2_for_up = image2.movedim(-1, 1)
-                image2_resized = common_upscale(image2_for_up, target_w2, target_h, "lanczos", "disabled").movedim(1, -1)
+                plan1 = (target_h, target_w1, 0, 0, target_h, target_w1)
+                plan2 = (target_h, target_w2, 0, 0, target_h, target_w2)
             else:
                 target_w = max(w1, w2)
                 target_h1 = int(target_w / (w1 / h1))
                 target_h2 = int(target_w / aspect2)
-                image1_for_up = image1.movedim(-1, 1)
-                image1_resized = common_upscale(image1_for_up, target_w, target_h1, "lanczos", "disabled").movedim(1, -1)
-                image2_for_up = image2.movedim(-1, 1)
-                image2_resized = common_upscale(image2_for_up, target_w, target_h2, "lanczos", "disabled").movedim(1, -1)
+                plan1 = (target_h1, target_w, 0, 0, target_h1, target_w)
+                plan2 = (target_h2, target_w, 0, 0, target_h2, target_w)
         elif match_size == "crop by image1":
-            # 先等比缩放image2，使其一边与image1对齐，另一边大于等于image1，再按image2_crop裁切
+            # 等比缩放image2，使其一边与image1对齐，另一边大于等于image1，再按image2_crop裁切；
+            # 两步合并，只对裁切后保留的区域插值
             scale_h = h1 / h2
             scale_w = w1 / w2
             scale = max(scale_h, scale_w)
-            resize_h = int(h2 * scale + 0.5)
-            resize_w = int(w2 * scale + 0.5)
-            image2_for_up = image2.movedim(-1, 1)
-            image2_resized = common_upscale(image2_for_up, resize_w, resize_h, "lanczos", "disabled").movedim(1, -1)
-            image2_resized = self.crop_tensor(image2_resized, h1, w1, image2_crop)
-            image1_resized = image1
-        else:
-            image1_resized = image1
-            image2_resized = image2
-
-        # 通道对齐
-        c1, c2 = image1_resized.shape[-1], image2_resized.shape[-1]
-        if c1 != c2:
-            if c1 < c2:
-                alpha = torch.ones((*image1_resized.shape[:-1], c2 - c1), device=image1_resized.device)
-                image1_resized = torch.cat((image1_resized, alpha), dim=-1)
-            else:
-                alpha = torch.ones((*image2_resized.shape[:-1], c1 - c2), device=image2_resized.device)
-                image2_resized = torch.cat((image2_resized, alpha), dim=-1)
-
-        # 合并
-        if direction == "right":
-            merged = torch.cat((image1_resized, image2_resized), dim=2)
-        elif direction == "down":
-            merged = torch.cat((image1_resized, image2_resized), dim=1)
-        elif direction == "left":
-            merged = torch.cat((image2_resized, image1_resized), dim=2)
-        elif direction == "up":
-            merged = torch.cat((image2_resized, image1_resized), dim=1)
+            resize_h = max(int(h2 * scale + 0.5), h1)
+            resize_w = max(int(w2 * scale + 0.5), w1)
+            top, left = crop_offsets(resize_h, resize_w, h1, w1, image2_crop)
+            plan1 = (h1, w1, 0, 0, h1, w1)
+            plan2 = (resize_h, resize_w, top, left, h1, w1)
         else:
+            plan1 = (h1, w1, 0, 0, h1, w1)
+            plan2 = (h2, w2, 0, 0, h2, w2)
+
+        if direction not in ["right", "down", "left", "up"]:
             raise ValueError("direction参数无效")
+        horizontal = direction in ["left", "right"]
+        out_h1, out_w1 = plan1[4:]
+        out_h2, out_w2 = plan2[4:]
+        if (horizontal and out_h1 != out_h2) or (not horizontal and out_w1 != out_w2):
+            raise ValueError(f"图片尺寸不匹配，无法合并: {out_h1}x{out_w1} 与 {out_h2}x{out_w2}")
+
+        b1, b2 = image1.shape[0], image2.shape[0]
+        if b1 != b2 and min(b1, b2) != 1:
+            raise ValueError(f"两组图片数量不一致，无法合并: {b1} 与 {b2}")
+
+        # 预分配输出画布，两张图片缩放/裁切后直接写入各自的区域（通道数取较多者）
+        batch = max(b1, b2)
+        channels = max(image1.shape[-1], image2.shape[-1])
+        if horizontal:
+            canvas = torch.empty((batch, out_h1, out_w1 + out_w2, channels), dtype=image1.dtype, device=image1.device)
+        else:
+            canvas = torch.empty((batch, out_h1 + out_h2, out_w1, channels), dtype=image1.dtype, device=image1.device)
+
+        first_is_image1 = direction in ["right", "down"]
+        first_h, first_w = (out_h1, out_w1) if first_is_image1 else (out_h2, out_w2)
+        if horizontal:
+            first_region, second_region = canvas[:, :, :first_w], canvas[:, :, first_w:]
+        else:
+            first_region, second_region = canvas[:, :first_h], canvas[:, first_h:]
+        region1, region2 = (first_region, second_region) if first_is_image1 else (second_region, first_region)
+
+        place_resized(region1, image1, plan1[:4], memory_budget_mb)
+        place_resized(region2, image2, plan2[:4], memory_budget_mb)
+        merged = canvas
         return (merged,)
 
     def _load_image(self, path):
@@ -1,6 +1,8 @@
 import numpy as np
+import torch
 from PIL import Image
-from scipy.ndimage import label
+
+from ._mask_components import SELECT_MODES, batch_component_stats, select_components, selection_mask
 
 class mask_edge_selector:
     @classmethod
@@ -8,7 +10,12 @@ class mask_edge_selector:
         return {
             "required": {
                 "image": ("IMAGE",),
-                "mode": (["max", "min"], {"default": "max"})
+                "mode": (SELECT_MODES, {"default": "max"})
+            },
+            "optional": {
+                "top_k": ("INT", {"default": 1, "min": 1, "max": 10000, "step": 1}),
+                "min_area": ("INT", {"default": 0, "min": 0, "max": 100000000, "step": 1}),
+                "max_area": ("INT", {"default": 0, "min": 0, "max": 100000000, "step": 1}),
             }
         }
 
@@ -18,55 +25,49 @@ class mask_edge_selector:
     FUNCTION = "select_extreme"
 
     def expand_array(self, arr):
+        """把输入整理为 (B, H, W, C) 的 float 张量（列表中的多张图片拼成一批）"""
         while isinstance(arr, (list, tuple)) and len(arr) == 1:
             arr = arr[0]
-        if hasattr(arr, "cpu"):
-            arr = arr.cpu().numpy()
-        return arr
-
-    def select_extreme(self, image, mode):
+        if isinstance(arr, (list, tuple)):
+            return torch.cat([self.expand_array(a) for a in arr], dim=0)
+        if isinstance(arr, Image.Image):
+            arr = torch.from_numpy(np.array(arr.convert("RGBA")).astype(np.float32) / 255.0)
+        elif not isinstance(arr, torch.Tensor):
+            arr = torch.as_tensor(np.asarray(arr))
+        if arr.dim() == 2:
+            arr = arr.unsqueeze(-1)
+        if arr.dim() == 3:
+            arr = arr.unsqueeze(0)
+        return arr.float()
+
+    def select_extreme(self, image, mode, top_k=1, min_area=0, max_area=0):
         image = self.expand_array(image)
 
-        if isinstance(image, Image.Image):
-            image = np.array(image.convert("RGBA"))
-
-        if image.ndim == 3 and image.shape[-1] == 4:
+        # 整批一次判断前景：有 alpha 时为透明处，否则为灰度取整后为 0 处
+        # （与旧版 mean().astype(uint8) == 0 相同：ComfyUI 的 0~1 浮点图像中除纯白以外都算前景）
+        if image.shape[-1] == 4:
             image_rgb = image[..., :3]
-            alpha = image[..., 3]
-            mask = (alpha == 0).astype(np.uint8)
+            mask = image[..., 3] == 0
         else:
-            image_rgb = image if image.ndim == 3 else np.stack([image] * 3, axis=-1)
-            gray = np.mean(image_rgb, axis=-1).astype(np.uint8)
-            mask = (gray == 0).astype(np.uint8)
-
-        seg, num_labels = label(mask)
-
-        if num_labels == 0:
-            result_mask = np.zeros_like(mask, dtype=np.float32)
-            result_mask[0:1, 0:1] = 1.0
-            result_image = np.zeros_like(image_rgb, dtype=np.uint8)
-        else:
-            areas = [(seg == i).sum() for i in range(1, num_labels + 1)]
-            target_index = np.argmax(areas) + 1 if mode == "max" else np.argmin(areas) + 1
-
-            selected_mask = (seg == target_index).astype(np.uint8)
+            image_rgb = image if image.shape[-1] == 3 else image[..., :1].expand(*image.shape[:-1], 3)
+            mask = image_rgb.mean(dim=-1) < 1.0
 
-            result_image = np.zeros_like(image_rgb, dtype=np.uint8)
-            for c in range(3):
-                result_image[..., c][selected_mask == 1] = image_rgb[..., c][selected_mask == 1]
+        # 整批一次标记并统计所有连通区域（帧与帧之间不连通），每帧分别选择
+        # top_k: 面积最大的 k 个；area_range: 面积在 [min_area, max_area] 内，max_area 为 0 不限
+        stats, frames = batch_component_stats(mask.cpu().numpy())
+        selected = select_components(stats, mode, top_k, min_area, max_area, groups=frames)
+        selected_mask = torch.from_numpy(selection_mask(stats, selected)).to(image.device)
 
-            result_mask = (selected_mask > 0).astype(np.float32)
-            if result_mask.sum() == 0:
-                result_mask[0:1, 0:1] = 1.0
+        result_image = torch.where(selected_mask.unsqueeze(-1), image_rgb, torch.zeros_like(image_rgb))
 
-        result_mask_array = result_mask[None, None, ...].astype(np.float32)  # (1, 1, H, W)
-        result_image_array = result_image.transpose(2, 0, 1)[None, ...].astype(np.uint8)  # (1, 3, H, W)
+        result_mask = selected_mask.float()
+        # 没有选中任何区域的帧与原先一样在左上角保留一个像素
+        empty = ~selected_mask.flatten(1).any(dim=1)
+        result_mask[empty, 0, 0] = 1.0
 
-        mask_rgb = (result_mask * 255).astype(np.uint8)
-        mask_rgb = np.stack([mask_rgb] * 3, axis=-1)
-        mask_rgb_array = mask_rgb.transpose(2, 0, 1)[None, ...].astype(np.uint8)
+        mask_image = result_mask.unsqueeze(-1).expand(-1, -1, -1, 3)
 
-        return (result_image_array, result_mask_array, mask_rgb_array)
+        return (result_image, result_mask, mask_image)
 
 NODE_CLASS_MAPPINGS = {
     "mask_edge_selector": mask_edge_selector
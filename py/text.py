@@ -1,8 +1,10 @@
 import os
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import numpy as np
 import torch
 
+from ._font_cache import FONTS_DIR, layout_line, load_font_or_default
+
 class TextOverlayNode:
     @classmethod
     def INPUT_TYPES(cls):
@@ -56,35 +58,21 @@ class TextOverlayNode:
 
         draw = ImageDraw.Draw(pil_image)
 
-        # 定位到根目录的fonts文件夹
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.abspath(os.path.join(current_dir, ".."))
-        fonts_dir = os.path.join(root_dir, "fonts")
-        font_path = os.path.join(fonts_dir, font_name)
+        font_path = os.path.join(FONTS_DIR, font_name)
 
-        # 加载字体，添加错误处理
-        try:
-            font = ImageFont.truetype(font_path, int(font_size))
-        except OSError:
-            print(f"警告：无法加载字体文件 '{font_path}'，将使用默认字体。")
-            font = ImageFont.load_default()
+        # 加载字体（按路径和字号缓存），加载失败时回退到默认字体（失败结果同样缓存）
+        font = load_font_or_default(font_path, int(font_size))
 
-        # 计算文本尺寸（考虑单字绘制）
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0] + (len(text) - 1) * letter_gap
-        text_height = bbox[3] - bbox[1]
+        # 计算文本尺寸和每个字的位置（考虑单字绘制，排版结果有缓存）
+        layout = layout_line(font, text, letter_gap)
 
         # 计算文本位置
-        x = int(position_x * pil_image.width - text_width / 2)
-        y = int(position_y * pil_image.height - text_height / 2)
+        x = int(position_x * pil_image.width - layout.width / 2)
+        y = int(position_y * pil_image.height - layout.height / 2)
 
         # 绘制文本，逐个字绘制加字距
-        current_x = x
-        for char in text:
-            draw.text((current_x, y), char, fill=font_color, font=font)
-            char_bbox = draw.textbbox((0, 0), char, font=font)
-            char_width = char_bbox[2] - char_bbox[0]
-            current_x += char_width + letter_gap
+        for char, offset in zip(text, layout.offsets):
+            draw.text((x + offset, y), char, fill=font_color, font=font)
 
         # 将 PIL 图像转换回 NumPy 数组，并归一化到 [0,1]
         result_np = np.array(pil_image).astype(np.float32) / 255.0
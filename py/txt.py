@@ -1,5 +1,10 @@
 import os
 import re
+from ._dir_index import get_directory_index
+from ._caption_rewriter import rewrite_captions, rules_fingerprint
+from ._caption_tags import MATCH_ENGINES, make_caption_editor, parse_replace_pairs
+from ._counter_index import claim_numbered_file
+from ._text_sink import explode_shards, get_text_sink
 
 
 class PD_RemoveColorWords:
@@ -11,6 +16,14 @@ class PD_RemoveColorWords:
                 "words_to_remove": ("STRING", {"default": ""}),  # 要删除的单词，支持换行或空行
                 "words_to_add": ("STRING", {"default": ""}),  # 要添加的单词
             },
+            "optional": {
+                "only_changed": ("BOOLEAN", {"default": False}),  # 只处理上次运行后新增或修改过的文件
+                "words_to_replace": ("STRING", {"default": ""}),  # 替换规则，格式 旧词=新词，多条用分号分隔
+                "match_engine": (MATCH_ENGINES, {"default": "regex"}),  # regex: 原正则匹配; tags: 按逗号标签哈希匹配
+                "workers": ("INT", {"default": 1, "min": 0, "max": 256, "step": 1}),  # 进程数，1为单进程，0为CPU核心数
+                "dry_run": ("BOOLEAN", {"default": False}),  # 只统计将要修改的内容，不写入文件
+                "skip_processed": ("BOOLEAN", {"default": False}),  # 按 .pd_caption_index.json 跳过已按相同规则处理过的文件
+            },
         }
 
     RETURN_TYPES = ("STRING",)
@@ -18,7 +31,9 @@ class PD_RemoveColorWords:
     FUNCTION = "process_directory"
     CATEGORY = "PD Custom Nodes"
 
-    def process_directory(self, directory_path, words_to_remove, words_to_add):
+    def process_directory(self, directory_path, words_to_remove, words_to_add, only_changed=False,
+                          words_to_replace="", match_engine="regex", workers=1, dry_run=False,
+                          skip_processed=False):
         try:
             if not os.path.isdir(directory_path):
                 return (f"错误：目录 {directory_path} 不存在！",)
@@ -30,55 +45,46 @@ class PD_RemoveColorWords:
                                for word in words_to_remove.split(",") if word.strip()] or None
 
             words_to_add = words_to_add.strip() if words_to_add.strip() else None
-
-            if words_to_remove:
-                patterns = [
-                    rf'\b{re.escape(word)}(?:\s*\([^)]*\)|_[^\s,]*|\s+[^\s,]*)?\b'
-                    if word != '\n' else r'\n+'
-                    for word in words_to_remove
-                ]
-                combined_pattern = '|'.join(patterns)
-
-            processed_files = 0
-            total_files = 0
-            modified_files = 0
-
-            for root, dirs, files in os.walk(directory_path):
-                for file in files:
-                    if file.endswith('.txt'):
-                        total_files += 1
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-
-                            original_content = content
-
-                            if words_to_remove:
-                                content = re.sub(combined_pattern, '', content, flags=re.IGNORECASE)
-
-                            if words_to_add:
-                                content = words_to_add + " " + content.lstrip()
-
-                            if content != original_content:
-                                modified_files += 1
-                                with open(file_path, 'w', encoding='utf-8') as f:
-                                    f.write(content)
-                                print(f"处理完成: {file_path}")
-
-                            processed_files += 1
-                        except Exception as e:
-                            print(f"跳过文件 {file_path}，错误: {e}")
-                            continue
-
-            if processed_files == 0:
+            replace_pairs = parse_replace_pairs(words_to_replace)
+
+            # 删除/添加/替换规则只编译一次，每个文件一次遍历完成
+            editor = make_caption_editor(match_engine, words_to_remove, words_to_add, replace_pairs)
+
+            # 使用共享目录索引递归扫描 .txt 文件，only_changed 时只处理变化的文件
+            # （预览时不更新变化基准，之后正式运行仍能看到这些变化）
+            index = get_directory_index(directory_path, recursive=True)
+            changes = index.changes(self.__class__.__name__, (".txt",), update=not dry_run)
+            if only_changed:
+                txt_files = changes.changed
+            else:
+                txt_files = sorted(changes.changed + changes.unchanged)
+
+            if not txt_files:
+                if only_changed:
+                    return (f"没有新增或修改过的文件",)
                 return (f"未找到符合条件的文件",)
 
-            result_message = f"处理完成，共扫描了 {total_files} 个文件，实际修改了 {modified_files} 个文件"
+            # 多进程处理，临时文件 + os.replace 原子写入
+            rules = rules_fingerprint(match_engine, words_to_remove, words_to_add, replace_pairs)
+            pbar = ProgressBar(len(txt_files))
+            report = rewrite_captions(directory_path, txt_files, editor, rules, workers, dry_run,
+                                      use_index=skip_processed, on_progress=pbar.update)
+
+            # 记录本节点自己写入的文件，下次 only_changed 时不会被当作外部修改
+            index.commit(self.__class__.__name__, report.written)
+            print(report.summary())
+
+            if dry_run:
+                return (report.summary(),)
+
+            result_message = f"处理完成，共扫描了 {report.scanned} 个文件，实际修改了 {report.modified} 个文件"
             if words_to_remove:
                 result_message += f"，已删除内容：{', '.join(words_to_remove)}"
             if words_to_add:
                 result_message += f"，已添加单词：'{words_to_add}'"
+            if replace_pairs:
+                result_message += f"，已替换：{', '.join(f'{old}→{new}' for old, new in replace_pairs)}"
+            result_message += "\n" + report.summary()
             return (result_message,)
 
         except Exception as e:
@@ -131,6 +137,14 @@ class PDstring_Save:
                 "filename_number_padding": ("INT", {"default": 4, "min": 0, "max": 9, "step": 1}),
                 "file_extension": (["txt", "json", "csv", "log", "md"], {"default": "txt"}),
             },
+            "optional": {
+                # 汇总模式：文本追加到轮转的 JSONL/CSV 分片中，而不是每次写一个小文件
+                "sink_mode": (["off", "jsonl", "csv"], {"default": "off"}),
+                "sink_name": ("STRING", {"default": "pd_text_sink"}),
+                "shard_max_mb": ("INT", {"default": 64, "min": 1, "max": 4096, "step": 1}),
+                "flush_records": ("INT", {"default": 256, "min": 1, "max": 100000, "step": 1}),
+                "flush_seconds": ("FLOAT", {"default": 5.0, "min": 0.0, "max": 3600.0, "step": 0.5}),
+            },
             "hidden": {
                 "prompt": "PROMPT", 
                 "extra_pnginfo": "EXTRA_PNGINFO",
@@ -144,7 +158,9 @@ class PDstring_Save:
     CATEGORY = "PowerDiffusion/IO"
     OUTPUT_NODE = True
 
-    def save_text_file(self, text, path, filename, filename_delimiter, filename_number_padding, file_extension, prompt=None, extra_pnginfo=None, unique_id=None):
+    def save_text_file(self, text, path, filename, filename_delimiter, filename_number_padding, file_extension,
+                       sink_mode="off", sink_name="pd_text_sink", shard_max_mb=64, flush_records=256, flush_seconds=5.0,
+                       prompt=None, extra_pnginfo=None, unique_id=None):
         # 处理文件扩展名
         if not file_extension.startswith('.'):
             file_extension = f".{file_extension}"
@@ -170,26 +186,28 @@ class PDstring_Save:
         # 创建目录（如果不存在）
         os.makedirs(path, exist_ok=True)
 
+        # 汇总模式：记录进入缓冲，按条数/时间批量写入分片，之后可用 PDstring:ShardExplode 展开
+        if sink_mode != "off":
+            sink = get_text_sink(path, sink_name, sink_mode, shard_max_mb, flush_records, flush_seconds)
+            sink.append({
+                "filename": filename,
+                "delimiter": filename_delimiter,
+                "padding": filename_number_padding,
+                "extension": file_extension,
+                "text": text,
+            })
+            return ()
+
         # 生成文件名
         if filename_number_padding == 0:
             full_filename = f"{filename}{file_extension}"
         else:
-            pattern = re.compile(
-                f"{re.escape(filename)}{re.escape(filename_delimiter)}(\\d{{{filename_number_padding}}}){re.escape(file_extension)}"
+            # 由文件夹的编号索引分配下一个编号（索引丢失时才扫描一次文件夹），
+            # 以 O_EXCL 创建文件占用，多个保存同时进行也不会重名
+            _, claimed_path = claim_numbered_file(
+                path, filename, filename_delimiter, filename_number_padding, file_extension
             )
-            existing_files = [f for f in os.listdir(path) if pattern.match(f)] if os.path.exists(path) else []
-            
-            next_num = 1
-            if existing_files:
-                numbers = [int(pattern.match(f).group(1)) for f in existing_files]
-                next_num = max(numbers) + 1 if numbers else 1
-            
-            full_filename = f"{filename}{filename_delimiter}{next_num:0{filename_number_padding}}{file_extension}"
-            
-            # 处理可能的冲突
-            while os.path.exists(os.path.join(path, full_filename)):
-                next_num += 1
-                full_filename = f"{filename}{filename_delimiter}{next_num:0{filename_number_padding}}{file_extension}"
+            full_filename = os.path.basename(claimed_path)
 
         # 写入文件
         file_path = os.path.join(path, full_filename)
@@ -210,15 +228,55 @@ class PDstring_Save:
     def IS_CHANGED(*args, **kwargs):
         return float("NaN")
 
+
+class PDstring_ShardExplode:
+    """
+    把 PDstring_Save 汇总模式写出的 JSONL/CSV 分片展开为逐条文本文件
+    文件名按记录中保存的 文件名/分隔符/编号位数/扩展名 生成
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "shard_path": ("STRING", {"default": "", "multiline": False}),  # 分片文件或分片所在文件夹
+                "output_dir": ("STRING", {"default": "", "multiline": False}),  # 为空时写到分片所在文件夹
+                "overwrite": ("BOOLEAN", {"default": True}),
+            },
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("summary",)
+    FUNCTION = "explode"
+    CATEGORY = "PowerDiffusion/IO"
+    OUTPUT_NODE = True
+
+    def explode(self, shard_path, output_dir, overwrite):
+        if not os.path.exists(shard_path):
+            return (f"错误：路径不存在 {shard_path}",)
+        try:
+            written, skipped, shards = explode_shards(shard_path, output_dir, overwrite)
+        except Exception as e:
+            return (f"处理出错：{e}",)
+        summary = f"已展开 {len(shards)} 个分片：写入 {written} 个文件，跳过 {skipped} 条记录"
+        print(f"[PDstring_ShardExplode] {summary}")
+        return (summary,)
+
+    @staticmethod
+    def IS_CHANGED(*args, **kwargs):
+        return float("NaN")
+
 # 节点映射
 NODE_CLASS_MAPPINGS = {
     "PD_RemoveColorWords": PD_RemoveColorWords,
     "Empty_Line": Empty_Line,
     "PDstring_Save": PDstring_Save,
+    "PDstring_ShardExplode": PDstring_ShardExplode,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "PD_RemoveColorWords": "PD_批量去除/添加单词",
     "Empty_Line": "PDstring:del_EmptyLine",
     "PDstring_Save": "PDstring:txtSave",
+    "PDstring_ShardExplode": "PDstring:ShardExplode",
 }